@@ -0,0 +1,91 @@
+import math
+import time
+import random
+from typing import Dict, List, Optional
+
+from .constants import *
+from .enums import *
+from .types import *
+from .stats import *
+
+class AdmissionController:
+    def __init__(self):
+        self.service_times: Dict[WorkflowType, RollingStats] = {}
+        self.cold_start_times = RollingStats()
+        self.rejected_count = 0
+
+    def record_service_time(self, workflow_type: WorkflowType, seconds: float) -> None:
+        if workflow_type not in self.service_times:
+            self.service_times[workflow_type] = RollingStats()
+        self.service_times[workflow_type].add(seconds)
+
+    def record_cold_start_time(self, seconds: float) -> None:
+        self.cold_start_times.add(seconds)
+
+    def service_time(self, workflow_type: WorkflowType) -> float:
+        """Measured mean service time of a workflow, falling back to the configured default."""
+        stats = self.service_times.get(workflow_type)
+        if stats and stats.count() > 0:
+            return stats.mean()
+        return DEFAULT_SERVICE_TIMES.get(str(workflow_type.value), DEFAULT_LATENCY_BUDGET)
+
+    def cold_start_time(self) -> float:
+        return self.cold_start_times.mean() or DEFAULT_COLD_START_TIME
+
+    def latency_budget(self, workflow_type: WorkflowType, requested: Optional[float] = None) -> float:
+        """Latency budget of a request, capped by the configured budget of its workflow."""
+        budget = LATENCY_BUDGETS.get(str(workflow_type.value), DEFAULT_LATENCY_BUDGET)
+        if requested is not None and requested > 0:
+            return min(requested, budget)
+        return budget
+
+    def boot_delay(self, boot_times: List[float]) -> float:
+        """Time until the first of the starting pods is ready, given how long each has been booting."""
+        if not boot_times:
+            return self.cold_start_time()
+        return min(max(0., self.cold_start_time() - elapsed) for elapsed in boot_times)
+
+    def estimate_wait(
+        self,
+        workflow_type: WorkflowType,
+        queued_prompts: List[Prompt],
+        processing_prompts: List[Prompt],
+        num_ready_pods: int,
+        boot_times: List[float]
+    ) -> float:
+        """Estimate the time until a new prompt would complete behind the given queued prompts.
+
+        Without ready pods, the work is shared by the starting pods once the
+        first of them has booted; boot_times is how long each has been booting.
+        """
+        now = time.time()
+        work = sum(self.service_time(prompt.workflow_type) for prompt in queued_prompts)
+        for prompt in processing_prompts:
+            elapsed = now - prompt.dispatched_at if prompt.dispatched_at else 0.
+            work += max(0., self.service_time(prompt.workflow_type) - elapsed)
+
+        own_time = self.service_time(workflow_type)
+        if num_ready_pods > 0:
+            return work / num_ready_pods + own_time
+        return self.boot_delay(boot_times) + work / max(len(boot_times), 1) + own_time
+
+    def admit(self, expected_wait: float, latency_budget: float) -> Optional[int]:
+        """Return None if the request is admitted, otherwise the Retry-After delay in seconds."""
+        if not ADMISSION_CONTROL or expected_wait <= latency_budget:
+            return None
+        self.rejected_count += 1
+        return self.retry_after(expected_wait - latency_budget)
+
+    def retry_after(self, seconds: float) -> int:
+        """Retry-After delay spread with random jitter so rejected clients do not retry in lockstep."""
+        return max(1, math.ceil(seconds * random.uniform(1, 1 + RETRY_AFTER_JITTER)))
+
+    def to_dict(self) -> Dict:
+        return {
+            "rejected_prompt_num": self.rejected_count,
+            "service_times": {
+                workflow_type.name: self.service_time(workflow_type)
+                for workflow_type in WorkflowType
+            },
+            "cold_start_time": self.cold_start_time()
+        }
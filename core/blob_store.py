@@ -0,0 +1,179 @@
+import os
+import hmac
+import time
+import uuid
+import hashlib
+import tempfile
+import mimetypes
+from urllib import parse
+from typing import Dict, Iterable, Optional
+
+class BlobStore:
+    """Content-addressed storage for outputs that are handed out as expiring URLs."""
+
+    def put_stream(self, chunks: Iterable[bytes], media_type: str) -> str:
+        """Store a stream of bytes under its content hash and return the key."""
+        raise NotImplementedError
+
+    def url(self, key: str, expires_in: int) -> str:
+        """Signed URL that grants access to a blob until it expires."""
+        raise NotImplementedError
+
+    def put_bytes(self, data: bytes, media_type: str) -> str:
+        return self.put_stream([data], media_type)
+
+    def _spool(self, chunks: Iterable[bytes], directory: Optional[str] = None):
+        """Write chunks into a temporary file while hashing them."""
+        digest = hashlib.sha256()
+        file = tempfile.NamedTemporaryFile(dir=directory, delete=False)
+        with file:
+            for chunk in chunks:
+                digest.update(chunk)
+                file.write(chunk)
+        return file.name, digest.hexdigest()
+
+    @staticmethod
+    def _key(digest: str, media_type: str) -> str:
+        return f"{digest}{mimetypes.guess_extension(media_type) or ''}"
+
+class LocalBlobStore(BlobStore):
+    """Blobs in a local directory, deleted once they have not been stored for ttl seconds.
+
+    Storing a blob again renews it, so ttl only needs to outlast the URLs
+    handed out for it.
+    """
+
+    def __init__(self, directory: str, base_url: str, secret: str = "", ttl: float = 86400):
+        self.directory = directory
+        self.base_url = base_url.rstrip('/')
+        self.secret = (secret or uuid.uuid4().hex).encode("utf-8")
+        self.ttl = ttl
+        self.evicted_at = time.time()
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key: str) -> str:
+        key = os.path.basename(key)
+        return os.path.join(self.directory, key[:2], key)
+
+    def put_stream(self, chunks: Iterable[bytes], media_type: str) -> str:
+        temp_path, digest = self._spool(chunks, self.directory)
+        key = self._key(digest, media_type)
+        path = self.path(key)
+        if os.path.exists(path):
+            os.remove(temp_path)
+            os.utime(path)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(temp_path, path)
+        if time.time() - self.evicted_at > self.ttl / 10:
+            self.evicted_at = time.time()
+            self.evict_expired()
+        return key
+
+    def evict_expired(self) -> int:
+        """Delete blobs, and spool files left by failed uploads, older than the TTL."""
+        expires_before = time.time() - self.ttl
+        count = 0
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                path = os.path.join(root, name)
+                try:
+                    if os.path.getmtime(path) < expires_before:
+                        os.remove(path)
+                        count += 1
+                except FileNotFoundError:
+                    continue
+        return count
+
+    def url(self, key: str, expires_in: int) -> str:
+        expires = int(time.time()) + expires_in
+        query = parse.urlencode({"expires": expires, "signature": self._sign(key, expires)})
+        return f"{self.base_url}/{key}?{query}"
+
+    def verify(self, key: str, expires: int, signature: str) -> bool:
+        """Check that a URL signature is valid and not expired."""
+        return (
+            expires >= time.time() and
+            hmac.compare_digest(self._sign(key, expires), signature) and
+            os.path.exists(self.path(key))
+        )
+
+    def _sign(self, key: str, expires: int) -> str:
+        return hmac.new(self.secret, f"{key}:{expires}".encode("utf-8"), hashlib.sha256).hexdigest()
+
+class S3BlobStore(BlobStore):
+    def __init__(
+        self,
+        bucket: str,
+        endpoint_url: Optional[str] = None,
+        access_key: Optional[str] = None,
+        secret_key: Optional[str] = None,
+        region: Optional[str] = None
+    ):
+        try:
+            import boto3
+        except ImportError:
+            raise RuntimeError("boto3 is required for the S3 blob store")
+
+        self.bucket = bucket
+        self.client = boto3.client(
+            "s3",
+            endpoint_url=endpoint_url or None,
+            aws_access_key_id=access_key or None,
+            aws_secret_access_key=secret_key or None,
+            region_name=region or None
+        )
+
+    def put_stream(self, chunks: Iterable[bytes], media_type: str) -> str:
+        temp_path, digest = self._spool(chunks)
+        key = self._key(digest, media_type)
+        try:
+            if not self._exists(key):
+                self.client.upload_file(
+                    temp_path,
+                    self.bucket,
+                    key,
+                    ExtraArgs={"ContentType": media_type}
+                )
+        finally:
+            os.remove(temp_path)
+        return key
+
+    def url(self, key: str, expires_in: int) -> str:
+        return self.client.generate_presigned_url(
+            "get_object",
+            Params={"Bucket": self.bucket, "Key": key},
+            ExpiresIn=expires_in
+        )
+
+    def _exists(self, key: str) -> bool:
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=key)
+            return True
+        except Exception:
+            return False
+
+def create_blob_store(options: Dict) -> BlobStore:
+    """Create a blob store from a {"type": "local" | "s3", ...} configuration."""
+    options = dict(options)
+    store_type = options.pop("type", "local")
+    if store_type == "local":
+        return LocalBlobStore(**options)
+    if store_type == "s3":
+        return S3BlobStore(**options)
+    raise ValueError(f"Unknown blob store type: {store_type}")
+
+def offload(
+    store: BlobStore,
+    chunks: Iterable[bytes],
+    media_type: str,
+    expires_in: int
+) -> Dict:
+    """Store an output and describe where the client can download it."""
+    key = store.put_stream(chunks, media_type)
+    return {
+        "url": store.url(key, expires_in),
+        "expires_at": int(time.time()) + expires_in,
+        "media_type": media_type,
+        "sha256": key.split('.')[0]
+    }
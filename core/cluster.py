@@ -0,0 +1,366 @@
+import os
+import json
+import time
+import uuid
+import socket
+from threading import Thread, Lock
+from typing import Dict, List, Optional, Tuple
+
+from .constants import *
+from .scheduler import *
+from .registry import *
+from .pod_helper import *
+from .enums import *
+from .types import *
+
+class ClusterScheduler(SchedulerClient):
+    """Scheduler shared by several wrapper nodes through a registry.
+
+    The node holding the leader lease runs the only Scheduler, so the fleet
+    is scaled as one pool. Every node forwards submissions and control calls
+    to the leader over a queue in the registry, framed like SchedulerDaemon
+    requests, and reads job statuses and results that the leader publishes
+    back. A new leader terminates the pods of leaders whose heartbeat expired.
+    """
+
+    def __init__(
+        self,
+        gpu_type: GPUType,
+        volume_type: VolumeType,
+        registry: Registry,
+        node_id: str = CLUSTER_NODE_ID
+    ):
+        self.gpu_type = gpu_type
+        self.volume_type = volume_type
+        self.registry = registry
+        self.node_id = node_id or f"{socket.gethostname()}-{uuid.uuid4().hex[:8]}"
+        self.namespace = f"{CLUSTER_NAMESPACE}:{volume_type.value}"
+        self.scheduler: Optional[Scheduler] = None
+        self.is_leader = False
+        self.jobs: Dict[str, Tuple[str, int, float]] = {}
+        self.lock = Lock()
+        self._renewed_at = 0.
+        self._published_at = 0.
+        self._closed = False
+
+        self.threads = [
+            Thread(target=self._lease_loop, daemon=True),
+            Thread(target=self._request_loop, daemon=True),
+            Thread(target=self._publish_loop, daemon=True)
+        ]
+        for thread in self.threads:
+            thread.start()
+
+    def _key(self, *parts: str) -> str:
+        return ":".join([self.namespace, *parts])
+
+    def _lease_loop(self):
+        """Keep this node's heartbeat alive and take or keep the leader lease."""
+        node = self.node_id.encode("utf-8")
+        while not self._closed:
+            try:
+                self.registry.set(self._key("node", self.node_id), node, CLUSTER_LEASE_TTL)
+                if self.is_leader:
+                    held = self.registry.renew(self._key("leader"), node, CLUSTER_LEASE_TTL)
+                else:
+                    held = self.registry.set(self._key("leader"), node, CLUSTER_LEASE_TTL, nx=True)
+
+                if held:
+                    self._renewed_at = time.time()
+                    if not self.is_leader:
+                        self._step_up()
+                elif self.is_leader:
+                    self._step_down()
+            except Exception as e:
+                print(f"Error in lease loop: {e}")
+                if self.is_leader and time.time() - self._renewed_at > CLUSTER_LEASE_TTL:
+                    self._step_down()
+
+            time.sleep(CLUSTER_LEASE_TTL / 3)
+
+    def _step_up(self):
+        """Become the leader and start scheduling on this node."""
+        print(f"Node {self.node_id} became the cluster leader")
+        with self.lock:
+            if self.scheduler:
+                self.scheduler.restart()
+            else:
+                self.scheduler = Scheduler(self.gpu_type, self.volume_type)
+            self.is_leader = True
+            # Prompts replayed from the journal were submitted before this node led
+            for prompt_id in self.scheduler.unfinished_prompt_ids():
+                self._publish_job(prompt_id)
+        Thread(target=self._reap_orphaned_pods, daemon=True).start()
+
+    def _step_down(self):
+        """Stop taking work after losing the lease; in-flight prompts finish and the pods are released."""
+        print(f"Node {self.node_id} lost the cluster leadership")
+        with self.lock:
+            self.is_leader = False
+            for manager in self.scheduler.managers():
+                manager.drain()
+
+    def _reap_orphaned_pods(self):
+        """Terminate pods registered by nodes whose heartbeat has expired."""
+        pod_helper = PodHelper(RUNPOD_API)
+        prefix = self._key("pods", "")
+        for key in self.registry.keys(prefix):
+            owner = key[len(prefix):]
+            if owner == self.node_id or self.registry.get(self._key("node", owner)) is not None:
+                continue
+            for pod_id in json.loads(self.registry.get(key) or b"[]"):
+                try:
+                    if pod_helper.get_pod_status(pod_id) is not None:
+                        print(f"Terminating pod {pod_id} orphaned by node {owner}")
+                        pod_helper.delete_pod(pod_id)
+                except Exception as e:
+                    print(f"Error terminating orphaned pod {pod_id}: {e}")
+            self.registry.delete(key)
+
+    def _request_loop(self):
+        """On the leader, answer the requests that nodes forward through the registry."""
+        while not self._closed:
+            if not self.is_leader:
+                time.sleep(SERVER_CHECK_DELAY / 1000)
+                continue
+            try:
+                data = self.registry.pop(self._key("requests"), 1)
+                if data is None:
+                    continue
+                envelope, _ = unpack_frame(data)
+                if envelope["expires_at"] < time.time():
+                    continue
+                self.registry.push(
+                    envelope["reply"],
+                    pack_frame(*self._handle(envelope["request"])),
+                    CLUSTER_RPC_TIMEOUT
+                )
+            except Exception as e:
+                print(f"Error in cluster request loop: {e}")
+
+    def _handle(self, request: Dict) -> Tuple[Dict, bytes]:
+        """Run a request on the local scheduler and publish any job it queued."""
+        response, payload = handle_request(self.scheduler, request)
+        prompt = response.get("prompt")
+        if prompt and prompt["result"] is None:
+            with self.lock:
+                self._publish_job(prompt["prompt_id"])
+        return response, payload
+
+    def _send(self, request: Dict) -> Tuple[Dict, bytes]:
+        if self.is_leader:
+            return unpack_frame(pack_frame(*self._handle(request)))
+
+        reply = self._key("reply", uuid.uuid4().hex)
+        self.registry.push(self._key("requests"), pack_frame({
+            "request": request,
+            "reply": reply,
+            "expires_at": time.time() + CLUSTER_RPC_TIMEOUT
+        }))
+        data = self.registry.pop(reply, CLUSTER_RPC_TIMEOUT)
+        if data is None:
+            raise TimeoutError("No cluster leader answered")
+        self.registry.delete(reply)
+        return unpack_frame(data)
+
+    def _publish_loop(self):
+        while not self._closed:
+            try:
+                if self.scheduler:
+                    with self.lock:
+                        self._publish()
+            except Exception as e:
+                print(f"Error in cluster publish loop: {e}")
+            time.sleep(SERVER_CHECK_DELAY / 1000)
+
+    def _publish(self):
+        """Publish job updates, the leader's pods and its capacity to the registry."""
+        for prompt_id in list(self.jobs):
+            self._publish_job(prompt_id)
+        if time.time() - self._published_at < 1:
+            return
+        self._published_at = time.time()
+
+        pod_ids = {
+            pod.host.pod_id
+            for manager in self.scheduler.managers()
+            for pod in manager.pods
+            if pod.host.pod_id
+        }
+        self.registry.set(self._key("pods", self.node_id), json.dumps(sorted(pod_ids)).encode("utf-8"))
+        if self.is_leader:
+            self.registry.set(self._key("state"), pack_frame({
+                "state": self.scheduler.get_state(),
+                "health": self.scheduler.health()
+            }), CLUSTER_LEASE_TTL)
+        elif not self.jobs and all(
+            manager.state == PodManagerState.Stopped for manager in self.scheduler.managers()
+        ):
+            self.scheduler = None
+
+    def _publish_job(self, prompt_id: str):
+        """Publish the status and events of a job, and its result once it is finished."""
+        status = self.scheduler.get_prompt_status(prompt_id)
+        if not status:
+            self.jobs.pop(prompt_id, None)
+            return
+        events = self.scheduler.get_prompt_events(prompt_id)
+        published = self.jobs.get(prompt_id)
+        last_event_id = events[-1]["id"] if events else -1
+        if published and published[:2] == (status["status"], last_event_id) and \
+            time.time() - published[2] < RESULT_STORE_TTL / 2:
+            return
+
+        finished = status["status"] not in ("queued", "processing")
+        if finished:
+            result = self.scheduler.get_prompt_result(prompt_id)
+            if not result:
+                # Finished on the pod but not yet moved to the result store
+                return
+            result = self._shareable_result(result)
+            self.registry.set(self._key("result", prompt_id), pack_frame(*encode_result(result)), RESULT_STORE_TTL)
+        self.registry.set(
+            self._key("job", prompt_id),
+            json.dumps({"status": status, "events": events}).encode("utf-8"),
+            RESULT_STORE_TTL
+        )
+        if finished:
+            # The journal keeps the job, so it can be re-fetched after its registry keys expire
+            self.scheduler.release_prompt_result(prompt_id, forget=False)
+            self.jobs.pop(prompt_id, None)
+        else:
+            self.jobs[prompt_id] = (status["status"], last_event_id, time.time())
+
+    def _shareable_result(self, result: PromptResult) -> PromptResult:
+        """Result with its output in memory, since other nodes cannot read the leader's spool files."""
+        if not result.output_path:
+            return result
+        if os.path.getsize(result.output_path) > CLUSTER_MAX_RESULT_BYTES:
+            return PromptResult(result.prompt_id, OutputState.Failed, "Output is too large to share across nodes")
+        with open(result.output_path, 'rb') as file:
+            output = file.read()
+        return PromptResult(
+            result.prompt_id,
+            result.output_state,
+            output,
+            media_type=result.media_type,
+            content_hash=result.content_hash
+        )
+
+    def _job(self, prompt_id: str) -> Optional[Dict]:
+        data = self.registry.get(self._key("job", prompt_id))
+        return json.loads(data) if data else None
+
+    def _snapshot(self) -> Optional[Dict]:
+        data = self.registry.get(self._key("state"))
+        return unpack_frame(data)[0] if data else None
+
+    def submit_prompt(self, workflow_type: WorkflowType, input_url: str, *args, **kwargs) -> Prompt:
+        try:
+            return super().submit_prompt(workflow_type, input_url, *args, **kwargs)
+        except TimeoutError as e:
+            prompt = Prompt(str(uuid.uuid4()), workflow_type, input_url)
+            prompt.result = PromptResult(prompt.prompt_id, OutputState.Rejected, str(e), CLUSTER_RPC_TIMEOUT)
+            return prompt
+
+    def queue_prompt(
+        self,
+        workflow_type: WorkflowType,
+        input_url: str,
+        latency_budget: Optional[float] = None,
+        tenant_id: str = "",
+        priority: int = 0
+    ) -> PromptResult:
+        prompt = self.submit_prompt(
+            workflow_type,
+            input_url,
+            latency_budget,
+            tenant_id,
+            priority,
+            durable=False
+        )
+        if prompt.result:
+            return prompt.result
+
+        while True:
+            status = self.get_prompt_status(prompt.prompt_id)
+            if status and status["status"] not in ("queued", "processing"):
+                return self.release_prompt_result(prompt.prompt_id)
+            if not status or time.time() > status["deadline"] + CLUSTER_RPC_TIMEOUT:
+                return PromptResult(prompt.prompt_id, OutputState.Failed, "Time out error")
+            time.sleep(SERVER_CHECK_DELAY / 1000)
+
+    def _ask_leader(self, method: str, *args):
+        """Ask the leader about a job missing from the registry, such as one whose published keys expired."""
+        try:
+            return getattr(super(), method)(*args)
+        except TimeoutError:
+            return None
+
+    def get_prompt_status(self, prompt_id: str) -> Optional[Dict]:
+        job = self._job(prompt_id)
+        return job["status"] if job else self._ask_leader("get_prompt_status", prompt_id)
+
+    def get_prompt_events(self, prompt_id: str, after: int = -1) -> Optional[List[Dict]]:
+        job = self._job(prompt_id)
+        if not job:
+            return self._ask_leader("get_prompt_events", prompt_id, after)
+        return [event for event in job["events"] if event["id"] > after]
+
+    def get_prompt_result(self, prompt_id: str) -> Optional[PromptResult]:
+        data = self.registry.get(self._key("result", prompt_id))
+        if not data:
+            return self._ask_leader("get_prompt_result", prompt_id)
+        fields, payload = unpack_frame(data)
+        return decode_result(fields, payload)
+
+    def release_prompt_result(self, prompt_id: str) -> Optional[PromptResult]:
+        """Delete the published job and have the leader erase it from its journal."""
+        result = self.get_prompt_result(prompt_id)
+        if result:
+            self.registry.delete(self._key("result", prompt_id))
+            self.registry.delete(self._key("job", prompt_id))
+            self._ask_leader("release_prompt_result", prompt_id)
+        return result
+
+    def get_state(self) -> Dict:
+        """State of the leader's scheduler, as last published."""
+        snapshot = self._snapshot()
+        if not snapshot:
+            raise RuntimeError("No cluster leader has published its state")
+        state = snapshot["state"]
+        state["state"] = PodManagerState[state["state"]]
+        return state
+
+    def health(self) -> Dict:
+        """Capacity of the shared pool, as seen by this node."""
+        try:
+            leader = self.registry.get(self._key("leader"))
+            snapshot = self._snapshot()
+        except Exception as e:
+            print(f"Error reading the cluster registry: {e}")
+            leader = snapshot = None
+
+        health = snapshot["health"] if snapshot else {"ready": False, "saturated": False, "capacity": {}}
+        return {
+            **health,
+            "ready": bool(leader) and health["ready"],
+            "node_id": self.node_id,
+            "role": "leader" if self.is_leader else "follower",
+            "leader": leader.decode("utf-8") if leader else None
+        }
+
+    def close(self) -> None:
+        """Leave the cluster, giving up the lease and stopping the local scheduler."""
+        self._closed = True
+        node = self.node_id.encode("utf-8")
+        with self.lock:
+            self.is_leader = False
+            try:
+                self.registry.delete_if(self._key("leader"), node)
+                self.registry.delete(self._key("node", self.node_id))
+            except Exception as e:
+                print(f"Error leaving the cluster: {e}")
+            if self.scheduler:
+                self.scheduler.stop()
+                self.registry.delete(self._key("pods", self.node_id))
@@ -1,33 +1,192 @@
+import os
 import json
+import time
+import hashlib
+import mimetypes
+import requests
 import websocket
 import uuid
-from urllib import request, parse
+from urllib import request, parse, error
 from PIL import Image
 from io import BytesIO
-from typing import Dict
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional, Tuple
 
 from .constants import *
 from .types import *
+from .input_prefetcher import *
+
+@lru_cache(maxsize=None)
+def workflow_signatures(workflow_type: WorkflowType, input_node: str = "111") -> frozenset:
+    """Signatures of the workflow nodes whose outputs ComfyUI can reuse between prompts.
+
+    A signature hashes the node class, its literal inputs and the signatures of
+    the nodes it links to, so equal signatures mean equal cached outputs. The
+    input node and everything downstream of it change with every prompt and
+    are left out.
+    """
+    path = f"./workflows/{workflow_type.value}.json"
+    if not os.path.exists(path):
+        return frozenset()
+    with open(path, 'r', encoding='utf-8') as file:
+        workflow = json.load(file)
+
+    signatures: Dict[str, Optional[str]] = {}
+
+    def sign(node_id: str) -> Optional[str]:
+        if node_id in signatures:
+            return signatures[node_id]
+        signatures[node_id] = None
+        if node_id == input_node:
+            return None
+        node = workflow[node_id]
+        parts = [node.get("class_type")]
+        for name, value in sorted(node.get("inputs", {}).items()):
+            if isinstance(value, list) and len(value) == 2 and str(value[0]) in workflow:
+                parent = sign(str(value[0]))
+                if parent is None:
+                    return None
+                parts.append([name, parent, value[1]])
+            else:
+                parts.append([name, value])
+        signatures[node_id] = hashlib.sha256(
+            json.dumps(parts, sort_keys=True, default=str).encode("utf-8")
+        ).hexdigest()
+        return signatures[node_id]
+
+    return frozenset(signature for signature in map(sign, workflow) if signature)
+
+@lru_cache(maxsize=None)
+def load_batch_spec(workflow_type: WorkflowType) -> Optional[Dict]:
+    """Batch node mapping declared next to a workflow, or None when it cannot be batched.
+
+    ./workflows/{n}.batch.json names the loader that replaces the input node
+    with one that loads every input of the batch, the inputs that set the
+    batch size, and the node whose outputs are split back per prompt:
+
+        {
+            "loader": {"class_type": "LoadImagesFromURLs", "input": "urls", "separator": "\\n"},
+            "batch_size_inputs": [["5", "batch_size"]],
+            "output_node": "9",
+            "max_batch_size": 4
+        }
+    """
+    path = f"./workflows/{workflow_type.value}.batch.json"
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as file:
+        return json.load(file)
 
 class ComfyUIHelper:
     def __init__(self, server_url: str, ws_url: str):
         self.url = server_url.rstrip('/')
         self.ws_url = ws_url.rstrip('/')
         self._workflow_cache: Dict[str, Dict] = {}
+        self.execution_time = 0.
+        self.download_bytes = 0
+        self.download_time = 0.
+        self.output_path: Optional[str] = None
+        self.media_type = "image/jpeg"
+        self.content_hash: Optional[str] = None
+        self.cached_node_count = 0
+        self.executed_node_count = 0
 
-    def prompt(self, prompt: Prompt, is_init: bool = False) -> bytes:
-        """Execute a prompt and return the resulting image/video data."""
+    def prompt(
+        self,
+        prompt: Prompt,
+        is_init: bool = False,
+        uploaded_inputs: Optional[Dict[str, float]] = None
+    ) -> Optional[bytes]:
+        """Execute a prompt and return the resulting image data.
+
+        Video outputs are spooled to disk instead; they return None and leave
+        the file in output_path.
+        """
         try:
             workflow = self._get_workflow(prompt.workflow_type)
-            workflow = self._apply_input(workflow, prompt.input_url)
+            workflow = self._apply_input(
+                workflow,
+                self._resolve_input(prompt, uploaded_inputs if uploaded_inputs is not None else {})
+            )
 
             ws, client_id = self._open_websocket_connection()
+            start_time = time.time()
             prompt_id = self._queue_workflow(workflow, client_id)
-            self._track_progress(ws, prompt_id, is_init)
+            self._track_progress(ws, prompt_id, is_init, prompt.add_event)
+            self.execution_time = time.time() - start_time
             return self._get_output_data(prompt_id)
+        except InputError:
+            raise
         except Exception as e:
             raise RuntimeError(f"Prompt execution failed: {str(e)}")
 
+    def prompt_batch(
+        self,
+        prompts: List[Prompt],
+        uploaded_inputs: Optional[Dict[str, float]] = None
+    ) -> List[Tuple[Optional[bytes], Optional[str], str, Optional[str]]]:
+        """Execute prompts of one workflow as a single batched execution.
+
+        Returns (output, output_path, media_type, content_hash) for every
+        prompt, in order.
+        """
+        try:
+            uploaded_inputs = uploaded_inputs if uploaded_inputs is not None else {}
+            spec = load_batch_spec(prompts[0].workflow_type)
+            workflow = self._apply_batch(
+                self._get_workflow(prompts[0].workflow_type),
+                spec,
+                [self._resolve_input(prompt, uploaded_inputs) for prompt in prompts]
+            )
+
+            ws, client_id = self._open_websocket_connection()
+            start_time = time.time()
+            prompt_id = self._queue_workflow(workflow, client_id)
+            self._track_progress(
+                ws,
+                prompt_id,
+                False,
+                lambda event, data: [prompt.add_event(event, data) for prompt in prompts]
+            )
+            self.execution_time = time.time() - start_time
+
+            history = self._get_history(prompt_id).get(prompt_id)
+            if not history:
+                raise RuntimeError("No execution history found")
+            node_output = history['outputs'].get(spec['output_node'], {})
+            kind = 'images' if 'images' in node_output else 'gifs'
+            items = node_output.get(kind, [])
+            if len(items) != len(prompts):
+                raise RuntimeError(f"Expected {len(prompts)} outputs, got {len(items)}")
+
+            outputs = []
+            for prompt, item in zip(prompts, items):
+                output = self._read_outputs([{kind: [item]}], prompt.prompt_id)
+                outputs.append((output, self.output_path, self.media_type, self.content_hash))
+            return outputs
+        except InputError:
+            raise
+        except Exception as e:
+            raise RuntimeError(f"Batch execution failed: {str(e)}")
+
+    def _apply_batch(self, workflow: Dict, spec: Dict, input_paths: List[str]) -> Dict:
+        """Swap the input node for the batched loader and set the batch size inputs."""
+        loader = spec["loader"]
+        workflow = dict(workflow)
+        workflow["111"] = {
+            "class_type": loader["class_type"],
+            "inputs": {
+                **loader.get("inputs", {}),
+                loader["input"]: loader.get("separator", "\n").join(input_paths)
+            }
+        }
+        for node_id, name in spec.get("batch_size_inputs", []):
+            workflow[node_id] = {
+                **workflow[node_id],
+                "inputs": {**workflow[node_id]["inputs"], name: len(input_paths)}
+            }
+        return workflow
+
     def _get_workflow(self, workflow_type: WorkflowType) -> Dict:
         """Get workflow JSON with caching."""
         if workflow_type.value not in self._workflow_cache:
@@ -40,6 +199,42 @@ class ComfyUIHelper:
         workflow["111"]["inputs"]["url_or_path"] = input_url
         return workflow
     
+    def _resolve_input(self, prompt: Prompt, uploaded_inputs: Dict[str, float]) -> str:
+        """Upload the prefetched input to ComfyUI, falling back to the input URL.
+
+        uploaded_inputs maps the content hashes already uploaded to the pod to
+        their upload time. The pod deletes inputs after COMFYUI_INPUT_TTL, so
+        uploads older than half of it are repeated.
+        """
+        if not prompt.input_future:
+            return prompt.input_url
+        
+        try:
+            input_data: InputData = prompt.input_future.result(timeout=NORMAL_REQUEST_TIMEOUT)
+            now = time.time()
+            for content_hash, uploaded_at in list(uploaded_inputs.items()):
+                if now - uploaded_at > COMFYUI_INPUT_TTL / 2:
+                    del uploaded_inputs[content_hash]
+            if input_data.content_hash not in uploaded_inputs:
+                self._upload_input(input_data)
+                uploaded_inputs[input_data.content_hash] = now
+            return f"{COMFYUI_INPUT_DIRECTORY}/{input_data.filename}"
+        except InputError:
+            raise
+        except Exception as e:
+            print(f"Input prefetch failed, pod will fetch it: {e}")
+            return prompt.input_url
+
+    def _upload_input(self, input_data: InputData) -> None:
+        """Upload input bytes to the ComfyUI input directory."""
+        response = requests.post(
+            f"{self.url}/upload/image",
+            files={"image": (input_data.filename, input_data.data, input_data.media_type)},
+            data={"overwrite": "true"},
+            timeout=NORMAL_REQUEST_TIMEOUT
+        )
+        response.raise_for_status()
+
     def _open_websocket_connection(self):
         client_id=str(uuid.uuid4())
         ws = websocket.WebSocket()
@@ -54,11 +249,29 @@ class ComfyUIHelper:
             data=data,
             headers={'Content-Type': 'application/json'}
         )
-        response = request.urlopen(req)
+        try:
+            response = request.urlopen(req)
+        except error.HTTPError as e:
+            body = json.loads(e.read() or b"{}")
+            node_errors = body.get("node_errors") or {}
+            if e.code == 400 and node_errors and all(map(self._is_input_node, node_errors)):
+                raise InputError(f"Invalid input: {json.dumps(node_errors)}")
+            raise
         return json.loads(response.read()).get("prompt_id", "")
 
-    def _track_progress(self, ws: websocket.WebSocket, prompt_id: str, is_init: bool) -> None:
-        """Track execution progress via WebSocket."""
+    @staticmethod
+    def _is_input_node(node_id: str) -> bool:
+        """Whether a node is the input loader that _apply_input fills in."""
+        return str(node_id) == "111"
+
+    def _track_progress(
+        self,
+        ws: websocket.WebSocket,
+        prompt_id: str,
+        is_init: bool,
+        on_event: Optional[Callable[[str, Dict], None]] = None
+    ) -> None:
+        """Track execution progress via WebSocket, forwarding node and step progress to on_event."""
         max_retries = COLD_TIMEOUT_RETRIES if is_init else TIMEOUT_RETRIES
         for _ in range(max_retries):
             try:
@@ -69,10 +282,28 @@ class ComfyUIHelper:
                     if (message['data']['node'] is None and 
                         message['data']['prompt_id'] == prompt_id):
                         return
+                    if message['data'].get('prompt_id') == prompt_id:
+                        self.executed_node_count += 1
+                    if on_event and message['data'].get('prompt_id') == prompt_id:
+                        on_event('executing', {"node": message['data']['node']})
+                elif msg_type == 'progress':
+                    if on_event and message['data'].get('prompt_id', prompt_id) == prompt_id:
+                        on_event('progress', {
+                            "node": message['data'].get('node'),
+                            "value": message['data']['value'],
+                            "max": message['data']['max']
+                        })
+                elif msg_type == 'execution_cached':
+                    if message['data'].get('prompt_id') == prompt_id:
+                        self.cached_node_count += len(message['data']['nodes'])
+                    if on_event and message['data'].get('prompt_id') == prompt_id:
+                        on_event('execution_cached', {"nodes": message['data']['nodes']})
                 elif msg_type == 'execution_success':
                     if message['data']['prompt_id'] == prompt_id:
                         return
                 elif msg_type == 'execution_error':
+                    if self._is_input_node(message['data'].get('node_id')):
+                        raise InputError(f"Input could not be loaded: {message['data']['exception_message']}")
                     raise RuntimeError(message['data']['exception_message'])
                     continue
                 elif msg_type == 'execution_interrupted':
@@ -87,11 +318,18 @@ class ComfyUIHelper:
         if not history:
             raise RuntimeError("No execution history found")
 
-        for node_output in history['outputs'].values():
+        return self._read_outputs(history['outputs'].values(), prompt_id)
+
+    def _read_outputs(self, node_outputs, spool_name: str) -> Optional[bytes]:
+        """Read the first image or video among node outputs."""
+        self.output_path = None
+        self.media_type = "image/jpeg"
+        self.content_hash = None
+        for node_output in node_outputs:
             if 'images' in node_output:
                 return self._process_image_output(node_output['images'])
             elif 'gifs' in node_output:
-                return self._get_binary_output(node_output['gifs'])
+                return self._spool_binary_output(node_output['gifs'], spool_name)
         raise RuntimeError("No valid output found in execution results")
 
     def _get_history(self, prompt_id: str) -> Dict:
@@ -108,9 +346,39 @@ class ComfyUIHelper:
                     img = img.convert('RGB')
                 jpg_buffer = BytesIO()
                 img.save(jpg_buffer, format='JPEG', quality=85)
+                self.content_hash = hashlib.sha256(jpg_buffer.getbuffer()).hexdigest()
                 return jpg_buffer.getvalue()
         raise RuntimeError("No valid image output found")
 
+    def _spool_binary_output(self, items: list, spool_name: str) -> None:
+        """Stream binary data for output items into a spool file without buffering it."""
+        for item in items:
+            params = parse.urlencode({
+                "filename": item['filename'],
+                "subfolder": item['subfolder'],
+                "type": item['type']
+            })
+            os.makedirs(SPOOL_DIRECTORY, exist_ok=True)
+            path = os.path.join(SPOOL_DIRECTORY, f"{spool_name}-{os.path.basename(item['filename'])}")
+            digest = hashlib.sha256()
+            start_time = time.time()
+            try:
+                with request.urlopen(f"{self.url}/view?{params}") as response, open(path, 'wb') as file:
+                    while chunk := response.read(STREAM_CHUNK_SIZE):
+                        digest.update(chunk)
+                        file.write(chunk)
+            except Exception:
+                if os.path.exists(path):
+                    os.remove(path)
+                raise
+            self.download_time += time.time() - start_time
+            self.content_hash = digest.hexdigest()
+            self.download_bytes += os.path.getsize(path)
+            self.output_path = path
+            self.media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+            return None
+        raise RuntimeError("No binary data available")
+
     def _get_binary_output(self, items: list) -> bytes:
         """Get binary data for output items."""
         for item in items:
@@ -119,6 +387,10 @@ class ComfyUIHelper:
                 "subfolder": item['subfolder'],
                 "type": item['type']
             })
+            start_time = time.time()
             with request.urlopen(f"{self.url}/view?{params}") as response:
-                return response.read()
+                data = response.read()
+            self.download_time += time.time() - start_time
+            self.download_bytes += len(data)
+            return data
         raise RuntimeError("No binary data available")
\ No newline at end of file
@@ -8,7 +8,7 @@ BASE_GPU_TYPE_IDS = [
 ]
 BASE_ENV_VARIABLES = {
 }
-BASE_GPU_COUNT = 1
+BASE_GPU_COUNT = envs.get('BASE_GPU_COUNT', 1)
 BASE_PORTS = [
     "8188/tcp", # ComfyUI external port
     "8888/http", # JupyterLab port
@@ -25,4 +25,107 @@ ORIGIN_IMAGE_URL = envs.get('ORIGIN_IMAGE_URL', '')
 MIN_PODS = envs.get('MIN_PODS', 1)
 MAX_PODS = envs.get('MAX_PODS', 100)
 SCALING_SENSIVITY = envs.get('SCALING_SENSIVITY', 30)
-NORMAL_REQUEST_TIMEOUT = envs.get('NORMAL_REQUEST_TIMEOUT', 30)
\ No newline at end of file
+POD_REQUEST_RETRIES = envs.get('POD_REQUEST_RETRIES', 6)
+NORMAL_REQUEST_TIMEOUT = envs.get('NORMAL_REQUEST_TIMEOUT', 30)
+HEALTH_WINDOW = envs.get('HEALTH_WINDOW', 20)
+HEALTH_MIN_SAMPLES = envs.get('HEALTH_MIN_SAMPLES', 5)
+HEALTH_SLOW_RATIO = envs.get('HEALTH_SLOW_RATIO', 1.5)
+HEALTH_MAX_ERROR_RATE = envs.get('HEALTH_MAX_ERROR_RATE', 0.3)
+HEALTH_MAX_EJECTED_RATIO = envs.get('HEALTH_MAX_EJECTED_RATIO', 0.25)
+
+ADMISSION_CONTROL = envs.get('ADMISSION_CONTROL', True)
+DEFAULT_LATENCY_BUDGET = envs.get('DEFAULT_LATENCY_BUDGET', SERVER_CHECK_RETRIES * SERVER_CHECK_DELAY / 1000)
+LATENCY_BUDGETS = envs.get('LATENCY_BUDGETS', {})
+DEFAULT_SERVICE_TIMES = envs.get('DEFAULT_SERVICE_TIMES', {"1": 30, "2": 30, "3": 300, "4": 30, "5": 30})
+DEFAULT_COLD_START_TIME = envs.get('DEFAULT_COLD_START_TIME', 600)
+
+LANES = envs.get('LANES', [
+    {"name": "short", "max_service_time": 120, "reserved_pods": 1},
+    {"name": "long", "max_service_time": None, "reserved_pods": 0}
+])
+
+SCHEDULING_POLICY = envs.get('SCHEDULING_POLICY', 'edf')
+PRIORITY_WEIGHTS = envs.get('PRIORITY_WEIGHTS', {"0": 1, "1": 4})
+TENANT_WEIGHTS = envs.get('TENANT_WEIGHTS', {})
+TENANT_PRIORITIES = envs.get('TENANT_PRIORITIES', {})
+TENANT_API_KEYS = envs.get('TENANT_API_KEYS', {})
+TENANT_CACHE_SIZE = envs.get('TENANT_CACHE_SIZE', 1000)
+
+SPOOL_DIRECTORY = envs.get('SPOOL_DIRECTORY', '/tmp/wrapper-spool')
+STREAM_CHUNK_SIZE = envs.get('STREAM_CHUNK_SIZE', 1 << 20)
+
+RESULT_STORE_MAX_BYTES = envs.get('RESULT_STORE_MAX_BYTES', 512 << 20)
+RESULT_STORE_TTL = envs.get('RESULT_STORE_TTL', 600)
+RESULT_STORE_SPILL_DIRECTORY = envs.get('RESULT_STORE_SPILL_DIRECTORY', '')
+
+OUTPUT_MODE = envs.get('OUTPUT_MODE', 'inline')
+BLOB_STORE = envs.get('BLOB_STORE', {
+    "type": "local",
+    "directory": "/tmp/wrapper-blobs",
+    "base_url": "http://localhost:8080/api/v2/blobs",
+    "secret": "",
+    "ttl": 7200
+})
+BLOB_URL_EXPIRES = envs.get('BLOB_URL_EXPIRES', 3600)
+
+RESULT_CACHE_CONTROL = envs.get('RESULT_CACHE_CONTROL', f"public, max-age={RESULT_STORE_TTL}, immutable")
+
+PREFETCH_INPUTS = envs.get('PREFETCH_INPUTS', True)
+PREFETCH_WORKERS = envs.get('PREFETCH_WORKERS', 8)
+PREFETCH_CACHE_SIZE = envs.get('PREFETCH_CACHE_SIZE', 64)
+PREFETCH_MAX_BYTES = envs.get('PREFETCH_MAX_BYTES', 52428800)
+COMFYUI_INPUT_DIRECTORY = envs.get('COMFYUI_INPUT_DIRECTORY', '/root/comfyui-input')
+COMFYUI_INPUT_TTL = envs.get('COMFYUI_INPUT_TTL', 3600)
+
+NORMALIZE_INPUTS = envs.get('NORMALIZE_INPUTS', True)
+NORMALIZE_WORKERS = envs.get('NORMALIZE_WORKERS', 2)
+WORKFLOW_INPUT_SIZES = envs.get('WORKFLOW_INPUT_SIZES', {"1": 1024, "2": 1024, "3": 832, "4": 1024, "5": 1024})
+
+MAX_BATCH_ITEMS = envs.get('MAX_BATCH_ITEMS', 100)
+
+BATCHING_ENABLED = envs.get('BATCHING_ENABLED', False)
+BATCH_MAX_SIZE = envs.get('BATCH_MAX_SIZE', 4)
+BATCH_WAIT_WINDOW = envs.get('BATCH_WAIT_WINDOW', 0.5)
+
+WARM_UP_MODE = envs.get('WARM_UP_MODE', 'full')
+WARM_UP_WORKFLOWS = envs.get('WARM_UP_WORKFLOWS', 1)
+WARM_UP_HISTORY = envs.get('WARM_UP_HISTORY', 500)
+WARM_UP_IDLE = envs.get('WARM_UP_IDLE', False)
+WARM_UP_RETRY_DELAY = envs.get('WARM_UP_RETRY_DELAY', 30)
+WARM_UP_MAX_FAILURES = envs.get('WARM_UP_MAX_FAILURES', 3)
+VOLUME_WORKFLOWS = envs.get('VOLUME_WORKFLOWS', {"0": [1, 2, 4, 5], "1": [3]})
+
+MODEL_STAGING = envs.get('MODEL_STAGING', False)
+MODEL_MANIFEST = envs.get('MODEL_MANIFEST', './workflows/manifest.json')
+MODEL_DIRECTORY = envs.get('MODEL_DIRECTORY', '/workspace/ComfyUI/models')
+LOCAL_MODEL_DIRECTORY = envs.get('LOCAL_MODEL_DIRECTORY', '/root/models')
+STAGED_MODEL_PATHS = envs.get('STAGED_MODEL_PATHS', '/root/staged_model_paths.yaml')
+MODEL_STAGING_PARALLELISM = envs.get('MODEL_STAGING_PARALLELISM', 4)
+MODEL_STAGING_TIMEOUT = envs.get('MODEL_STAGING_TIMEOUT', 1800)
+
+SLOTS_PER_POD = envs.get('SLOTS_PER_POD', 1)
+
+RUNPOD_API_URL = envs.get('RUNPOD_API_URL', 'https://rest.runpod.io/v1')
+SPOT_RATIO = envs.get('SPOT_RATIO', 0.)
+PREEMPTION_CHECK_INTERVAL = envs.get('PREEMPTION_CHECK_INTERVAL', 10)
+
+BILLING_INCREMENT = envs.get('BILLING_INCREMENT', 60)
+BILLING_MARGIN = envs.get('BILLING_MARGIN', 10)
+IDLE_HORIZON = envs.get('IDLE_HORIZON', 300)
+COLD_START_COST_FACTOR = envs.get('COLD_START_COST_FACTOR', 1.)
+
+JOB_JOURNAL = envs.get('JOB_JOURNAL', {"type": "none"})
+JOURNAL_MAX_RESULT_BYTES = envs.get('JOURNAL_MAX_RESULT_BYTES', 1 << 20)
+JOURNAL_RETENTION = envs.get('JOURNAL_RETENTION', 86400)
+IDEMPOTENCY_CACHE_SIZE = envs.get('IDEMPOTENCY_CACHE_SIZE', 10000)
+RETRY_AFTER_JITTER = envs.get('RETRY_AFTER_JITTER', 0.5)
+
+SCHEDULER_SOCKET = envs.get('SCHEDULER_SOCKET', '')
+API_WORKERS = envs.get('API_WORKERS', 1)
+
+CLUSTER_REGISTRY = envs.get('CLUSTER_REGISTRY', {})
+CLUSTER_NODE_ID = envs.get('CLUSTER_NODE_ID', '')
+CLUSTER_NAMESPACE = envs.get('CLUSTER_NAMESPACE', 'wrapper')
+CLUSTER_LEASE_TTL = envs.get('CLUSTER_LEASE_TTL', 15)
+CLUSTER_RPC_TIMEOUT = envs.get('CLUSTER_RPC_TIMEOUT', 10)
+CLUSTER_MAX_RESULT_BYTES = envs.get('CLUSTER_MAX_RESULT_BYTES', 256 << 20)
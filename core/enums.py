@@ -26,7 +26,10 @@ class VolumeType(Enum):
 class OutputState(Enum):
     Completed = 2
     Failed = 3
+    Rejected = 4
+    Expired = 5
 
 class PodManagerState(Enum):
     Running = 0
-    Stopped = 1
\ No newline at end of file
+    Stopped = 1
+    Draining = 2
\ No newline at end of file
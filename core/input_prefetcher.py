@@ -0,0 +1,168 @@
+import io
+import socket
+import hashlib
+import ipaddress
+import mimetypes
+import multiprocessing
+import requests
+from urllib import parse
+from threading import Lock
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Dict, Optional, Tuple
+from PIL import Image, ImageOps
+
+from .constants import *
+from .enums import *
+
+class InputError(Exception):
+    """Raised when a prompt input is not a usable image."""
+
+def normalize_image(data: bytes, max_size: int) -> Tuple[bytes, str]:
+    """Validate an image, apply its EXIF orientation and downscale it to max_size.
+
+    Returns the re-encoded bytes and their media type. Runs in a worker process.
+    """
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            image.load()
+            image = ImageOps.exif_transpose(image)
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        raise InputError(f"Invalid input image: {e}")
+
+    image.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
+    output = io.BytesIO()
+    if image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info:
+        image.convert("RGBA").save(output, format="PNG")
+        return output.getvalue(), "image/png"
+    image.convert("RGB").save(output, format="JPEG", quality=95)
+    return output.getvalue(), "image/jpeg"
+
+def check_public_url(url: str) -> None:
+    """Reject URLs that are not http(s) or resolve to private, loopback or link-local addresses."""
+    parsed = parse.urlsplit(url)
+    if parsed.scheme not in ("http", "https") or not parsed.hostname:
+        raise InputError(f"Unsupported input URL: {url}")
+    for address in socket.getaddrinfo(parsed.hostname, parsed.port or parsed.scheme, proto=socket.IPPROTO_TCP):
+        if not ipaddress.ip_address(address[4][0].split('%')[0]).is_global:
+            raise InputError(f"Input URL does not point to a public address: {url}")
+
+class InputData:
+    def __init__(self, content_hash: str, data: bytes, media_type: str):
+        self.content_hash = content_hash
+        self.data = data
+        self.media_type = media_type
+
+    @property
+    def filename(self) -> str:
+        return f"{self.content_hash}{mimetypes.guess_extension(self.media_type) or '.png'}"
+
+class InputPrefetcher:
+    """Download and normalize prompt inputs on the wrapper while the prompts are still queued."""
+
+    def __init__(
+        self,
+        max_workers: int = PREFETCH_WORKERS,
+        cache_size: int = PREFETCH_CACHE_SIZE,
+        normalize_workers: int = NORMALIZE_WORKERS,
+        max_bytes: int = PREFETCH_MAX_BYTES
+    ):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="InputPrefetch")
+        # Forking a process that runs threads can copy held locks into the child
+        start_method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        self.normalizer = ProcessPoolExecutor(
+            max_workers=normalize_workers,
+            mp_context=multiprocessing.get_context(start_method)
+        ) if NORMALIZE_INPUTS else None
+        self.cache_size = cache_size
+        self.max_bytes = max_bytes
+        self._lock = Lock()
+        self._downloads: OrderedDict[Tuple[str, Optional[int]], Future] = OrderedDict()
+        self._contents: Dict[str, InputData] = {}
+
+    def prefetch(self, input_url: str, workflow_type: Optional[WorkflowType] = None) -> Optional[Future]:
+        """Start preparing an input, sharing in-flight and cached work for the same URL and size."""
+        if not input_url.startswith(("http://", "https://")):
+            return None
+
+        max_size = None
+        if self.normalizer and workflow_type is not None:
+            max_size = WORKFLOW_INPUT_SIZES.get(str(workflow_type.value))
+        key = (input_url, max_size)
+
+        with self._lock:
+            future = self._downloads.get(key)
+            if future is not None and not self._failed(future):
+                self._downloads.move_to_end(key)
+                return future
+
+            future = self.executor.submit(self._download, input_url, max_size)
+            self._downloads[key] = future
+            while len(self._downloads) > self.cache_size:
+                self._downloads.popitem(last=False)
+
+        # Added outside the lock since the callback runs at once if the download is already done
+        future.add_done_callback(lambda done: self._forget_failed(key, done))
+        return future
+
+    def _forget_failed(self, key: Tuple[str, Optional[int]], future: Future) -> None:
+        """Drop a failed download from the cache so the next prompt with the input retries it."""
+        if not self._failed(future):
+            return
+        with self._lock:
+            if self._downloads.get(key) is future:
+                del self._downloads[key]
+
+    @staticmethod
+    def _failed(future: Future) -> bool:
+        return future.done() and (future.cancelled() or future.exception() is not None)
+
+    def _download(self, input_url: str, max_size: Optional[int]) -> InputData:
+        data, media_type = self._fetch(input_url)
+        if max_size:
+            data, media_type = self.normalizer.submit(normalize_image, data, max_size).result()
+        content_hash = hashlib.sha256(data).hexdigest()
+
+        with self._lock:
+            input_data = self._contents.setdefault(
+                content_hash,
+                InputData(content_hash, data, media_type)
+            )
+            self._forget_unreferenced_contents(content_hash)
+            return input_data
+
+    def _fetch(self, input_url: str, max_redirects: int = 5) -> Tuple[bytes, str]:
+        """Download an input from a public address, following redirects and stopping at max_bytes."""
+        for _ in range(max_redirects + 1):
+            check_public_url(input_url)
+            with requests.get(input_url, timeout=NORMAL_REQUEST_TIMEOUT, stream=True, allow_redirects=False) as response:
+                if response.is_redirect:
+                    input_url = parse.urljoin(input_url, response.headers["Location"])
+                    continue
+                response.raise_for_status()
+                if int(response.headers.get("Content-Length") or 0) > self.max_bytes:
+                    raise InputError(f"Input is larger than {self.max_bytes} bytes")
+                data = bytearray()
+                for chunk in response.iter_content(chunk_size=1 << 16):
+                    data += chunk
+                    if len(data) > self.max_bytes:
+                        raise InputError(f"Input is larger than {self.max_bytes} bytes")
+                media_type = response.headers.get("Content-Type", "image/png").split(';')[0].strip()
+                return bytes(data), media_type
+        raise InputError(f"Too many redirects for input URL: {input_url}")
+
+    def _forget_unreferenced_contents(self, keep: str) -> None:
+        """Drop content entries whose URLs have all been evicted from the cache."""
+        referenced = {keep} | {
+            future.result().content_hash
+            for future in self._downloads.values()
+            if future.done() and not self._failed(future)
+        }
+        for content_hash in list(self._contents):
+            if content_hash not in referenced:
+                del self._contents[content_hash]
+
+    def shutdown(self) -> None:
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        if self.normalizer:
+            self.normalizer.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,202 @@
+import time
+import sqlite3
+from threading import Lock
+from typing import Dict, List, Optional
+
+from .constants import *
+from .enums import *
+from .types import *
+
+class JobJournal:
+    """Durable record of prompts, used to replay unfinished work after a restart.
+
+    Every accepted prompt is recorded before it is acknowledged, then marked
+    when it is dispatched, requeued and finished. Finished prompts keep their
+    output when it is small enough, so clients can re-fetch it by job ID.
+    """
+
+    def record_submitted(self, prompt: Prompt, volume_type: VolumeType, idempotency_key: Optional[str] = None) -> None:
+        pass
+
+    def record_dispatched(self, prompts: List[Prompt]) -> None:
+        pass
+
+    def record_requeued(self, prompt: Prompt) -> None:
+        pass
+
+    def record_finished(self, prompt: Prompt) -> None:
+        pass
+
+    def unfinished(self, volume_type: VolumeType) -> List[Prompt]:
+        """Queued and processing prompts of a volume, oldest first."""
+        return []
+
+    def load(self, prompt_id: str) -> Optional[Prompt]:
+        return None
+
+    def find(self, idempotency_key: str) -> Optional[str]:
+        """Job ID recorded for an idempotency key."""
+        return None
+
+    def forget(self, prompt_id: str) -> None:
+        pass
+
+    def prune(self, before: float) -> int:
+        """Delete finished prompts older than the given time."""
+        return 0
+
+    def close(self) -> None:
+        pass
+
+class SQLiteJobJournal(JobJournal):
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS jobs (
+            job_id TEXT PRIMARY KEY,
+            idempotency_key TEXT UNIQUE,
+            volume_type INTEGER NOT NULL,
+            workflow_id INTEGER NOT NULL,
+            input_url TEXT NOT NULL,
+            tenant_id TEXT NOT NULL,
+            priority INTEGER NOT NULL,
+            created_at REAL NOT NULL,
+            deadline REAL NOT NULL,
+            state TEXT NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            dispatched_at REAL,
+            finished_at REAL,
+            output BLOB,
+            media_type TEXT,
+            content_hash TEXT
+        );
+        CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state);
+        CREATE INDEX IF NOT EXISTS jobs_finished_at ON jobs (finished_at);
+    """
+
+    def __init__(
+        self,
+        path: str,
+        max_result_bytes: int = JOURNAL_MAX_RESULT_BYTES,
+        synchronous: str = "NORMAL"
+    ):
+        self.max_result_bytes = max_result_bytes
+        self._lock = Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(f"PRAGMA synchronous={synchronous}")
+        self._connection.executescript(self.SCHEMA)
+
+    def _execute(self, sql: str, *params) -> sqlite3.Cursor:
+        with self._lock:
+            return self._connection.execute(sql, params)
+
+    def record_submitted(self, prompt: Prompt, volume_type: VolumeType, idempotency_key: Optional[str] = None) -> None:
+        self._execute(
+            "INSERT INTO jobs (job_id, idempotency_key, volume_type, workflow_id, input_url, tenant_id, "
+            "priority, created_at, deadline, state) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 'queued')",
+            prompt.prompt_id,
+            idempotency_key,
+            volume_type.value,
+            prompt.workflow_type.value,
+            prompt.input_url,
+            prompt.tenant_id,
+            prompt.priority,
+            prompt.created_at,
+            prompt.deadline
+        )
+
+    def record_dispatched(self, prompts: List[Prompt]) -> None:
+        with self._lock:
+            self._connection.executemany(
+                "UPDATE jobs SET state = 'processing', attempts = attempts + 1, dispatched_at = ? WHERE job_id = ?",
+                [(prompt.dispatched_at, prompt.prompt_id) for prompt in prompts]
+            )
+
+    def record_requeued(self, prompt: Prompt) -> None:
+        self._execute(
+            "UPDATE jobs SET state = 'queued', dispatched_at = NULL WHERE job_id = ?",
+            prompt.prompt_id
+        )
+
+    def record_finished(self, prompt: Prompt) -> None:
+        result = prompt.result
+        output = result.output
+        if isinstance(output, str):
+            output = output.encode("utf-8")
+        elif not isinstance(output, bytes) or len(output) > self.max_result_bytes:
+            output = None
+        self._execute(
+            "UPDATE jobs SET state = ?, finished_at = ?, output = ?, media_type = ?, content_hash = ? "
+            "WHERE job_id = ?",
+            result.output_state.name.lower(),
+            time.time(),
+            output,
+            result.media_type,
+            result.content_hash,
+            prompt.prompt_id
+        )
+
+    def unfinished(self, volume_type: VolumeType) -> List[Prompt]:
+        rows = self._execute(
+            "SELECT * FROM jobs WHERE volume_type = ? AND state IN ('queued', 'processing') ORDER BY created_at",
+            volume_type.value
+        ).fetchall()
+        return [self._prompt(row) for row in rows]
+
+    def load(self, prompt_id: str) -> Optional[Prompt]:
+        row = self._execute("SELECT * FROM jobs WHERE job_id = ?", prompt_id).fetchone()
+        return self._prompt(row) if row else None
+
+    def find(self, idempotency_key: str) -> Optional[str]:
+        row = self._execute("SELECT job_id FROM jobs WHERE idempotency_key = ?", idempotency_key).fetchone()
+        return row[0] if row else None
+
+    def forget(self, prompt_id: str) -> None:
+        self._execute(
+            "DELETE FROM jobs WHERE job_id = ? AND state NOT IN ('queued', 'processing')",
+            prompt_id
+        )
+
+    def prune(self, before: float) -> int:
+        return self._execute(
+            "DELETE FROM jobs WHERE state NOT IN ('queued', 'processing') AND finished_at < ?",
+            before
+        ).rowcount
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+    def _prompt(self, row: tuple) -> Prompt:
+        (job_id, _, _, workflow_id, input_url, tenant_id, priority, created_at, deadline,
+         state, _, dispatched_at, _, output, media_type, content_hash) = row
+        prompt = Prompt(job_id, WorkflowType(workflow_id), input_url, deadline, tenant_id, priority)
+        prompt.created_at = created_at
+        prompt.dispatched_at = dispatched_at
+        if state in ("queued", "processing"):
+            return prompt
+
+        output_state = OutputState[state.capitalize()]
+        if output_state != OutputState.Completed and output is not None:
+            output = output.decode("utf-8")
+        if output is None:
+            output_state = OutputState.Failed
+            output = "Result is no longer available"
+        prompt.result = PromptResult(
+            job_id,
+            output_state,
+            output,
+            media_type=media_type,
+            content_hash=content_hash
+        )
+        prompt.add_event(output_state.name.lower())
+        return prompt
+
+def create_job_journal(options: Dict) -> JobJournal:
+    """Create a journal from a {"type": "none" | "sqlite", ...} configuration."""
+    options = dict(options)
+    journal_type = options.pop("type", "none")
+    if journal_type == "none":
+        return JobJournal()
+    if journal_type == "sqlite":
+        return SQLiteJobJournal(**options)
+    raise ValueError(f"Unknown job journal type: {journal_type}")
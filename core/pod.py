@@ -2,27 +2,51 @@ import uuid
 import threading
 import time
 import os
-from typing import Optional
+from collections import Counter
+from typing import Dict, List, Optional
 
 from .enums import *
 from .pod_helper import *
+from .pod_host import *
 from .comfyui_helper import *
+from .stats import *
 from .utils import *
 from .constants import *
 
 class Pod:
-    def __init__(self, gpu_type: GPUType, volume_type: VolumeType):
+    def __init__(
+        self,
+        gpu_type: GPUType,
+        volume_type: VolumeType,
+        warm_up_plan: Optional[List[WorkflowType]] = None,
+        host: Optional[PodHost] = None,
+        slot: int = 0
+    ):
         self.pod_helper = PodHelper(RUNPOD_API)
-        self.volume_id = self._get_volume_id(volume_type)
+        self.host = host or PodHost(gpu_type, volume_type, 1, warm_up_plan)
+        self.slot = slot
+        self.port = self.host.port(slot)
         self.gpu_type = gpu_type
         self.volume_type = volume_type
         self._lock = threading.Lock()
         self._state = PodState.Initializing
         self._init = True
+        self._draining = False
         self.pod_id = ""
         self.pod_info = None
-        self.current_prompt = None
+        self.current_prompts: List[Prompt] = []
         self.count = 0
+        self.health = PodHealth()
+        self.uploaded_inputs: Dict[str, float] = {}
+        self.cached_signatures = frozenset()
+        self.warm_up_plan = warm_up_plan or [Prompt.get_base_prompt(volume_type).workflow_type]
+        self.warm_workflows = set()
+        self.warm_up_times: Dict[WorkflowType, float] = {}
+        self.warm_up_failures: Counter = Counter()
+        self.warm_up_retry_at = 0.
+        self.created_at = time.time()
+        self.cold_start_time: Optional[float] = None
+        self.staging_time: Optional[float] = None
         self._init_thread = threading.Thread(
             target=self._initialize_pod,
             name=f"PodInit-{volume_type.name}-{uuid.uuid4()}"
@@ -50,18 +74,20 @@ class Pod:
         with self._lock:
             self._init = value
 
-    def _get_volume_id(self, volume_type: VolumeType) -> str:
-        """Get volume ID from environment with validation"""
-        volume_id = os.getenv(f"VOLUME_ID{volume_type.value}", "")
-        if not volume_id:
-            raise ValueError(f"Volume ID not found for type {volume_type}")
-        return volume_id
+    @property
+    def draining(self) -> bool:
+        with self._lock:
+            return self._draining
+
+    @draining.setter
+    def draining(self, value: bool) -> None:
+        with self._lock:
+            self._draining = value
 
     def _initialize_pod(self) -> None:
         """Thread-safe pod initialization"""
         try:
             self.state = PodState.Initializing
-            self.pod_id = self._create_pod()
             self.pod_info = self._wait_for_pod_info()
             self._setup_comfyui_server()
             self._warm_up_pod()
@@ -69,35 +95,40 @@ class Pod:
             print(f"Pod initialization failed: {e}")
             self.state = PodState.Terminated
 
-    def _create_pod(self) -> str:
-        """Create pod and return pod ID"""
-        return self.pod_helper.create_pod(
-            self.volume_id,
-            f"pod-{self.volume_type.name}-{uuid.uuid4()}",
-            gpu_type_ids=[self.gpu_type.value]
-        )
-
     def _wait_for_pod_info(self) -> PodInfo:
-        """Wait for pod info to become available"""
-        pod_info = self.pod_helper.get_pod_info(self.pod_id)
+        """Wait for the host pod to be created and its info to become available"""
+        pod_info = self.host.wait_for_pod_info()
+        self.pod_id = self.host.pod_id if self.host.num_slots == 1 else f"{self.host.pod_id}/{self.slot}"
         if pod_info and pod_info.public_ip and pod_info.port_mappings:
             self.count = 0
             self.state = PodState.Starting
             return pod_info
 
     def _setup_comfyui_server(self) -> None:
-        """Set up ComfyUI server with retries"""
-        self.pod_helper.setup_comfyui_server(
+        """Start this slot's ComfyUI server once the host pod is prepared"""
+        self.host.wait_until_prepared()
+        self.staging_time = self.host.staging_time
+        self.pod_helper.start_comfyui_server(
             self.pod_info.public_ip,
-            self.pod_info.port_mappings
+            self.pod_info.port_mappings,
+            self.port,
+            self.host.cuda_device(self.slot)
         )
         self.state = PodState.Processing
 
     def _warm_up_pod(self) -> None:
-        """Warm up pod with base prompt"""
+        """Warm up pod with the workflows of its warm-up plan.
+
+        In partial mode only the first workflow is warmed before the pod is
+        marked Free; the rest are warmed later while the pod is idle.
+        """
         try:
-            self.queue_prompt(Prompt.get_base_prompt(self.volume_type))
+            plan = self.warm_up_plan if WARM_UP_MODE == "full" else self.warm_up_plan[:1]
+            for workflow_type in plan:
+                if not self.warm_up(workflow_type):
+                    raise RuntimeError(f"{workflow_type.name} did not run")
             with self._lock:
+                self.cold_start_time = time.time() - self.created_at
                 self.count = 0
                 self._init = False
                 self._state = PodState.Free
@@ -105,55 +136,169 @@ class Pod:
             print(f"Pod warm-up failed: {e}")
             self.state = PodState.Terminated
 
-    def queue_prompt(self, prompt: Prompt) -> Optional[PodState]:
-        """Process a prompt in a thread-safe manner"""
+    def warm_up(self, workflow_type: WorkflowType) -> bool:
+        """Run a workflow's base prompt so its models are loaded, recording how long it took"""
         with self._lock:
-            self.current_prompt = prompt
+            self.current_prompts = []
             self._state = PodState.Processing
 
-        comfyui_helper = ComfyUIHelper(
-            f"http://{self.pod_info.public_ip}:{self.pod_info.port_mappings.get('8188', 8188)}",
-            f"ws://{self.pod_info.public_ip}:{self.pod_info.port_mappings.get('8188', 8188)}"
-        )
-
+        comfyui_helper = self._comfyui_helper()
+        start_time = time.time()
         try:
-            result = comfyui_helper.prompt(prompt, self.init)
+            comfyui_helper.prompt(
+                Prompt.get_base_prompt(self.volume_type, workflow_type),
+                True,
+                self.uploaded_inputs
+            )
+            with self._lock:
+                self.warm_up_times[workflow_type] = time.time() - start_time
+                self.warm_workflows.add(workflow_type)
+                self.warm_up_failures.pop(workflow_type, None)
+                self.cached_signatures = workflow_signatures(workflow_type)
+            return True
+        except Exception as e:
+            print(f"Warm-up of {workflow_type.name} failed: {e}")
+            with self._lock:
+                self.warm_up_failures[workflow_type] += 1
+                self.warm_up_retry_at = time.time() + WARM_UP_RETRY_DELAY * 2 ** (self.warm_up_failures[workflow_type] - 1)
+            self.health.record_failure(workflow_type)
+            return False
+        finally:
+            self._discard_output(comfyui_helper)
             with self._lock:
                 self.count = 0
+                self._state = PodState.Free
+
+    def cold_workflows(self) -> List[WorkflowType]:
+        """Workflows of the pod's volume that have not been loaded yet, in warm-up plan order."""
+        workflows = self.warm_up_plan + [
+            WorkflowType(value) for value in VOLUME_WORKFLOWS.get(str(self.volume_type.value), [])
+        ]
+        with self._lock:
+            return list(dict.fromkeys(
+                workflow_type for workflow_type in workflows
+                if workflow_type not in self.warm_workflows
+            ))
+
+    @staticmethod
+    def _discard_output(comfyui_helper: ComfyUIHelper) -> None:
+        """Delete the spooled output of a run that keeps no result, such as warm-ups."""
+        if comfyui_helper.output_path and os.path.exists(comfyui_helper.output_path):
+            os.remove(comfyui_helper.output_path)
+
+    def _comfyui_helper(self) -> ComfyUIHelper:
+        return ComfyUIHelper(
+            f"http://{self.pod_info.public_ip}:{self.pod_info.port_mappings.get(str(self.port), self.port)}",
+            f"ws://{self.pod_info.public_ip}:{self.pod_info.port_mappings.get(str(self.port), self.port)}"
+        )
+
+    def queue_prompt(self, prompt: Prompt) -> Optional[PodState]:
+        """Process a prompt in a thread-safe manner"""
+        return self.queue_prompts([prompt])
 
+    def queue_prompts(self, prompts: List[Prompt]) -> Optional[PodState]:
+        """Process prompts of one workflow in a single execution, batched when there are several"""
+        with self._lock:
+            self.current_prompts = prompts
+            self._state = PodState.Processing
+
+        try:
+            if len(prompts) == 1:
+                self._run(prompts)
+            else:
+                try:
+                    self._run(prompts)
+                except InputError as e:
+                    # The batch cannot tell whose input failed, so run them one by one
+                    print(f"Batch input failed, running prompts one by one: {e}")
+                    for prompt in prompts:
+                        try:
+                            self._run([prompt])
+                        except InputError as error:
+                            with self._lock:
+                                prompt.result = PromptResult(prompt.prompt_id, OutputState.Failed, str(error))
+            with self._lock:
                 if self._init:
                     self._state = PodState.Free
                     return None
-                
-                prompt.result = PromptResult(
-                    prompt.prompt_id,
-                    OutputState.Completed,
-                    result
-                )
         except Exception as e:
             print(f"Prompt processing failed: {e}")
+            if self.host.check_preempted():
+                self.state = PodState.Terminated
+                return None
             with self._lock:
+                self.cached_signatures = frozenset()
                 if self._init:
                     self._state = PodState.Terminated
                     return None
                 
-                prompt.result = PromptResult(
-                    prompt.prompt_id,
-                    OutputState.Failed,
-                    str(e)
-                )
+                for prompt in prompts:
+                    if prompt.result is None:
+                        prompt.result = PromptResult(
+                            prompt.prompt_id,
+                            OutputState.Failed,
+                            str(e)
+                        )
+            # A bad input says nothing about the health of the pod
+            if not isinstance(e, InputError):
+                self.health.record_failure(prompts[0].workflow_type)
 
         with self._lock:
             self.count = 0
             self._state = PodState.Completed
             return None
 
+    def _run(self, prompts: List[Prompt]) -> None:
+        """Execute prompts on ComfyUI and set their results; init runs keep no result."""
+        comfyui_helper = self._comfyui_helper()
+        try:
+            if len(prompts) == 1:
+                output = comfyui_helper.prompt(prompts[0], self.init, self.uploaded_inputs)
+                outputs = [(
+                    output,
+                    comfyui_helper.output_path,
+                    comfyui_helper.media_type,
+                    comfyui_helper.content_hash
+                )]
+            else:
+                outputs = comfyui_helper.prompt_batch(prompts, self.uploaded_inputs)
+        finally:
+            if self.init:
+                self._discard_output(comfyui_helper)
+        self.health.record_cache(comfyui_helper.cached_node_count, comfyui_helper.executed_node_count)
+        workflow_type = prompts[0].workflow_type
+        with self._lock:
+            self.count = 0
+            self.cached_signatures = workflow_signatures(workflow_type)
+            self.warm_workflows.add(workflow_type)
+
+            if self._init:
+                return None
+
+            for prompt, (output, output_path, media_type, content_hash) in zip(prompts, outputs):
+                prompt.result = PromptResult(
+                    prompt.prompt_id,
+                    OutputState.Completed,
+                    output,
+                    output_path=output_path,
+                    media_type=media_type,
+                    content_hash=content_hash
+                )
+        # Batched executions are amortized over their prompts
+        for _ in prompts:
+            self.health.record_success(
+                workflow_type,
+                comfyui_helper.execution_time / len(prompts),
+                comfyui_helper.download_bytes / len(prompts),
+                comfyui_helper.download_time / len(prompts)
+            )
+
     def destroy(self) -> bool:
         """Safely destroy the pod"""
         try:
             if self._init_thread and self._init_thread.is_alive():
                 terminate_thread(self._init_thread)
-            self.pod_helper.delete_pod(self.pod_id)
+            self.host.release(self.slot)
         except Exception as e:
             print(f"Pod destruction failed: {e}")
             return False
\ No newline at end of file
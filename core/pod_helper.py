@@ -1,16 +1,35 @@
+import os
+import json
 import time
+import shlex
 import requests
 import subprocess
-from typing import Dict, List
+from typing import Dict, List, Optional
 from requests.exceptions import RequestException
 
 from .constants import *
 from .types import *
 
+STAGE_MODEL_SCRIPT = (
+    'src="$0/$2"; dst="$1/$2"; '
+    '[ -f "$dst" ] && exit 0; '
+    'mkdir -p "$(dirname "$dst")" && cp "$src" "$dst.tmp" && '
+    'echo "$3  $dst.tmp" | sha256sum -c --status && mv "$dst.tmp" "$dst" || '
+    '{ rm -f "$dst.tmp"; echo "Staging failed: $2" >&2; exit 1; }'
+)
+
+def load_model_manifest(path: str = MODEL_MANIFEST) -> List[Dict]:
+    """Model files needed by the workflows: [{"path", "sha256", "workflows"}]."""
+    if not os.path.exists(path):
+        return []
+    with open(path, 'r', encoding='utf-8') as file:
+        return json.load(file).get("models", [])
+
 class PodHelper:
     def __init__(self, api_key: str):
         self.api_key = api_key
         self.session = requests.Session()
+        self.staging_time: Optional[float] = None
         self.session.headers.update({
             "Authorization": f"Bearer {api_key}",
             "Content-Type": "application/json"
@@ -24,9 +43,10 @@ class PodHelper:
         env_variables: Dict = BASE_ENV_VARIABLES,
         gpu_count: int = BASE_GPU_COUNT,
         ports: List[str] = BASE_PORTS,
-        timeout: int = NORMAL_REQUEST_TIMEOUT
+        timeout: int = NORMAL_REQUEST_TIMEOUT,
+        interruptible: bool = False
     ) -> str:
-        """Create a new pod with network volume."""
+        """Create a new pod with network volume, optionally on interruptible (spot) capacity."""
         payload = {
             "env": env_variables,
             "gpuCount": gpu_count,
@@ -35,13 +55,14 @@ class PodHelper:
             "name": pod_name,
             "networkVolumeId": network_volume_id,
             "supportPublicIp": True,
-            "ports": ports
+            "ports": ports,
+            "interruptible": interruptible
         }
 
         while True:
             try:
                 response = self.session.post(
-                    "https://rest.runpod.io/v1/pods",
+                    f"{RUNPOD_API_URL}/pods",
                     json=payload,
                     timeout=timeout
                 )
@@ -59,7 +80,7 @@ class PodHelper:
         while True:
             try:
                 response = self.session.get(
-                    f"https://rest.runpod.io/v1/pods/{pod_id}"
+                    f"{RUNPOD_API_URL}/pods/{pod_id}"
                 )
                 response.raise_for_status()
                 data = response.json()
@@ -75,19 +96,39 @@ class PodHelper:
                 time.sleep(1)
                 continue
 
-    def delete_pod(self, pod_id: str, timeout: int = NORMAL_REQUEST_TIMEOUT) -> bool:
-        """Delete a pod."""
-        while True:
+    def get_pod_status(self, pod_id: str, timeout: int = NORMAL_REQUEST_TIMEOUT) -> Optional[str]:
+        """Get the desired status of a pod (RUNNING, EXITED, TERMINATED), or None if it is gone."""
+        response = self.session.get(
+            f"{RUNPOD_API_URL}/pods/{pod_id}",
+            timeout=timeout
+        )
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        return response.json().get("desiredStatus", "")
+
+    def delete_pod(
+        self,
+        pod_id: str,
+        timeout: int = NORMAL_REQUEST_TIMEOUT,
+        retries: int = POD_REQUEST_RETRIES
+    ) -> bool:
+        """Delete a pod, treating a pod that is already gone as deleted."""
+        for attempt in range(max(1, retries)):
+            if attempt:
+                time.sleep(2)
             try:
                 response = self.session.delete(
-                    f"https://rest.runpod.io/v1/pods/{pod_id}",
+                    f"{RUNPOD_API_URL}/pods/{pod_id}",
                     timeout=timeout
                 )
+                if response.status_code == 404:
+                    return True
                 response.raise_for_status()
-                if response.status_code == 200:
-                    return
-            except:
-                time.sleep(2)
+                return True
+            except RequestException as e:
+                print(f"Error in deleting pod {pod_id}: {e}")
+        return False
 
     @staticmethod
     def execute_ssh_command(
@@ -125,25 +166,120 @@ class PodHelper:
         self,
         public_ip: str,
         port_mappings: Dict[str, int],
+        workflow_types: Optional[List[WorkflowType]] = None,
+        port: int = 8188,
+        cuda_device: Optional[int] = None,
         retries: int = SERVER_CHECK_RETRIES,
         check_interval: int = SERVER_CHECK_DELAY,
         timeout: int = NORMAL_REQUEST_TIMEOUT
     ) -> bool:
         """Set up and verify ComfyUI server."""
+        self.prepare_pod(public_ip, port_mappings, workflow_types)
+        return self.start_comfyui_server(
+            public_ip,
+            port_mappings,
+            port,
+            cuda_device,
+            retries,
+            check_interval,
+            timeout
+        )
+
+    def prepare_pod(
+        self,
+        public_ip: str,
+        port_mappings: Dict[str, int],
+        workflow_types: Optional[List[WorkflowType]] = None
+    ) -> None:
+        """Install tools and stage models; done once per pod before any ComfyUI starts.
+
+        With model staging enabled, the models of the given workflows are copied
+        to local disk right away and the rest are copied in the background while
+        ComfyUI is already serving.
+        """
         setup_commands = [
             "apt update -qq",
             "apt install -y screen",
             f"mkdir -p {OUTPUT_DIRECTORY}",
             f"chmod 666 {OUTPUT_DIRECTORY}",
-            "cd /workspace/ComfyUI && "
-            "screen -dmS comfyui /workspace/ComfyUI/venv/bin/python3 "
-            f"/workspace/ComfyUI/main.py --listen --disable-metadata --output-directory {OUTPUT_DIRECTORY}"
+            f"mkdir -p {COMFYUI_INPUT_DIRECTORY}",
+            "screen -dmS input-cleanup sh -c " + shlex.quote(
+                f"while true; do find {COMFYUI_INPUT_DIRECTORY} -type f "
+                f"-mmin +{max(1, COMFYUI_INPUT_TTL // 60)} -delete; sleep 300; done"
+            )
         ]
+        for cmd in setup_commands:
+            self.execute_ssh_command(cmd, public_ip, port_mappings)
 
+        models = load_model_manifest() if MODEL_STAGING else []
+        if not models:
+            return
+
+        values = [workflow_type.value for workflow_type in workflow_types or []]
+        urgent_models = [model for model in models if set(model.get("workflows", [])) & set(values)]
+        other_models = [model for model in models if model not in urgent_models]
+
+        start_time = time.time()
+        try:
+            self.execute_ssh_command(
+                self._staging_command(urgent_models),
+                public_ip,
+                port_mappings,
+                timeout=MODEL_STAGING_TIMEOUT
+            )
+        except RuntimeError as e:
+            print(f"Model staging incomplete, missing models load from the volume: {e}")
+        self.staging_time = time.time() - start_time
+        self.execute_ssh_command(
+            f"cat > {STAGED_MODEL_PATHS} << 'EOF'\n{self._extra_model_paths(models)}EOF",
+            public_ip,
+            port_mappings
+        )
+        if other_models:
+            self.execute_ssh_command(
+                f"screen -dmS staging sh -c {shlex.quote(self._staging_command(other_models))}",
+                public_ip,
+                port_mappings
+            )
+
+    def start_comfyui_server(
+        self,
+        public_ip: str,
+        port_mappings: Dict[str, int],
+        port: int = 8188,
+        cuda_device: Optional[int] = None,
+        retries: int = SERVER_CHECK_RETRIES,
+        check_interval: int = SERVER_CHECK_DELAY,
+        timeout: int = NORMAL_REQUEST_TIMEOUT
+    ) -> bool:
+        """Start a ComfyUI process on a port, optionally pinned to one GPU, and wait until it serves.
+
+        Processes other than the default one on 8188 get their own output and
+        temp directories so that several of them can share a pod.
+        """
+        output_directory = OUTPUT_DIRECTORY if port == 8188 else f"{OUTPUT_DIRECTORY}/{port}"
+        comfyui_arguments = (
+            f"--listen --port {port} --disable-metadata --output-directory {output_directory} "
+            f"--input-directory {COMFYUI_INPUT_DIRECTORY}"
+        )
+        if port != 8188:
+            comfyui_arguments += f" --temp-directory /root/comfyui-{port}"
+        if cuda_device is not None:
+            comfyui_arguments += f" --cuda-device {cuda_device}"
+        if MODEL_STAGING and load_model_manifest():
+            comfyui_arguments += f" --extra-model-paths-config {STAGED_MODEL_PATHS}"
+
+        setup_commands = [
+            f"mkdir -p {output_directory}",
+            f"chmod 666 {output_directory}",
+            "cd /workspace/ComfyUI && "
+            f"screen -dmS comfyui-{port} /workspace/ComfyUI/venv/bin/python3 "
+            f"/workspace/ComfyUI/main.py {comfyui_arguments}"
+        ]
         for cmd in setup_commands:
             self.execute_ssh_command(cmd, public_ip, port_mappings)
 
-        comfyui_port = port_mappings.get("8188", 8188)
+        comfyui_port = port_mappings.get(str(port), port)
         url = f"http://{public_ip}:{comfyui_port}"
         
         for attempt in range(retries):
@@ -156,4 +292,27 @@ class PodHelper:
             
             time.sleep(check_interval / 1000.)
 
-        raise RuntimeError(f"ComfyUI server not ready after {retries * check_interval / 1000.} seconds")
\ No newline at end of file
+        raise RuntimeError(f"ComfyUI server not ready after {retries * check_interval / 1000.} seconds")
+
+    @staticmethod
+    def _staging_command(models: List[Dict]) -> str:
+        """Shell command copying models to local disk in parallel, verifying checksums before an atomic rename."""
+        if not models:
+            return "true"
+        entries = " ".join(
+            shlex.quote(f"{model['path']} {model['sha256']}") for model in models
+        )
+        return (
+            f"printf '%s\\n' {entries} | "
+            f"xargs -P {MODEL_STAGING_PARALLELISM} -L 1 "
+            f"sh -c {shlex.quote(STAGE_MODEL_SCRIPT)} "
+            f"{shlex.quote(MODEL_DIRECTORY)} {shlex.quote(LOCAL_MODEL_DIRECTORY)}"
+        )
+
+    @staticmethod
+    def _extra_model_paths(models: List[Dict]) -> str:
+        """ComfyUI extra_model_paths config that puts the staged models ahead of the network volume."""
+        folders = sorted({model['path'].split('/')[0] for model in models})
+        lines = ["staged:", f"  base_path: {LOCAL_MODEL_DIRECTORY}", "  is_default: true"]
+        lines += [f"  {folder}: {folder}" for folder in folders]
+        return "\n".join(lines) + "\n"
\ No newline at end of file
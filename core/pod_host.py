@@ -0,0 +1,147 @@
+import os
+import time
+import uuid
+import threading
+from typing import List, Optional
+
+from .enums import *
+from .pod_helper import *
+from .utils import *
+from .constants import *
+
+class PodHost:
+    """One rented RunPod pod shared by the ComfyUI slots running on it.
+
+    The host creates the pod and prepares it once; every slot then starts its
+    own ComfyUI process on port 8188 + slot, spread over the pod's GPUs. The
+    pod is deleted when the last slot releases it.
+    """
+
+    def __init__(
+        self,
+        gpu_type: GPUType,
+        volume_type: VolumeType,
+        num_slots: int = SLOTS_PER_POD,
+        warm_up_plan: Optional[List[WorkflowType]] = None,
+        interruptible: bool = False
+    ):
+        self.pod_helper = PodHelper(RUNPOD_API)
+        self.volume_id = self._get_volume_id(volume_type)
+        self.gpu_type = gpu_type
+        self.volume_type = volume_type
+        self.num_slots = num_slots
+        self.warm_up_plan = warm_up_plan
+        self.pod_id = ""
+        self.pod_info: Optional[PodInfo] = None
+        self.staging_time: Optional[float] = None
+        self.created_at = time.time()
+        self.interruptible = interruptible
+        self._preempted = False
+        self._lock = threading.Lock()
+        self._released = set()
+        self._info_ready = threading.Event()
+        self._prepared = threading.Event()
+        self._error: Optional[Exception] = None
+        self._closed = threading.Event()
+        self._init_thread = threading.Thread(
+            target=self._initialize_host,
+            name=f"PodHostInit-{volume_type.name}-{uuid.uuid4()}"
+        )
+        self._init_thread.daemon = True
+        self._init_thread.start()
+
+    def _get_volume_id(self, volume_type: VolumeType) -> str:
+        """Get volume ID from environment with validation"""
+        volume_id = os.getenv(f"VOLUME_ID{volume_type.value}", "")
+        if not volume_id:
+            raise ValueError(f"Volume ID not found for type {volume_type}")
+        return volume_id
+
+    def _initialize_host(self) -> None:
+        try:
+            self.pod_id = self.pod_helper.create_pod(
+                self.volume_id,
+                f"pod-{self.volume_type.name}-{uuid.uuid4()}",
+                gpu_type_ids=[self.gpu_type.value],
+                gpu_count=BASE_GPU_COUNT,
+                ports=self.ports(),
+                interruptible=self.interruptible
+            )
+            self.pod_info = self.pod_helper.get_pod_info(self.pod_id)
+            self._info_ready.set()
+            self.pod_helper.prepare_pod(
+                self.pod_info.public_ip,
+                self.pod_info.port_mappings,
+                self.warm_up_plan
+            )
+            self.staging_time = self.pod_helper.staging_time
+        except Exception as e:
+            self._error = e
+        finally:
+            self._info_ready.set()
+            self._prepared.set()
+
+        if self.interruptible and not self._error:
+            self._watch_preemption()
+
+    @property
+    def preempted(self) -> bool:
+        with self._lock:
+            return self._preempted
+
+    def check_preempted(self) -> bool:
+        """Ask RunPod whether an interruptible pod has been taken away."""
+        if not self.interruptible or not self.pod_id:
+            return False
+        try:
+            status = self.pod_helper.get_pod_status(self.pod_id)
+        except Exception as e:
+            print(f"Pod status check failed: {e}")
+            return self.preempted
+        if status is None or status in ("EXITED", "TERMINATED"):
+            with self._lock:
+                if not self._preempted:
+                    print(f"Pod {self.pod_id} was preempted")
+                self._preempted = True
+        return self.preempted
+
+    def _watch_preemption(self) -> None:
+        while not self._closed.wait(PREEMPTION_CHECK_INTERVAL):
+            if self.check_preempted():
+                return
+
+    def ports(self) -> List[str]:
+        """Exposed ports: one ComfyUI port per slot plus the base ports."""
+        return [f"{8188 + slot}/tcp" for slot in range(self.num_slots)] + [
+            port for port in BASE_PORTS if not port.startswith("8188/")
+        ]
+
+    def port(self, slot: int) -> int:
+        return 8188 + slot
+
+    def cuda_device(self, slot: int) -> Optional[int]:
+        """GPU a slot runs on; slots are spread round-robin when the pod has several GPUs."""
+        return slot % BASE_GPU_COUNT if BASE_GPU_COUNT > 1 else None
+
+    def wait_for_pod_info(self) -> PodInfo:
+        self._info_ready.wait()
+        if self._error:
+            raise self._error
+        return self.pod_info
+
+    def wait_until_prepared(self) -> None:
+        self._prepared.wait()
+        if self._error:
+            raise self._error
+
+    def release(self, slot: int) -> None:
+        """Release a slot, deleting the pod once no slot uses it."""
+        with self._lock:
+            self._released.add(slot)
+            if len(self._released) < self.num_slots:
+                return
+        self._closed.set()
+        if self._init_thread.is_alive() and not self._prepared.is_set():
+            terminate_thread(self._init_thread)
+        if self.pod_id:
+            self.pod_helper.delete_pod(self.pod_id)
@@ -1,31 +1,83 @@
+import copy
+import math
 import time
 import uuid
 import numpy as np
-from queue import Queue
 from threading import Thread, Lock
-from collections import deque
-from typing import Dict, List
+from collections import Counter, OrderedDict, deque
+from typing import Dict, List, Optional
 
 from .constants import *
 from .pod import *
+from .admission import *
+from .prompt_queue import *
+from .result_store import *
+from .input_prefetcher import *
+from .job_journal import *
 from .enums import *
 from .types import *
 from .utils import *
 
 class PodManager:
-    def __init__(self, gpu_type: GPUType, volume_type: VolumeType):
+    def __init__(
+        self,
+        gpu_type: GPUType,
+        volume_type: VolumeType,
+        config: Optional[Dict] = None,
+        predecessor: Optional["PodManager"] = None
+    ):
+        """Create a manager; given a predecessor, drain it and take over its pods instead of cold starting new ones."""
         self.gpu_type = gpu_type
         self.volume_type = volume_type
         self.pods: List[Pod] = []
-        self.queued_prompts = Queue[Prompt]()
+        self.queued_prompts = PromptQueue(SCHEDULING_POLICY)
         self.processing_prompts: Dict[str, Prompt] = {}
-        self.completed_prompts: Dict[str, Prompt] = {}
-        self.failed_prompts: Dict[str, Prompt] = {}
+        self.results = ResultStore()
+        self.prefetcher = InputPrefetcher()
+        self.journal = predecessor.journal if predecessor else create_job_journal(JOB_JOURNAL)
+        self.idempotency_keys: OrderedDict[str, str] = OrderedDict()
+        self.pruned_at = 0.
         self.threads: Dict[str, Thread] = {}
         self.lock = Lock()
         self.prompts_histories = deque([], maxlen=60)
+        self.workflow_histories = deque([], maxlen=WARM_UP_HISTORY)
+        self.admission = AdmissionController()
+        self.cold_started_pods = set()
+        self.pods_to_destroy: List[Pod] = []
+        self.lanes = sorted(
+            LANES,
+            key=lambda x: (x["max_service_time"] is None, x["max_service_time"] or 0)
+        )
+        self.tenant_latencies: OrderedDict[str, RollingStats] = OrderedDict()
+        self.expired_count = 0
+        self.invalid_count = 0
+        self.requeued_count = 0
+        self.recovered_count = 0
+        self.in_time_count = 0
+        self.late_count = 0
         self.num_pods = 0
         self.state = PodManagerState.Running
+        self.successor: Optional[PodManager] = None
+        self.config = {
+            "min_pods": MIN_PODS,
+            "max_pods": MAX_PODS,
+            "scaling_sensitivity": SCALING_SENSIVITY,
+            "slots_per_pod": SLOTS_PER_POD,
+            "spot_ratio": SPOT_RATIO,
+            "idle_horizon": IDLE_HORIZON,
+            "timeout_retries": TIMEOUT_RETRIES,
+            "cold_timeout_retries": COLD_TIMEOUT_RETRIES,
+            "server_check_retries": SERVER_CHECK_RETRIES,
+            "free_max_remains": FREE_MAX_REMAINS
+        }
+        if predecessor:
+            self.config.update(predecessor.config)
+        if config:
+            self.configure(config)
+        if predecessor:
+            self.pods = predecessor.drain(self)
+        else:
+            self._replay_journal()
 
         self.process_thread = Thread(target=self._process_loop, daemon=True)
         self.manage_thread = Thread(target=self._management_loop, daemon=True)
@@ -47,6 +99,8 @@ class PodManager:
             for pod in self.pods:
                 pods_by_state[pod.state] += 1
 
+            busy_pods = self._busy_pods_by_lane()
+
             return {
                 "state": self.state,
                 "total_pod_num": len(self.pods),
@@ -59,9 +113,69 @@ class PodManager:
                 "terminated_pod_num": pods_by_state[PodState.Terminated],
                 "queued_prompt_num": self.queued_prompts.qsize(),
                 "processing_prompt_num": len(self.processing_prompts),
-                "completed_prompt_num": len(self.completed_prompts),
-                "failed_prompt_num": len(self.failed_prompts),
+                "completed_prompt_num": self.results.count(OutputState.Completed),
+                "failed_prompt_num": len(self.results) - self.results.count(OutputState.Completed),
+                "draining_pod_num": sum(pod.draining for pod in self.pods),
+                "host_num": len({id(pod.host) for pod in self.pods}),
+                "cached_node_num": sum(pod.health.cached_nodes for pod in self.pods),
+                "executed_node_num": sum(pod.health.executed_nodes for pod in self.pods),
+                "pod_health": [
+                    {
+                        "pod_id": pod.pod_id,
+                        "slot": pod.slot,
+                        "state": pod.state.name,
+                        "draining": pod.draining,
+                        "warm_workflows": [workflow_type.name for workflow_type in pod.warm_workflows],
+                        "staging_time": pod.staging_time,
+                        "warm_up_times": {
+                            workflow_type.name: warm_up_time
+                            for workflow_type, warm_up_time in pod.warm_up_times.items()
+                        },
+                        **pod.health.to_dict()
+                    }
+                    for pod in self.pods
+                ],
+                **self.admission.to_dict(),
+                **self.results.to_dict(),
+                "expired_prompt_num": self.expired_count,
+                "invalid_prompt_num": self.invalid_count,
+                "requeued_prompt_num": self.requeued_count,
+                "recovered_prompt_num": self.recovered_count,
+                "interruptible_pod_num": sum(pod.host.interruptible for pod in self.pods),
+                "in_time_prompt_num": self.in_time_count,
+                "late_prompt_num": self.late_count,
+                "lanes": {
+                    lane["name"]: {
+                        "reserved_pod_num": lane["reserved_pods"],
+                        "queued_prompt_num": self.queued_prompts.qsize(lane["name"]),
+                        "processing_prompt_num": busy_pods[lane["name"]]
+                    }
+                    for lane in self.lanes
+                },
+                "tenants": self._tenant_state(),
+            }
+
+    def _tenant_state(self) -> Dict:
+        """Queue depth and latency of the tenants with prompts in flight or a recent completion."""
+        tenants = {}
+        for tenant_id, latencies in self.tenant_latencies.items():
+            tenants[tenant_id] = {
+                "queued_prompt_num": 0,
+                "processing_prompt_num": 0,
+                "latency_p50": latencies.percentile(50),
+                "latency_p95": latencies.percentile(95)
             }
+        empty_state = {
+            "queued_prompt_num": 0, 
+            "processing_prompt_num": 0, 
+            "latency_p50": None, 
+            "latency_p95": None
+        }
+        for prompt in self.queued_prompts.prompts():
+            tenants.setdefault(prompt.tenant_id, dict(empty_state))["queued_prompt_num"] += 1
+        for prompt in self.processing_prompts.values():
+            tenants.setdefault(prompt.tenant_id, dict(empty_state))["processing_prompt_num"] += 1
+        return tenants
 
     def calc_num_pods(self) -> int:
         """Calculate the ideal number of pods based on current and historical load."""
@@ -71,21 +185,28 @@ class PodManager:
         avg_load = np.average(self.prompts_histories)
         peak_load = max(self.prompts_histories)
         
-        weighted_load = (avg_load * (100. - SCALING_SENSIVITY) / 100. + 
-                       peak_load * (SCALING_SENSIVITY / 100.))
+        sensitivity = self.config["scaling_sensitivity"]
+        weighted_load = (avg_load * (100. - sensitivity) / 100. + 
+                       peak_load * (sensitivity / 100.))
         
-        return MIN_PODS + min(MAX_PODS, round(weighted_load * 1.2))
+        return self.config["min_pods"] + min(self.config["max_pods"], round(weighted_load * 1.2))
 
     def _management_loop(self):
         """Background thread for managing pod scaling."""
         while self.state == PodManagerState.Running:
             try:
                 with self.lock:
-                    self.num_pods = self.calc_num_pods()
+                    slots_per_pod = max(1, self.config["slots_per_pod"])
+                    self.num_pods = math.ceil(self.calc_num_pods() / slots_per_pod) * slots_per_pod
+                    self._eject_outlier_pods()
                     
-                    if self.num_pods > len(self.pods):
-                        for _ in range(self.num_pods - len(self.pods)):
-                            self.pods.append(Pod(self.gpu_type, self.volume_type))
+                    num_live_pods = len(self._live_pods())
+                    if self.num_pods > num_live_pods:
+                        self._create_pods(self.num_pods - num_live_pods)
+
+                if time.time() - self.pruned_at > 60:
+                    self.pruned_at = time.time()
+                    self.journal.prune(self.pruned_at - JOURNAL_RETENTION)
                 
                 time.sleep(2)
             except Exception as e:
@@ -93,35 +214,288 @@ class PodManager:
 
     def _process_loop(self):
         """Background thread for processing prompts and managing pod lifecycle."""
-        while self.state == PodManagerState.Running:
+        while self.state in (PodManagerState.Running, PodManagerState.Draining):
             try:
                 with self.lock:
+                    self._drop_expired_prompts()
+                    self._drop_invalid_prompts()
+                    self.results.evict_expired(time.time())
                     self._scale_down_pods()
                     self._process_pods()
+                    if self.state == PodManagerState.Draining:
+                        self._hand_over_idle_pods()
+                    else:
+                        self._warm_up_idle_pods()
+                    self._publish_queue_positions()
+                self._destroy_pods()
                 
                 time.sleep(SERVER_CHECK_DELAY / 1000)
             except Exception as e:
                 print(f"Error in process loop: {e}")
 
-    def _scale_down_pods(self):
-        """Scale down pods if we have more than needed."""
-        if len(self.pods) > self.num_pods:
-            excess_count = len(self.pods) - self.num_pods
-            terminated_count = 0
-            
-            for pod in sorted(self.pods, key=lambda x: (x.state != PodState.Free, x.count)):
-                if terminated_count >= excess_count:
-                    break
-                if pod.init:
-                    pod.state = PodState.Terminated
-                    terminated_count += 1
+    def _create_pods(self, count: int):
+        """Rent hosts for count new slots, packing up to SLOTS_PER_POD slots on each.
+
+        Hosts are rented on interruptible capacity while that keeps the share
+        of interruptible slots within spot_ratio.
+        """
+        while count > 0:
+            num_slots = min(count, max(1, self.config["slots_per_pod"]))
+            warm_up_plan = self._warm_up_plan()
+            live_pods = self._live_pods()
+            interruptible = (
+                sum(pod.host.interruptible for pod in live_pods) + num_slots <=
+                self.config["spot_ratio"] * (len(live_pods) + num_slots)
+            )
+            host = PodHost(self.gpu_type, self.volume_type, num_slots, warm_up_plan, interruptible)
+            for slot in range(num_slots):
+                self.pods.append(Pod(self.gpu_type, self.volume_type, warm_up_plan, host, slot))
+            count -= num_slots
+
+    def _idle_pods(self) -> List[Pod]:
+        """Pods that are not serving prompts and can be handed over."""
+        return [
+            pod for pod in self.pods
+            if pod.state != PodState.Terminated and not pod.draining and
+            (pod.init or pod.state == PodState.Free)
+        ]
+
+    def _hand_over_idle_pods(self):
+        """While draining, pass pods that are no longer needed to the successor and stop once empty."""
+        if self.queued_prompts.empty():
+            for pod in self._idle_pods():
+                self.pods.remove(pod)
+                self.cold_started_pods.discard(pod)
+                if not self._hand_over(pod):
+                    self.pods_to_destroy.append(pod)
+
+        if not self.pods and not self.processing_prompts and self.queued_prompts.empty():
+            self.state = PodManagerState.Stopped
+            self.prefetcher.shutdown()
+
+    def _hand_over(self, pod: Pod) -> bool:
+        """Give a pod to the newest successor that still takes pods.
+
+        A successor drained in turn may stop before this manager is done, so
+        stopped successors are skipped along the chain of drains.
+        """
+        successor = self.successor
+        while successor:
+            with successor.lock:
+                if successor.state in (PodManagerState.Running, PodManagerState.Draining):
+                    successor.pods.append(pod)
+                    return True
+            successor = successor.successor
+        return False
+
+    def _destroy_pods(self):
+        """Destroy the pods removed under the lock; deleting them calls the RunPod API, so it runs outside of it."""
+        with self.lock:
+            pods, self.pods_to_destroy = self.pods_to_destroy, []
+        for pod in pods:
+            pod.destroy()
+
+    def _warm_up_plan(self) -> List[WorkflowType]:
+        """Most requested workflows of the volume, to be warmed on new pods."""
+        counts = Counter(self.workflow_histories)
+        base_workflow = Prompt.get_base_prompt(self.volume_type).workflow_type
+        workflows = [
+            WorkflowType(value) for value in VOLUME_WORKFLOWS.get(str(self.volume_type.value), [])
+        ] or [base_workflow]
+        workflows.sort(key=lambda x: (-counts[x], x != base_workflow))
+        return workflows[:max(1, WARM_UP_WORKFLOWS)]
+
+    def _warm_up_idle_pods(self):
+        """Warm the remaining workflows on free pods while nothing is queued.
+
+        Failed warm-ups are retried with exponential backoff; a pod that keeps
+        failing to load a workflow is drained.
+        """
+        if not WARM_UP_IDLE or not self.queued_prompts.empty():
+            return
+        for pod in self._live_pods():
+            if pod.state != PodState.Free or pod.init or time.time() < pod.warm_up_retry_at:
+                continue
+            if max(pod.warm_up_failures.values(), default=0) >= WARM_UP_MAX_FAILURES:
+                print(f"Draining pod {pod.pod_id}: warm-up failed {WARM_UP_MAX_FAILURES} times")
+                pod.draining = True
+                continue
+            cold_workflows = pod.cold_workflows()
+            if cold_workflows:
+                pod.state = PodState.Processing
+                pod.count = 0
+                Thread(target=pod.warm_up, args=[cold_workflows[0]], daemon=True).start()
+
+    def _live_pods(self) -> List[Pod]:
+        """Pods that are not being drained."""
+        return [pod for pod in self.pods if not pod.draining]
+
+    def _eject_outlier_pods(self):
+        """Drain pods that are consistently slower or flakier than the rest of the fleet.
+
+        Error rates are compared with the fleet median, so a failure shared by
+        every pod ejects none, and at most HEALTH_MAX_EJECTED_RATIO of the pods
+        are draining at a time.
+        """
+        pods = [pod for pod in self.pods if pod.state != PodState.Terminated]
+        if sum(pod.draining for pod in pods) >= max(1, int(HEALTH_MAX_EJECTED_RATIO * len(pods))):
+            return
+        live_pods = [pod for pod in self._live_pods() if not pod.init]
+
+        error_rates = {
+            pod: pod.health.error_rate()
+            for pod in live_pods
+            if pod.health.sample_count() >= HEALTH_MIN_SAMPLES
+        }
+        if len(error_rates) >= 2:
+            fleet_error_rate = np.median(list(error_rates.values()))
+            pod, highest_error_rate = max(error_rates.items(), key=lambda x: x[1])
+            if highest_error_rate - fleet_error_rate > HEALTH_MAX_ERROR_RATE:
+                print(f"Draining flaky pod {pod.pod_id}: error rate {highest_error_rate:.2f}, fleet {fleet_error_rate:.2f}")
+                pod.draining = True
+                return
+
+        for workflow_type in WorkflowType:
+            times = {
+                pod: pod.health.execution_time(workflow_type)
+                for pod in live_pods
+            }
+            times = {pod: value for pod, value in times.items() if value is not None}
+            if len(times) < 2:
+                continue
             
-            for pod in sorted(self.pods, key=lambda x: (x.state != PodState.Free, x.count)):
-                if terminated_count >= excess_count:
-                    break
-                if pod.state == PodState.Free and pod.count > FREE_MAX_REMAINS:
-                    pod.state = PodState.Terminated
-                    terminated_count += 1
+            fleet_time = np.median(list(times.values()))
+            pod, slowest_time = max(times.items(), key=lambda x: x[1])
+            if slowest_time > fleet_time * HEALTH_SLOW_RATIO:
+                print(f"Draining slow pod {pod.pod_id}: {workflow_type.name} takes {slowest_time:.2f}s")
+                pod.draining = True
+                return
+
+        throughputs = {pod: pod.health.download_throughput() for pod in live_pods}
+        throughputs = {pod: value for pod, value in throughputs.items() if value is not None}
+        if len(throughputs) >= 2:
+            fleet_throughput = np.median(list(throughputs.values()))
+            pod, lowest_throughput = min(throughputs.items(), key=lambda x: x[1])
+            if lowest_throughput * HEALTH_SLOW_RATIO < fleet_throughput:
+                print(f"Draining slow pod {pod.pod_id}: downloads at {lowest_throughput:.0f} B/s")
+                pod.draining = True
+
+    def _publish_queue_positions(self):
+        """Emit an event for every queued prompt whose position in its lane changed."""
+        for lane in self.lanes:
+            for position, prompt in enumerate(self.queued_prompts.prompts(lane["name"])):
+                if prompt.queue_position != position:
+                    prompt.queue_position = position
+                    prompt.add_event("queue_position", {"position": position})
+
+    def _drop_expired_prompts(self):
+        """Drop queued prompts whose deadline passed before they could be dispatched."""
+        for prompt in self.queued_prompts.pop_expired(time.time()):
+            self._expire_prompt(prompt)
+
+    def _drop_invalid_prompts(self):
+        """Fail queued prompts whose input was rejected during preprocessing."""
+        for prompt in self.queued_prompts.prompts():
+            future = prompt.input_future
+            if not future or not future.done() or not isinstance(future.exception(), InputError):
+                continue
+            self.queued_prompts.remove(prompt.prompt_id)
+            prompt.result = PromptResult(
+                prompt.prompt_id,
+                OutputState.Failed,
+                str(future.exception())
+            )
+            prompt.add_event("failed", {"error": prompt.result.output})
+            self.journal.record_finished(prompt)
+            self.results.put(prompt)
+            self.invalid_count += 1
+
+    def _expire_prompt(self, prompt: Prompt):
+        """Report a prompt that was never dispatched before its deadline."""
+        prompt.result = PromptResult(
+            prompt.prompt_id,
+            OutputState.Expired,
+            "Deadline exceeded before dispatch"
+        )
+        prompt.add_event("expired")
+        self.journal.record_finished(prompt)
+        self.results.put(prompt)
+        self.expired_count += 1
+
+    def _scale_down_pods(self):
+        """Terminate pods beyond the target count when keeping them costs more than recreating them.
+
+        Live pods are ranked from most to least worth keeping, and only pods
+        ranked beyond num_pods are candidates, least valuable first. A
+        candidate is terminated when it runs the wrong GPU type, or when it is
+        about to start a new billing increment and the expected cost of cold
+        starting a replacement (cold-start time x probability that demand
+        reaches its rank) is below the cost of keeping it idle.
+        """
+        live_pods = self._live_pods()
+        if len(live_pods) <= self.num_pods:
+            return
+        
+        host_slots = Counter(pod.host for pod in live_pods)
+        fleet_times = {
+            workflow_type: [
+                value for value in (pod.health.execution_time(workflow_type) for pod in live_pods)
+                if value is not None
+            ]
+            for workflow_type in WorkflowType
+        }
+        ranked_pods = sorted(
+            live_pods,
+            key=lambda pod: self._retention_key(pod, host_slots, fleet_times),
+            reverse=True
+        )
+        for rank in range(len(ranked_pods) - 1, self.num_pods - 1, -1):
+            pod = ranked_pods[rank]
+            if pod.state != PodState.Free and not pod.init:
+                continue
+            if self._worth_terminating(pod, rank):
+                pod.state = PodState.Terminated
+
+    def _retention_key(self, pod: Pod, host_slots: Counter, fleet_times: Dict[WorkflowType, List[float]]):
+        """Sort key ordering pods from least to most worth keeping.
+
+        Busy pods come first, then pods of the right GPU type, ready pods, fast
+        pods, pods with more warm workflows and pods sharing a host with more
+        live slots, since freeing a slot only saves money once its host is empty.
+        """
+        return (
+            pod.state in (PodState.Processing, PodState.Completed) and not pod.init,
+            pod.gpu_type == self.gpu_type,
+            not pod.init,
+            self._relative_speed(pod, fleet_times),
+            len(pod.warm_workflows),
+            host_slots[pod.host]
+        )
+
+    def _relative_speed(self, pod: Pod, fleet_times: Dict[WorkflowType, List[float]]) -> float:
+        """Fleet median execution time over the pod's, averaged over workflows; 1 when unknown."""
+        ratios = []
+        for workflow_type, times in fleet_times.items():
+            pod_time = pod.health.execution_time(workflow_type)
+            if pod_time and len(times) >= 2:
+                ratios.append(np.median(times) / pod_time)
+        return float(np.mean(ratios)) if ratios else 1.
+
+    def _worth_terminating(self, pod: Pod, rank: int) -> bool:
+        if pod.gpu_type != self.gpu_type:
+            return True
+
+        billed_time = time.time() - pod.host.created_at
+        remaining_time = -billed_time % BILLING_INCREMENT
+        if not pod.init and remaining_time > BILLING_MARGIN:
+            return False
+
+        demand_probability = (
+            np.mean([load > rank for load in self.prompts_histories])
+            if self.prompts_histories else 0.
+        )
+        recreate_cost = demand_probability * self.admission.cold_start_time() * COLD_START_COST_FACTOR
+        return recreate_cost < max(self.config["idle_horizon"], BILLING_INCREMENT)
 
     def _process_pods(self):
         """Process each pod's state"""
@@ -129,16 +503,24 @@ class PodManager:
         
         for pod in self.pods:
             pod.count += 1
+
+            if pod.cold_start_time is not None and pod not in self.cold_started_pods:
+                self.cold_started_pods.add(pod)
+                self.admission.record_cold_start_time(pod.cold_start_time)
             
+            if pod.host.preempted and pod.state != PodState.Completed:
+                self._requeue_pod_prompts(pod)
+                pod.state = PodState.Terminated
+
             if pod.state == PodState.Completed:
                 self._handle_completed_pod(pod)
                 continue
 
-            if pod.state == PodState.Free and not pod.init and not self.queued_prompts.empty():
-                self._assign_prompt_to_pod(pod)
-                continue
+            if pod.state == PodState.Free and pod.draining:
+                pod.state = PodState.Terminated
                 
             if self._check_pod_timeout(pod):
+                self._fail_pod_prompts(pod, "Time out error")
                 pods_to_remove.append(pod)
                 continue
                 
@@ -147,27 +529,217 @@ class PodManager:
         
         for pod in pods_to_remove:
             if pod in self.pods:
-                pod.destroy()
+                self.pods_to_destroy.append(pod)
                 self.pods.remove(pod)
+                self.cold_started_pods.discard(pod)
+
+        self._dispatch_prompts()
+
+    def _lane_for(self, workflow_type: WorkflowType) -> str:
+        """Lane of a workflow according to its measured service time."""
+        service_time = self.admission.service_time(workflow_type)
+        for lane in self.lanes:
+            if lane["max_service_time"] is None or service_time <= lane["max_service_time"]:
+                return lane["name"]
+        return self.lanes[-1]["name"]
+
+    def _busy_pods_by_lane(self) -> Dict[str, int]:
+        """Number of pods currently processing prompts of each lane."""
+        busy_pods = {lane["name"]: 0 for lane in self.lanes}
+        for pod in self.pods:
+            prompts = [prompt for prompt in pod.current_prompts if prompt.prompt_id in self.processing_prompts]
+            if prompts:
+                busy_pods[prompts[0].lane] = busy_pods.get(prompts[0].lane, 0) + 1
+        return busy_pods
+
+    def _select_lane(self, num_free_pods: int, num_ready_pods: int, held_lanes: frozenset = frozenset()) -> Optional[str]:
+        """Pick the lane that gets the next free pod.
+
+        Lanes below their reserved capacity are served first. Otherwise a lane may
+        borrow a free pod as long as the remaining free pods still cover the unmet
+        reservations of shorter lanes, so long jobs never crowd out short ones.
+        Reservations are capped below the pool size so every lane can progress.
+        Held lanes are waiting for a batch to fill and are skipped.
+        """
+        busy_pods = self._busy_pods_by_lane()
+        unmet = {
+            lane["name"]: max(0, min(lane["reserved_pods"], num_ready_pods - 1) - busy_pods[lane["name"]])
+            for lane in self.lanes
+        }
+        candidates = [
+            lane["name"] for lane in self.lanes
+            if not self.queued_prompts.empty(lane["name"]) and lane["name"] not in held_lanes
+        ]
+
+        reserved = [lane for lane in candidates if unmet[lane] > 0]
+        if not reserved:
+            reserved = [
+                lane for lane in candidates
+                if num_free_pods - 1 >= sum(
+                    unmet[shorter["name"]] for shorter in self.lanes[:self._lane_index(lane)]
+                )
+            ]
+        if not reserved:
+            return None
+        return min(reserved, key=lambda lane: self.queued_prompts.peek(lane).deadline)
+
+    def _lane_index(self, name: str) -> int:
+        return next(index for index, lane in enumerate(self.lanes) if lane["name"] == name)
+
+    def _dispatch_prompts(self):
+        """Assign queued prompts to free pods."""
+        free_pods = [
+            pod for pod in self.pods 
+            if pod.state == PodState.Free and not pod.init and not pod.draining
+        ]
+        num_ready_pods = len([
+            pod for pod in self._live_pods() 
+            if not pod.init and pod.state != PodState.Terminated
+        ])
+        
+        held_lanes = set()
+        while free_pods and not self.queued_prompts.empty():
+            lane = self._select_lane(len(free_pods), num_ready_pods, frozenset(held_lanes))
+            if lane is None:
+                break
+            if self._waiting_for_batch(lane):
+                held_lanes.add(lane)
+                continue
+            pod = self._select_pod(free_pods, self.queued_prompts.peek(lane))
+            free_pods.remove(pod)
+            self._assign_prompt_to_pod(pod, lane)
+
+    def _batch_size(self, workflow_type: WorkflowType) -> int:
+        """Number of prompts of a workflow that may run in one execution."""
+        spec = load_batch_spec(workflow_type) if BATCHING_ENABLED else None
+        return min(BATCH_MAX_SIZE, spec.get("max_batch_size", BATCH_MAX_SIZE)) if spec else 1
+
+    def _waiting_for_batch(self, lane: str) -> bool:
+        """Hold back a batchable prompt briefly so more prompts of its workflow can join it."""
+        prompt = self.queued_prompts.peek(lane)
+        batch_size = self._batch_size(prompt.workflow_type)
+        if batch_size <= 1 or time.time() - prompt.created_at >= BATCH_WAIT_WINDOW:
+            return False
+        return len(self._batch_candidates(prompt)) < batch_size
+
+    def _batch_candidates(self, prompt: Prompt) -> List[Prompt]:
+        """Queued prompts of the same lane and workflow, in dispatch order."""
+        return [
+            queued for queued in self.queued_prompts.prompts(prompt.lane)
+            if queued.workflow_type == prompt.workflow_type
+        ]
+
+    def _select_pod(self, free_pods: List[Pod], prompt: Prompt) -> Pod:
+        """Free pod that has the prompt's workflow warm and whose ComfyUI cache can serve the most nodes."""
+        signatures = workflow_signatures(prompt.workflow_type)
+        return max(
+            free_pods,
+            key=lambda pod: (
+                prompt.workflow_type in pod.warm_workflows,
+                len(signatures & pod.cached_signatures)
+            )
+        )
+
+    def _requeue_pod_prompts(self, pod: Pod):
+        """Put the prompts of a preempted pod back in the queue with their original deadlines."""
+        for prompt in pod.current_prompts:
+            if self.processing_prompts.pop(prompt.prompt_id, None) is None:
+                continue
+            prompt.result = None
+            prompt.dispatched_at = None
+            prompt.add_event("requeued", {"reason": "preempted"})
+            self.journal.record_requeued(prompt)
+            self.queued_prompts.put(
+                prompt,
+                self.admission.service_time(prompt.workflow_type),
+                self._tenant_weight(prompt.tenant_id, prompt.priority)
+            )
+            self.requeued_count += 1
+        pod.current_prompts = []
+
+    def _fail_pod_prompts(self, pod: Pod, error: str):
+        """Fail the prompts of a pod that is removed before finishing them."""
+        for prompt in pod.current_prompts:
+            if prompt.prompt_id not in self.processing_prompts:
+                continue
+            prompt.result = PromptResult(prompt.prompt_id, OutputState.Failed, error)
+            self._handle_completed_prompt(prompt)
+        pod.current_prompts = []
+
+    def _replay_journal(self):
+        """Queue the prompts that were accepted but not finished before the last shutdown or crash.
+
+        Replayed prompts keep their IDs and deadlines and skip admission, so
+        clients keep polling the jobs they already have instead of resubmitting.
+        """
+        now = time.time()
+        for prompt in self.journal.unfinished(self.volume_type):
+            prompt.lane = self._lane_for(prompt.workflow_type)
+            if prompt.deadline <= now:
+                self._expire_prompt(prompt)
+                continue
+            if prompt.dispatched_at:
+                prompt.dispatched_at = None
+                self.journal.record_requeued(prompt)
+            if PREFETCH_INPUTS:
+                prompt.input_future = self.prefetcher.prefetch(prompt.input_url, prompt.workflow_type)
+            self.queued_prompts.put(
+                prompt,
+                self.admission.service_time(prompt.workflow_type),
+                self._tenant_weight(prompt.tenant_id, prompt.priority)
+            )
+            prompt.add_event("queued", {"lane": prompt.lane, "recovered": True})
+            self.recovered_count += 1
 
     def _handle_completed_pod(self, pod: Pod):
         """Handle a pod that has completed processing."""
-        prompt = pod.current_prompt
+        for prompt in pod.current_prompts:
+            self._handle_completed_prompt(prompt)
+        pod.state = PodState.Free
+        pod.count = 0
+
+    def _handle_completed_prompt(self, prompt: Prompt):
+        """Record the outcome of a finished prompt and store its result."""
         if prompt.result.output_state == OutputState.Completed:
-            self.completed_prompts[prompt.prompt_id] = prompt
+            self.admission.record_service_time(
+                prompt.workflow_type,
+                time.time() - prompt.dispatched_at
+            )
+            latencies = self.tenant_latencies.pop(prompt.tenant_id, None) or RollingStats()
+            latencies.add(time.time() - prompt.created_at)
+            self.tenant_latencies[prompt.tenant_id] = latencies
+            while len(self.tenant_latencies) > TENANT_CACHE_SIZE:
+                self.tenant_latencies.popitem(last=False)
+            if time.time() <= prompt.deadline:
+                self.in_time_count += 1
+            else:
+                self.late_count += 1
+            prompt.add_event("completed")
         else:
-            self.failed_prompts[prompt.prompt_id] = prompt
-            
+            prompt.add_event("failed", {"error": prompt.result.output})
+
+        self.journal.record_finished(prompt)
+        if prompt.abandoned:
+            prompt.result.discard()
+        else:
+            self.results.put(prompt)
         self.processing_prompts.pop(prompt.prompt_id, None)
-        pod.state = PodState.Free
-        pod.count = 0
 
-    def _assign_prompt_to_pod(self, pod: Pod):
-        """Assign a queued prompt to a pod."""
-        prompt = self.queued_prompts.get()
-        self.processing_prompts[prompt.prompt_id] = prompt
+    def _assign_prompt_to_pod(self, pod: Pod, lane: str):
+        """Assign the next queued prompt of a lane to a pod, batched with others of its workflow when enabled."""
+        prompts = [self.queued_prompts.get(lane)]
+        batch_size = self._batch_size(prompts[0].workflow_type)
+        for prompt in self._batch_candidates(prompts[0])[:batch_size - 1]:
+            prompts.append(self.queued_prompts.remove(prompt.prompt_id))
+
+        for prompt in prompts:
+            prompt.dispatched_at = time.time()
+            prompt.add_event("dispatched", {"batch_size": len(prompts)} if len(prompts) > 1 else None)
+            self.processing_prompts[prompt.prompt_id] = prompt
+        self.journal.record_dispatched(prompts)
+        pod.current_prompts = prompts
         pod.state = PodState.Processing
-        thread = Thread(target=pod.queue_prompt, args=[prompt], daemon=True)
+        thread = Thread(target=pod.queue_prompts, args=[prompts], daemon=True)
         thread.start()
         pod.count = 0
 
@@ -175,55 +747,327 @@ class PodManager:
         """Check if a pod has timed out based on its state."""
         return (
             (pod.state == PodState.Processing and 
-             ((pod.init and pod.count > COLD_TIMEOUT_RETRIES) or 
-              (not pod.init and pod.count > TIMEOUT_RETRIES))) or
-            (pod.state == PodState.Starting and pod.count > SERVER_CHECK_RETRIES) or
-            (pod.state == PodState.Initializing and pod.count > TIMEOUT_RETRIES) or
-            (pod.state == PodState.Completed and pod.count > FREE_MAX_REMAINS)
+             ((pod.init and pod.count > self.config["cold_timeout_retries"]) or 
+              (not pod.init and pod.count > self.config["timeout_retries"]))) or
+            (pod.state == PodState.Starting and pod.count > self.config["server_check_retries"]) or
+            (pod.state == PodState.Initializing and pod.count > self.config["timeout_retries"]) or
+            (pod.state == PodState.Completed and pod.count > self.config["free_max_remains"])
         )
 
-    def queue_prompt(self, workflow_type: WorkflowType, input_url: str) -> PromptResult:
-        """Queue a new prompt for processing and wait for result."""
+    def _tenant_weight(self, tenant_id: str, priority: int) -> float:
+        """Fair queueing weight of a tenant, falling back to the weight of its priority class."""
+        if tenant_id in TENANT_WEIGHTS:
+            return TENANT_WEIGHTS[tenant_id]
+        return PRIORITY_WEIGHTS.get(str(priority), 1)
+
+    def estimate_wait(self, workflow_type: WorkflowType, deadline: float) -> float:
+        """Estimate how long a new prompt with the given deadline would take to complete."""
+        ready_pods = [
+            pod for pod in self._live_pods() 
+            if not pod.init and pod.state != PodState.Terminated
+        ]
+        return self.admission.estimate_wait(
+            workflow_type,
+            [
+                prompt for prompt in self.queued_prompts.prompts(self._lane_for(workflow_type)) 
+                if prompt.deadline <= deadline
+            ],
+            list(self.processing_prompts.values()),
+            len(ready_pods),
+            self._boot_times()
+        )
+
+    def _boot_times(self) -> List[float]:
+        """How long each starting pod has been booting."""
+        now = time.time()
+        return [
+            now - pod.created_at for pod in self._live_pods()
+            if pod.init and pod.state != PodState.Terminated
+        ]
+
+    def boot_delay(self) -> float:
+        """Time until a pod can take prompts: 0 with a ready pod, otherwise until the first starting pod is ready."""
+        if any(not pod.init and pod.state != PodState.Terminated for pod in self._live_pods()):
+            return 0.
+        return self.admission.boot_delay(self._boot_times())
+
+    def submit_prompt(
+        self,
+        workflow_type: WorkflowType,
+        input_url: str,
+        latency_budget: Optional[float] = None,
+        tenant_id: str = "",
+        priority: int = 0,
+        idempotency_key: Optional[str] = None,
+        durable: bool = True
+    ) -> Prompt:
+        """Queue a new prompt without waiting; rejected prompts come back with their result set.
+
+        A repeated idempotency key of the same tenant returns the prompt it
+        first created. Durable prompts are journaled before they are queued.
+        """
+        if idempotency_key:
+            idempotency_key = f"{tenant_id}:{idempotency_key}"
         prompt_id = str(uuid.uuid4())
-        prompt = Prompt(prompt_id, workflow_type, input_url)
+        self.workflow_histories.append(workflow_type)
+        latency_budget = self.admission.latency_budget(workflow_type, latency_budget)
+        prompt = Prompt(
+            prompt_id,
+            workflow_type,
+            input_url,
+            time.time() + latency_budget,
+            tenant_id,
+            priority
+        )
+        prompt.lane = self._lane_for(workflow_type)
         
         with self.lock:
-            self.queued_prompts.put(prompt)
+            if idempotency_key:
+                existing = self._find_idempotent(idempotency_key)
+                if existing:
+                    return existing
+            if self.state != PodManagerState.Running:
+                retry_after = self.admission.retry_after(1)
+                prompt.result = PromptResult(
+                    prompt_id,
+                    OutputState.Rejected,
+                    "Server is draining",
+                    retry_after
+                )
+                prompt.add_event("rejected", {"retry_after": retry_after})
+                return prompt
+            # Until the first pod boots, the cold start is a one-off gap rather
+            # than queueing: it is left out of admission and extends the
+            # deadline, so the queue can drive the scale-up
+            boot_delay = self.boot_delay()
+            retry_after = self.admission.admit(
+                self.estimate_wait(workflow_type, prompt.deadline) - boot_delay,
+                latency_budget
+            )
+            if retry_after is not None:
+                prompt.result = PromptResult(
+                    prompt_id,
+                    OutputState.Rejected,
+                    "Server is overloaded",
+                    retry_after
+                )
+                prompt.add_event("rejected", {"retry_after": retry_after})
+                return prompt
+            prompt.deadline += boot_delay
+            if durable:
+                self.journal.record_submitted(prompt, self.volume_type, idempotency_key)
+            if idempotency_key:
+                self.idempotency_keys[idempotency_key] = prompt_id
+                while len(self.idempotency_keys) > IDEMPOTENCY_CACHE_SIZE:
+                    self.idempotency_keys.popitem(last=False)
+            if PREFETCH_INPUTS:
+                prompt.input_future = self.prefetcher.prefetch(input_url, workflow_type)
+            self.queued_prompts.put(
+                prompt,
+                self.admission.service_time(workflow_type),
+                self._tenant_weight(tenant_id, priority)
+            )
+            prompt.add_event("queued", {"lane": prompt.lane})
+        return prompt
+
+    def _find_idempotent(self, idempotency_key: str) -> Optional[Prompt]:
+        """Prompt previously created with an idempotency key."""
+        prompt_id = self.idempotency_keys.get(idempotency_key) or self.journal.find(idempotency_key)
+        if not prompt_id:
+            return None
+        return self._find_prompt(prompt_id) or self.journal.load(prompt_id)
 
-        for _ in range(SERVER_CHECK_RETRIES):
+    def wait_prompt(self, prompt_id: str, timeout: float) -> Optional[PromptResult]:
+        """Wait for a prompt to finish and pop its result, or return None on timeout."""
+        end_time = time.time() + timeout
+        while True:
             with self.lock:
-                if prompt_id in self.completed_prompts:
-                    return self.completed_prompts.pop(prompt_id).result
-                
-                if prompt_id in self.failed_prompts:
-                    return self.failed_prompts.pop(prompt_id).result
-            
+                if prompt_id in self.results:
+                    return self.results.pop(prompt_id).result
+
+            if time.time() >= end_time:
+                return None
             time.sleep(SERVER_CHECK_DELAY / 1000)
+
+    def queue_prompt(
+        self,
+        workflow_type: WorkflowType,
+        input_url: str,
+        latency_budget: Optional[float] = None,
+        tenant_id: str = "",
+        priority: int = 0
+    ) -> PromptResult:
+        """Queue a new prompt for processing and wait for result until its deadline."""
+        prompt = self.submit_prompt(
+            workflow_type,
+            input_url,
+            latency_budget,
+            tenant_id,
+            priority,
+            durable=False
+        )
+        if prompt.result:
+            return prompt.result
+        
+        result = self.wait_prompt(prompt.prompt_id, prompt.deadline - time.time())
+        if result:
+            return result
         
-        self.processing_prompts.pop(prompt_id, None)
-        return PromptResult(prompt_id, OutputState.Failed, "Time out error")
+        with self.lock:
+            if self.queued_prompts.remove(prompt.prompt_id):
+                self._expire_prompt(prompt)
+                return self.results.pop(prompt.prompt_id).result
+            if prompt.prompt_id in self.results:
+                return self.results.pop(prompt.prompt_id).result
+            prompt.abandoned = True
+            self.processing_prompts.pop(prompt.prompt_id, None)
+        return PromptResult(prompt.prompt_id, OutputState.Failed, "Time out error")
+
+    def _find_prompt(self, prompt_id: str) -> Optional[Prompt]:
+        """Look up a prompt that is queued, processing or waiting to be fetched."""
+        if prompt_id in self.processing_prompts:
+            return self.processing_prompts[prompt_id]
+        if prompt_id in self.results:
+            return self.results.get(prompt_id)
+        for prompt in self.queued_prompts.prompts():
+            if prompt.prompt_id == prompt_id:
+                return prompt
+        return self._load_finished_prompt(prompt_id)
+
+    def _load_finished_prompt(self, prompt_id: str) -> Optional[Prompt]:
+        """Finished prompt from the journal, once it has left the result store or the process restarted."""
+        prompt = self.journal.load(prompt_id)
+        return prompt if prompt and prompt.result else None
+
+    def get_prompt_status(self, prompt_id: str) -> Optional[Dict]:
+        """Get the status and queue position of a prompt."""
+        with self.lock:
+            prompt = self._find_prompt(prompt_id)
+            if not prompt:
+                return None
+
+            queue_position = None
+            if prompt.result:
+                status = prompt.result.output_state.name.lower()
+            elif prompt.prompt_id in self.processing_prompts:
+                status = "processing"
+            else:
+                status = "queued"
+                queue_position = [
+                    queued.prompt_id for queued in self.queued_prompts.prompts(prompt.lane)
+                ].index(prompt_id)
+
+            return {
+                "job_id": prompt.prompt_id,
+                "status": status,
+                "workflow_id": prompt.workflow_type.value,
+                "lane": prompt.lane,
+                "queue_position": queue_position,
+                "created_at": prompt.created_at,
+                "dispatched_at": prompt.dispatched_at,
+                "deadline": prompt.deadline
+            }
+
+    def get_prompt_events(self, prompt_id: str, after: int = -1) -> Optional[List[Dict]]:
+        """Get the events of a prompt newer than the given event ID."""
+        with self.lock:
+            prompt = self._find_prompt(prompt_id)
+            if not prompt:
+                return None
+            return [event for event in prompt.events if event["id"] > after]
+
+    def get_prompt_result(self, prompt_id: str) -> Optional[PromptResult]:
+        """Get the result of a finished prompt without releasing it."""
+        with self.lock:
+            prompt = self.results.get(prompt_id) or self._load_finished_prompt(prompt_id)
+            return prompt.result if prompt else None
+
+    def release_prompt_result(self, prompt_id: str, forget: bool = True) -> Optional[PromptResult]:
+        """Drop a finished prompt from memory and delete its spooled output; unless forget is off, erase its journal record too."""
+        with self.lock:
+            prompt = self.results.release(prompt_id) or self._load_finished_prompt(prompt_id)
+            if forget:
+                self.journal.forget(prompt_id)
+            return prompt.result if prompt else None
+
+    def unfinished_prompt_ids(self) -> List[str]:
+        """IDs of the queued and processing prompts."""
+        with self.lock:
+            return [prompt.prompt_id for prompt in self.queued_prompts.prompts()] + list(self.processing_prompts)
+
+    def evict_expired_results(self) -> None:
+        """Evict expired results; the process loop does this while the manager runs."""
+        with self.lock:
+            self.results.evict_expired(time.time())
 
     def stop(self):
         """Stop the PodManager and clean up resources."""
         with self.lock:
-            if self.state == PodManagerState.Running:
+            if self.state in (PodManagerState.Running, PodManagerState.Draining):
                 self.state = PodManagerState.Stopped
                 
-                self.queued_prompts = Queue()
+                self.queued_prompts = PromptQueue(SCHEDULING_POLICY)
                 self.processing_prompts.clear()
-                self.completed_prompts.clear()
-                self.failed_prompts.clear()
-                
-                while self.pods:
-                    pod = self.pods.pop()
-                    pod.destroy()
+                self.results.clear()
+                self.prefetcher.shutdown()
+                self.pods_to_destroy.extend(self.pods)
+                self.pods.clear()
+        self._destroy_pods()
+
+    def drain(self, successor: Optional["PodManager"] = None) -> List[Pod]:
+        """Stop admitting prompts and give idle pods to the successor.
+
+        Queued and in-flight prompts still run here; the pods serving them
+        follow once the queue is empty. Without a successor the pods are
+        destroyed instead. Returns the pods handed over right away.
+        """
+        with self.lock:
+            if self.state != PodManagerState.Running:
+                return []
+            self.state = PodManagerState.Draining
+            self.successor = successor
+            if not successor:
+                return []
+
+            successor.admission = copy.deepcopy(self.admission)
+            successor.workflow_histories.extend(self.workflow_histories)
+            successor.prompts_histories.extend(self.prompts_histories)
+            pods = self._idle_pods() if self.queued_prompts.empty() else []
+            for pod in pods:
+                self.pods.remove(pod)
+                self.cold_started_pods.discard(pod)
+            return pods
+
+    def get_config(self) -> Dict:
+        with self.lock:
+            return dict(self.config)
+
+    def configure(self, settings: Dict) -> Dict:
+        """Change scaling and timeout settings of a running manager."""
+        unknown = set(settings) - set(self.config)
+        if unknown:
+            raise ValueError(f"Unknown settings: {', '.join(sorted(unknown))}")
+        for key, value in settings.items():
+            if isinstance(value, bool) or not isinstance(value, (int, float)) or value < 0:
+                raise ValueError(f"{key} must be a non-negative number")
+
+        with self.lock:
+            config = {**self.config, **settings}
+            if config["min_pods"] > config["max_pods"]:
+                raise ValueError("min_pods must not exceed max_pods")
+            if config["spot_ratio"] > 1 or config["scaling_sensitivity"] > 100:
+                raise ValueError("spot_ratio must be at most 1 and scaling_sensitivity at most 100")
+            self.config = config
+            return dict(self.config)
 
     def restart(self):
         """Restart the PodManager if it was stopped."""
         with self.lock:
             if self.state == PodManagerState.Stopped:
                 self.state = PodManagerState.Running
+                self.prefetcher = InputPrefetcher()
                 self.process_thread = Thread(target=self._process_loop, daemon=True)
                 self.manage_thread = Thread(target=self._management_loop, daemon=True)
+                self._replay_journal()
                 self.process_thread.start()
                 self.manage_thread.start()
\ No newline at end of file
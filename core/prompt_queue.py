@@ -0,0 +1,99 @@
+import heapq
+import itertools
+from typing import Dict, List, Optional, Tuple
+
+from .types import *
+
+class PromptQueue:
+    """Queue of prompts split into lanes, each ordered by the scheduling policy.
+
+    Policies:
+        fifo: arrival order
+        edf: earliest deadline first
+        wfq: weighted fair queueing between tenants, using start-time fair
+             queueing tags with the expected service time as cost
+    """
+
+    def __init__(self, policy: str = "edf"):
+        if policy not in ("fifo", "edf", "wfq"):
+            raise ValueError(f"Unknown scheduling policy: {policy}")
+        self.policy = policy
+        self._lanes: Dict[str, list] = {}
+        self._counter = itertools.count()
+        self._virtual_times: Dict[str, float] = {}
+        self._finish_tags: Dict[Tuple[str, str], float] = {}
+
+    def put(self, prompt: Prompt, cost: float = 1., weight: float = 1.) -> None:
+        lane = self._lanes.setdefault(prompt.lane, [])
+        if self.policy == "wfq":
+            start_tag = max(
+                self._virtual_times.get(prompt.lane, 0.),
+                self._finish_tags.get((prompt.lane, prompt.tenant_id), 0.)
+            )
+            finish_tag = start_tag + cost / max(weight, 1e-6)
+            self._finish_tags[(prompt.lane, prompt.tenant_id)] = finish_tag
+            key = (start_tag, finish_tag)
+        elif self.policy == "edf":
+            key = (prompt.deadline,)
+        else:
+            key = (prompt.created_at,)
+        heapq.heappush(lane, (key, next(self._counter), prompt))
+
+    def get(self, lane: Optional[str] = None) -> Optional[Prompt]:
+        """Pop the next prompt, from one lane or from the lane with the most urgent head."""
+        lane = lane if lane is not None else self.earliest_lane()
+        if not self._lanes.get(lane):
+            return None
+        key, _, prompt = heapq.heappop(self._lanes[lane])
+        if self.policy == "wfq":
+            self._virtual_times[lane] = key[0]
+            # A finish tag behind the virtual time no longer delays its tenant
+            self._finish_tags = {
+                tenant: tag for tenant, tag in self._finish_tags.items()
+                if tenant[0] != lane or (self._lanes[lane] and tag > key[0])
+            }
+        return prompt
+
+    def peek(self, lane: str) -> Optional[Prompt]:
+        """Prompt that would be popped next from a lane."""
+        heap = self._lanes.get(lane)
+        return heap[0][2] if heap else None
+
+    def earliest_lane(self) -> Optional[str]:
+        """Lane whose next prompt has the earliest deadline."""
+        lanes = [(heap[0][2].deadline, lane) for lane, heap in self._lanes.items() if heap]
+        return min(lanes)[1] if lanes else None
+
+    def remove(self, prompt_id: str) -> Optional[Prompt]:
+        """Remove a queued prompt by ID."""
+        for heap in self._lanes.values():
+            for index, (_, _, prompt) in enumerate(heap):
+                if prompt.prompt_id == prompt_id:
+                    heap.pop(index)
+                    heapq.heapify(heap)
+                    return prompt
+        return None
+
+    def pop_expired(self, now: float) -> List[Prompt]:
+        """Remove and return prompts whose deadline has already passed."""
+        expired = []
+        for heap in self._lanes.values():
+            if not any(entry[2].deadline <= now for entry in heap):
+                continue
+            expired.extend(entry[2] for entry in heap if entry[2].deadline <= now)
+            heap[:] = [entry for entry in heap if entry[2].deadline > now]
+            heapq.heapify(heap)
+        return expired
+
+    def prompts(self, lane: Optional[str] = None) -> List[Prompt]:
+        """Queued prompts in dispatch order."""
+        heaps = [self._lanes.get(lane, [])] if lane is not None else self._lanes.values()
+        return [entry[2] for entry in sorted(entry for heap in heaps for entry in heap)]
+
+    def empty(self, lane: Optional[str] = None) -> bool:
+        return self.qsize(lane) == 0
+
+    def qsize(self, lane: Optional[str] = None) -> int:
+        if lane is not None:
+            return len(self._lanes.get(lane, []))
+        return sum(len(heap) for heap in self._lanes.values())
@@ -0,0 +1,163 @@
+import time
+from collections import deque
+from threading import Condition
+from typing import Dict, List, Optional, Tuple
+
+class Registry:
+    """Key-value store with expiring keys and queues, shared by the wrapper nodes of a cluster."""
+
+    def get(self, key: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None, nx: bool = False) -> bool:
+        """Store a value, only if the key is absent when nx is set; returns whether it was stored."""
+        raise NotImplementedError
+
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    def renew(self, key: str, value: bytes, ttl: float) -> bool:
+        """Extend the expiry of a key if it still holds the given value."""
+        raise NotImplementedError
+
+    def delete_if(self, key: str, value: bytes) -> bool:
+        """Delete a key if it still holds the given value."""
+        raise NotImplementedError
+
+    def push(self, key: str, value: bytes, ttl: Optional[float] = None) -> None:
+        """Append a value to a queue."""
+        raise NotImplementedError
+
+    def pop(self, key: str, timeout: float) -> Optional[bytes]:
+        """Pop the oldest value of a queue, waiting up to timeout seconds for one."""
+        raise NotImplementedError
+
+    def keys(self, prefix: str) -> List[str]:
+        raise NotImplementedError
+
+class LocalRegistry(Registry):
+    """In-process stand-in for Redis, for single-node setups and development."""
+
+    def __init__(self):
+        self._values: Dict[str, Tuple[bytes, Optional[float]]] = {}
+        self._queues: Dict[str, deque] = {}
+        self._condition = Condition()
+
+    def _live(self, key: str) -> Optional[bytes]:
+        entry = self._values.get(key)
+        if entry and entry[1] is not None and entry[1] <= time.time():
+            del self._values[key]
+            return None
+        return entry[0] if entry else None
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._condition:
+            return self._live(key)
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None, nx: bool = False) -> bool:
+        with self._condition:
+            if nx and self._live(key) is not None:
+                return False
+            self._values[key] = (value, time.time() + ttl if ttl else None)
+            return True
+
+    def delete(self, key: str) -> None:
+        with self._condition:
+            self._values.pop(key, None)
+            self._queues.pop(key, None)
+
+    def renew(self, key: str, value: bytes, ttl: float) -> bool:
+        with self._condition:
+            if self._live(key) != value:
+                return False
+            self._values[key] = (value, time.time() + ttl)
+            return True
+
+    def delete_if(self, key: str, value: bytes) -> bool:
+        with self._condition:
+            if self._live(key) != value:
+                return False
+            del self._values[key]
+            return True
+
+    def push(self, key: str, value: bytes, ttl: Optional[float] = None) -> None:
+        with self._condition:
+            self._queues.setdefault(key, deque()).append(value)
+            self._condition.notify_all()
+
+    def pop(self, key: str, timeout: float) -> Optional[bytes]:
+        end_time = time.time() + timeout
+        with self._condition:
+            while not self._queues.get(key):
+                remaining = end_time - time.time()
+                if remaining <= 0:
+                    return None
+                self._condition.wait(remaining)
+            return self._queues[key].popleft()
+
+    def keys(self, prefix: str) -> List[str]:
+        with self._condition:
+            return [key for key in list(self._values) if key.startswith(prefix) and self._live(key) is not None]
+
+class RedisRegistry(Registry):
+    RENEW_SCRIPT = """
+        if redis.call('get', KEYS[1]) == ARGV[1] then
+            return redis.call('pexpire', KEYS[1], ARGV[2])
+        end
+        return 0
+    """
+    DELETE_IF_SCRIPT = """
+        if redis.call('get', KEYS[1]) == ARGV[1] then
+            return redis.call('del', KEYS[1])
+        end
+        return 0
+    """
+
+    def __init__(self, url: str = "redis://localhost:6379/0"):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("redis is required for the Redis registry")
+
+        self.client = redis.Redis.from_url(url)
+        self._renew = self.client.register_script(self.RENEW_SCRIPT)
+        self._delete_if = self.client.register_script(self.DELETE_IF_SCRIPT)
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.client.get(key)
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None, nx: bool = False) -> bool:
+        return bool(self.client.set(key, value, px=int(ttl * 1000) if ttl else None, nx=nx))
+
+    def delete(self, key: str) -> None:
+        self.client.delete(key)
+
+    def renew(self, key: str, value: bytes, ttl: float) -> bool:
+        return bool(self._renew(keys=[key], args=[value, int(ttl * 1000)]))
+
+    def delete_if(self, key: str, value: bytes) -> bool:
+        return bool(self._delete_if(keys=[key], args=[value]))
+
+    def push(self, key: str, value: bytes, ttl: Optional[float] = None) -> None:
+        pipeline = self.client.pipeline()
+        pipeline.rpush(key, value)
+        if ttl:
+            pipeline.pexpire(key, int(ttl * 1000))
+        pipeline.execute()
+
+    def pop(self, key: str, timeout: float) -> Optional[bytes]:
+        item = self.client.blpop([key], timeout=max(timeout, 0.01))
+        return item[1] if item else None
+
+    def keys(self, prefix: str) -> List[str]:
+        return [key.decode("utf-8") for key in self.client.scan_iter(match=f"{prefix}*")]
+
+def create_registry(options: Dict) -> Registry:
+    """Create a registry from a {"type": "local" | "redis", ...} configuration."""
+    options = dict(options)
+    registry_type = options.pop("type", "local")
+    if registry_type == "local":
+        return LocalRegistry(**options)
+    if registry_type == "redis":
+        return RedisRegistry(**options)
+    raise ValueError(f"Unknown registry type: {registry_type}")
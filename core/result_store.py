@@ -0,0 +1,115 @@
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from .constants import *
+from .enums import *
+from .types import *
+
+class ResultStore:
+    """Finished prompts kept for their waiters, bounded by size and age.
+
+    In-memory outputs count against max_bytes. When the budget is exceeded
+    the oldest outputs are spilled to spill_directory, or evicted when no
+    spill directory is configured. Entries older than ttl are evicted along
+    with their files.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = RESULT_STORE_MAX_BYTES,
+        ttl: float = RESULT_STORE_TTL,
+        spill_directory: str = RESULT_STORE_SPILL_DIRECTORY
+    ):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.spill_directory = spill_directory
+        self._prompts: OrderedDict[str, Prompt] = OrderedDict()
+        self._stored_at: Dict[str, float] = {}
+        self.resident_bytes = 0
+        self.spilled_count = 0
+        self.evicted_count = 0
+
+    def __contains__(self, prompt_id: str) -> bool:
+        return prompt_id in self._prompts
+
+    def __len__(self) -> int:
+        return len(self._prompts)
+
+    def put(self, prompt: Prompt) -> None:
+        self._prompts[prompt.prompt_id] = prompt
+        self._stored_at[prompt.prompt_id] = time.time()
+        self.resident_bytes += self._resident_size(prompt)
+        self._enforce_budget()
+
+    def get(self, prompt_id: str) -> Optional[Prompt]:
+        return self._prompts.get(prompt_id)
+
+    def pop(self, prompt_id: str) -> Optional[Prompt]:
+        """Remove a prompt and hand its output over to the caller."""
+        prompt = self._prompts.pop(prompt_id, None)
+        if prompt:
+            self._stored_at.pop(prompt_id, None)
+            self.resident_bytes -= self._resident_size(prompt)
+        return prompt
+
+    def release(self, prompt_id: str) -> Optional[Prompt]:
+        """Remove a prompt and delete its output file."""
+        prompt = self.pop(prompt_id)
+        if prompt:
+            prompt.result.discard()
+        return prompt
+
+    def evict_expired(self, now: float) -> None:
+        """Evict entries older than the TTL."""
+        while self._prompts:
+            prompt_id = next(iter(self._prompts))
+            if now - self._stored_at[prompt_id] < self.ttl:
+                break
+            self.release(prompt_id)
+            self.evicted_count += 1
+
+    def clear(self) -> None:
+        while self._prompts:
+            self.release(next(iter(self._prompts)))
+
+    def count(self, output_state: OutputState) -> int:
+        return sum(prompt.result.output_state == output_state for prompt in self._prompts.values())
+
+    def _resident_size(self, prompt: Prompt) -> int:
+        output = prompt.result.output
+        return len(output) if isinstance(output, bytes) else 0
+
+    def _enforce_budget(self) -> None:
+        """Spill or evict the oldest in-memory outputs until the budget is met."""
+        for prompt_id in list(self._prompts):
+            if self.resident_bytes <= self.max_bytes:
+                return
+            prompt = self._prompts[prompt_id]
+            size = self._resident_size(prompt)
+            if size == 0:
+                continue
+            if self.spill_directory:
+                self._spill(prompt)
+                self.resident_bytes -= size
+                self.spilled_count += 1
+            else:
+                self.release(prompt_id)
+                self.evicted_count += 1
+
+    def _spill(self, prompt: Prompt) -> None:
+        os.makedirs(self.spill_directory, exist_ok=True)
+        path = os.path.join(self.spill_directory, prompt.prompt_id)
+        with open(path, 'wb') as file:
+            file.write(prompt.result.output)
+        prompt.result.output_path = path
+        prompt.result.output = None
+
+    def to_dict(self) -> Dict:
+        return {
+            "result_store_num": len(self._prompts),
+            "result_store_resident_bytes": self.resident_bytes,
+            "result_store_spilled_num": self.spilled_count,
+            "result_store_evicted_num": self.evicted_count
+        }
@@ -0,0 +1,415 @@
+import os
+import time
+import json
+import socket
+import struct
+import threading
+import socketserver
+from enum import Enum
+from threading import Lock
+from typing import Dict, List, Optional, Tuple
+
+from .constants import *
+from .pod_manager import *
+from .enums import *
+from .types import *
+
+FRAME_HEADER = struct.Struct("!II")
+SCHEDULER_METHODS = (
+    "submit_prompt",
+    "queue_prompt",
+    "get_prompt_status",
+    "get_prompt_events",
+    "get_prompt_result",
+    "release_prompt_result",
+    "get_state",
+    "get_config",
+    "configure",
+    "drain",
+    "restart",
+    "stop",
+    "health"
+)
+
+def pack_frame(header: Dict, payload: bytes = b"") -> bytes:
+    """Encode a JSON header and a binary payload, each prefixed by its length."""
+    data = json.dumps(header, default=lambda value: value.name if isinstance(value, Enum) else str(value)).encode("utf-8")
+    return FRAME_HEADER.pack(len(data), len(payload)) + data + payload
+
+def unpack_frame(data: bytes) -> Tuple[Dict, bytes]:
+    header_size, _ = FRAME_HEADER.unpack_from(data)
+    start = FRAME_HEADER.size
+    return json.loads(data[start:start + header_size]), data[start + header_size:]
+
+def send_frame(sock: socket.socket, header: Dict, payload: bytes = b"") -> None:
+    sock.sendall(pack_frame(header, payload))
+
+def recv_frame(sock: socket.socket) -> Optional[Tuple[Dict, bytes]]:
+    """Receive one frame, or None when the peer closed the connection."""
+    sizes = _recv_exactly(sock, FRAME_HEADER.size)
+    if sizes is None:
+        return None
+    header_size, payload_size = FRAME_HEADER.unpack(sizes)
+    data = _recv_exactly(sock, header_size + payload_size)
+    if data is None:
+        raise ConnectionError("Connection closed in the middle of a frame")
+    return json.loads(data[:header_size]), data[header_size:]
+
+def _recv_exactly(sock: socket.socket, size: int) -> Optional[bytes]:
+    buffer = bytearray()
+    while len(buffer) < size:
+        chunk = sock.recv(min(size - len(buffer), 1 << 20))
+        if not chunk:
+            return None
+        buffer += chunk
+    return bytes(buffer)
+
+def encode_result(result: Optional[PromptResult], include_output: bool = True) -> Tuple[Optional[Dict], bytes]:
+    """Split a result into its header fields and its binary output."""
+    if result is None:
+        return None, b""
+    binary = include_output and isinstance(result.output, bytes)
+    return {
+        "prompt_id": result.prompt_id,
+        "output_state": result.output_state.name,
+        "output": result.output if include_output and not binary else None,
+        "binary": binary,
+        "retry_after": result.retry_after,
+        "output_path": result.output_path,
+        "media_type": result.media_type,
+        "content_hash": result.content_hash
+    }, result.output if binary else b""
+
+def decode_result(fields: Optional[Dict], payload: bytes) -> Optional[PromptResult]:
+    if fields is None:
+        return None
+    return PromptResult(
+        fields["prompt_id"],
+        OutputState[fields["output_state"]],
+        payload if fields["binary"] else fields["output"],
+        fields["retry_after"],
+        fields["output_path"],
+        fields["media_type"],
+        fields["content_hash"]
+    )
+
+class Scheduler:
+    """The PodManager of a volume together with the drained managers that still hold jobs.
+
+    Runs inside the API process, or inside a SchedulerDaemon shared by any
+    number of API workers through a SchedulerClient.
+    """
+
+    def __init__(self, gpu_type: GPUType, volume_type: VolumeType):
+        self.manager = PodManager(gpu_type, volume_type)
+        self.retired: List[PodManager] = []
+        self.lock = Lock()
+
+    def managers(self) -> List[PodManager]:
+        """Current manager first, then retired managers that are still draining or hold results."""
+        with self.lock:
+            for manager in self.retired:
+                if manager.state == PodManagerState.Stopped:
+                    manager.evict_expired_results()
+            self.retired[:] = [
+                manager for manager in self.retired
+                if manager.state != PodManagerState.Stopped or len(manager.results)
+            ]
+            return [self.manager, *self.retired]
+
+    @property
+    def state(self) -> PodManagerState:
+        return self.manager.state
+
+    def submit_prompt(self, *args, **kwargs) -> Prompt:
+        return self.manager.submit_prompt(*args, **kwargs)
+
+    def queue_prompt(self, *args, **kwargs) -> PromptResult:
+        return self.manager.queue_prompt(*args, **kwargs)
+
+    def get_prompt_status(self, prompt_id: str) -> Optional[Dict]:
+        for manager in self.managers():
+            status = manager.get_prompt_status(prompt_id)
+            if status:
+                return status
+        return None
+
+    def get_prompt_events(self, prompt_id: str, after: int = -1) -> Optional[List[Dict]]:
+        for manager in self.managers():
+            events = manager.get_prompt_events(prompt_id, after)
+            if events is not None:
+                return events
+        return None
+
+    def get_prompt_result(self, prompt_id: str) -> Optional[PromptResult]:
+        for manager in self.managers():
+            result = manager.get_prompt_result(prompt_id)
+            if result:
+                return result
+        return None
+
+    def release_prompt_result(self, prompt_id: str, forget: bool = True) -> Optional[PromptResult]:
+        for manager in self.managers():
+            result = manager.release_prompt_result(prompt_id, forget)
+            if result:
+                return result
+        return None
+
+    def unfinished_prompt_ids(self) -> List[str]:
+        return [prompt_id for manager in self.managers() for prompt_id in manager.unfinished_prompt_ids()]
+
+    def get_state(self) -> Dict:
+        return self.manager.get_state()
+
+    def get_config(self) -> Dict:
+        return self.manager.get_config()
+
+    def configure(self, settings: Dict) -> Dict:
+        return self.manager.configure(settings)
+
+    def drain(self, config: Optional[Dict] = None) -> Dict:
+        """Drain the current manager into a new one that takes over its pods."""
+        with self.lock:
+            predecessor = self.manager
+            self.manager = PodManager(
+                predecessor.gpu_type,
+                predecessor.volume_type,
+                config,
+                predecessor
+            )
+            self.retired.append(predecessor)
+        return {"state": self.manager.state, "config": self.manager.get_config()}
+
+    def restart(self) -> None:
+        """Restart a stopped manager, or replace a running one gracefully."""
+        if self.manager.state == PodManagerState.Stopped:
+            self.manager.restart()
+        else:
+            self.drain()
+
+    def stop(self) -> None:
+        for manager in self.managers():
+            manager.stop()
+
+    def close(self) -> None:
+        self.stop()
+
+    def health(self) -> Dict:
+        """Whether new prompts can be served, and how much capacity is left."""
+        manager = self.manager
+        state = manager.get_state()
+        workflow_type = Prompt.get_base_prompt(manager.volume_type).workflow_type
+        latency_budget = manager.admission.latency_budget(workflow_type)
+        with manager.lock:
+            expected_wait = manager.estimate_wait(workflow_type, time.time() + latency_budget)
+            boot_delay = manager.boot_delay()
+        return {
+            "ready": state["state"] == PodManagerState.Running,
+            "saturated": expected_wait - boot_delay > latency_budget,
+            "capacity": {
+                "pod_num": state["total_pod_num"],
+                "free_pod_num": state["free_pod_num"],
+                "max_pod_num": manager.get_config()["max_pods"],
+                "queued_prompt_num": state["queued_prompt_num"],
+                "processing_prompt_num": state["processing_prompt_num"],
+                "expected_wait": expected_wait,
+                "boot_delay": boot_delay,
+                "latency_budget": latency_budget
+            }
+        }
+
+def call_scheduler(scheduler: Scheduler, method: str, args: List, kwargs: Dict) -> Tuple[Dict, bytes]:
+    """Run a scheduler method for a remote caller and encode its return value."""
+    if method not in SCHEDULER_METHODS:
+        raise ValueError(f"Unknown scheduler method: {method}")
+    if method in ("submit_prompt", "queue_prompt"):
+        args = [WorkflowType(args[0]), *args[1:]]
+
+    value = getattr(scheduler, method)(*args, **kwargs)
+    if isinstance(value, Prompt):
+        result, payload = encode_result(value.result)
+        return {"prompt": {"prompt_id": value.prompt_id, "result": result}}, payload
+    if isinstance(value, PromptResult) or method.endswith("_result"):
+        result, payload = encode_result(value, method != "release_prompt_result")
+        return {"result": result}, payload
+    return {"value": value}, b""
+
+def handle_request(scheduler: Scheduler, request: Dict) -> Tuple[Dict, bytes]:
+    """Answer a request frame, turning errors into error replies."""
+    try:
+        return call_scheduler(
+            scheduler,
+            request["method"],
+            request.get("args", []),
+            request.get("kwargs", {})
+        )
+    except ValueError as e:
+        return {"error": str(e), "type": "ValueError"}, b""
+    except Exception as e:
+        print(f"Error in scheduler call {request.get('method')}: {e}")
+        return {"error": str(e), "type": "RuntimeError"}, b""
+
+class SchedulerDaemon(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Serve a Scheduler to API workers over a Unix socket.
+
+    Each request is a frame whose header names the method and its arguments;
+    the reply carries the return value, or the error, with any result output
+    in the binary payload. Large outputs stay in spool files on the shared
+    disk and only their path is sent.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, scheduler: Scheduler, socket_path: str = SCHEDULER_SOCKET):
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        self.scheduler = scheduler
+        super().__init__(socket_path, SchedulerRequestHandler)
+
+    def server_close(self) -> None:
+        super().server_close()
+        if os.path.exists(self.server_address):
+            os.remove(self.server_address)
+
+class SchedulerRequestHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        while True:
+            frame = recv_frame(self.request)
+            if frame is None:
+                return
+            request, _ = frame
+            send_frame(self.request, *handle_request(self.server.scheduler, request))
+
+class SchedulerClient:
+    """Scheduler API of a SchedulerDaemon, with one connection per calling thread."""
+
+    def __init__(self, socket_path: str = SCHEDULER_SOCKET, timeout: Optional[float] = None):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self) -> socket.socket:
+        sock = getattr(self._local, "sock", None)
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(self.socket_path)
+            self._local.sock = sock
+        return sock
+
+    def _call(self, method: str, *args, **kwargs) -> Tuple[Dict, bytes]:
+        response, payload = self._send({"method": method, "args": list(args), "kwargs": kwargs})
+        if "error" in response:
+            if response["type"] == "ValueError":
+                raise ValueError(response["error"])
+            raise RuntimeError(response["error"])
+        return response, payload
+
+    def _send(self, request: Dict) -> Tuple[Dict, bytes]:
+        method = request["method"]
+        for attempt in range(2):
+            sock = self._connection()
+            try:
+                send_frame(sock, request)
+                frame = recv_frame(sock)
+                if frame is None:
+                    raise ConnectionError("Scheduler closed the connection")
+                break
+            except (ConnectionError, OSError):
+                self._local.sock = None
+                sock.close()
+                # Only resend requests that cannot have changed scheduler state
+                if attempt or not method.startswith("get_"):
+                    raise
+        return frame
+
+    @property
+    def state(self) -> PodManagerState:
+        return self.get_state()["state"]
+
+    def submit_prompt(
+        self,
+        workflow_type: WorkflowType,
+        input_url: str,
+        latency_budget: Optional[float] = None,
+        tenant_id: str = "",
+        priority: int = 0,
+        idempotency_key: Optional[str] = None,
+        durable: bool = True
+    ) -> Prompt:
+        response, payload = self._call(
+            "submit_prompt",
+            workflow_type.value,
+            input_url,
+            latency_budget,
+            tenant_id,
+            priority,
+            idempotency_key,
+            durable
+        )
+        prompt = Prompt(response["prompt"]["prompt_id"], workflow_type, input_url, tenant_id=tenant_id, priority=priority)
+        prompt.result = decode_result(response["prompt"]["result"], payload)
+        return prompt
+
+    def queue_prompt(
+        self,
+        workflow_type: WorkflowType,
+        input_url: str,
+        latency_budget: Optional[float] = None,
+        tenant_id: str = "",
+        priority: int = 0
+    ) -> PromptResult:
+        response, payload = self._call(
+            "queue_prompt",
+            workflow_type.value,
+            input_url,
+            latency_budget,
+            tenant_id,
+            priority
+        )
+        return decode_result(response["result"], payload)
+
+    def get_prompt_status(self, prompt_id: str) -> Optional[Dict]:
+        return self._call("get_prompt_status", prompt_id)[0]["value"]
+
+    def get_prompt_events(self, prompt_id: str, after: int = -1) -> Optional[List[Dict]]:
+        return self._call("get_prompt_events", prompt_id, after)[0]["value"]
+
+    def get_prompt_result(self, prompt_id: str) -> Optional[PromptResult]:
+        response, payload = self._call("get_prompt_result", prompt_id)
+        return decode_result(response["result"], payload)
+
+    def release_prompt_result(self, prompt_id: str) -> Optional[PromptResult]:
+        response, payload = self._call("release_prompt_result", prompt_id)
+        return decode_result(response["result"], payload)
+
+    def get_state(self) -> Dict:
+        state = self._call("get_state")[0]["value"]
+        state["state"] = PodManagerState[state["state"]]
+        return state
+
+    def get_config(self) -> Dict:
+        return self._call("get_config")[0]["value"]
+
+    def configure(self, settings: Dict) -> Dict:
+        return self._call("configure", settings)[0]["value"]
+
+    def drain(self, config: Optional[Dict] = None) -> Dict:
+        value = self._call("drain", config)[0]["value"]
+        value["state"] = PodManagerState[value["state"]]
+        return value
+
+    def restart(self) -> None:
+        self._call("restart")
+
+    def stop(self) -> None:
+        self._call("stop")
+
+    def health(self) -> Dict:
+        return self._call("health")[0]["value"]
+
+    def close(self) -> None:
+        sock = getattr(self._local, "sock", None)
+        if sock:
+            sock.close()
+            self._local.sock = None
@@ -0,0 +1,100 @@
+import numpy as np
+from threading import Lock
+from collections import deque
+from typing import Dict, Optional
+
+from .constants import *
+from .enums import *
+
+class RollingStats:
+    def __init__(self, window: int = HEALTH_WINDOW):
+        self.values = deque([], maxlen=window)
+
+    def add(self, value: float) -> None:
+        self.values.append(value)
+
+    def count(self) -> int:
+        return len(self.values)
+
+    def mean(self) -> Optional[float]:
+        return float(np.mean(self.values)) if self.values else None
+
+    def median(self) -> Optional[float]:
+        return float(np.median(self.values)) if self.values else None
+
+    def percentile(self, percent: float) -> Optional[float]:
+        return float(np.percentile(self.values, percent)) if self.values else None
+
+class PodHealth:
+    def __init__(self, window: int = HEALTH_WINDOW):
+        self._lock = Lock()
+        self.window = window
+        self.execution_times: Dict[WorkflowType, RollingStats] = {}
+        self.download_throughputs = RollingStats(window)
+        self.outcomes = deque([], maxlen=window)
+        self.cached_nodes = 0
+        self.executed_nodes = 0
+
+    def record_success(
+        self,
+        workflow_type: WorkflowType,
+        execution_time: float,
+        download_bytes: int,
+        download_time: float
+    ) -> None:
+        """Record a successful execution on the pod."""
+        with self._lock:
+            if workflow_type not in self.execution_times:
+                self.execution_times[workflow_type] = RollingStats(self.window)
+            self.execution_times[workflow_type].add(execution_time)
+            if download_time > 0:
+                self.download_throughputs.add(download_bytes / download_time)
+            self.outcomes.append(False)
+
+    def record_failure(self, workflow_type: WorkflowType) -> None:
+        """Record a failed execution on the pod."""
+        with self._lock:
+            self.outcomes.append(True)
+
+    def record_cache(self, cached_nodes: int, executed_nodes: int) -> None:
+        """Record how many graph nodes ComfyUI served from its cache versus executed."""
+        with self._lock:
+            self.cached_nodes += cached_nodes
+            self.executed_nodes += executed_nodes
+
+    def sample_count(self) -> int:
+        with self._lock:
+            return len(self.outcomes)
+
+    def error_rate(self) -> float:
+        with self._lock:
+            return sum(self.outcomes) / len(self.outcomes) if self.outcomes else 0.
+
+    def execution_time(self, workflow_type: WorkflowType) -> Optional[float]:
+        """Median execution time of a workflow, if enough samples were recorded."""
+        with self._lock:
+            stats = self.execution_times.get(workflow_type)
+            if not stats or stats.count() < HEALTH_MIN_SAMPLES:
+                return None
+            return stats.median()
+
+    def download_throughput(self) -> Optional[float]:
+        """Median download throughput in bytes per second, if enough samples were recorded."""
+        with self._lock:
+            if self.download_throughputs.count() < HEALTH_MIN_SAMPLES:
+                return None
+            return self.download_throughputs.median()
+
+    def to_dict(self) -> Dict:
+        with self._lock:
+            return {
+                "samples": len(self.outcomes),
+                "error_rate": sum(self.outcomes) / len(self.outcomes) if self.outcomes else 0.,
+                "execution_times": {
+                    workflow_type.name: stats.median()
+                    for workflow_type, stats in self.execution_times.items()
+                },
+                "download_throughput": self.download_throughputs.median(),
+                "cached_node_num": self.cached_nodes,
+                "executed_node_num": self.executed_nodes
+            }
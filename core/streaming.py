@@ -0,0 +1,130 @@
+import re
+import base64
+from typing import Callable, Iterable, Iterator, Optional, Tuple
+from fastapi import HTTPException
+from starlette.background import BackgroundTask
+from starlette.responses import Response, StreamingResponse
+
+DEFAULT_CHUNK_SIZE = 1 << 20
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """Parse a single HTTP byte range into inclusive (start, end) offsets.
+
+    Returns None when no usable range was requested and raises ValueError
+    when the range cannot be satisfied.
+    """
+    if not header:
+        return None
+    match = re.fullmatch(r"\s*bytes=(\d*)-(\d*)\s*", header)
+    if not match or match.group(1) == match.group(2) == "":
+        return None
+
+    if match.group(1) == "":
+        length = int(match.group(2))
+        if length == 0 or size == 0:
+            raise ValueError("Unsatisfiable range")
+        return max(0, size - length), size - 1
+
+    start = int(match.group(1))
+    end = int(match.group(2)) if match.group(2) else size - 1
+    if start >= size or end < start:
+        raise ValueError("Unsatisfiable range")
+    return start, min(end, size - 1)
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Check an If-None-Match header against an ETag using weak comparison."""
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(',')]
+    return "*" in tags or etag.removeprefix('W/') in [tag.removeprefix('W/') for tag in tags]
+
+def iter_file(
+    path: str,
+    start: int = 0,
+    end: Optional[int] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> Iterator[bytes]:
+    """Yield the inclusive byte range of a file in chunks."""
+    with open(path, 'rb') as file:
+        file.seek(start)
+        remaining = None if end is None else end - start + 1
+        while remaining is None or remaining > 0:
+            chunk = file.read(chunk_size if remaining is None else min(chunk_size, remaining))
+            if not chunk:
+                return
+            if remaining is not None:
+                remaining -= len(chunk)
+            yield chunk
+
+def iter_base64(data: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[bytes]:
+    """Decode a base64 string in chunks instead of materializing the whole payload."""
+    step = chunk_size // 3 * 4
+    for offset in range(0, len(data), step):
+        yield base64.b64decode(data[offset:offset + step])
+
+def iter_base64_encoded(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """Base64-encode chunks as they come instead of joining them first.
+
+    Bytes are carried over between chunks so every piece but the last encodes
+    a multiple of 3 bytes, and the pieces concatenate to one valid encoding.
+    """
+    remainder = b""
+    for chunk in chunks:
+        chunk = remainder + chunk
+        cut = len(chunk) - len(chunk) % 3
+        remainder = chunk[cut:]
+        if cut:
+            yield base64.b64encode(chunk[:cut])
+    if remainder:
+        yield base64.b64encode(remainder)
+
+def ranged_response(
+    size: int,
+    chunks: Callable[[int, int], Iterable[bytes]],
+    media_type: Optional[str],
+    range_header: Optional[str] = None,
+    etag: Optional[str] = None,
+    if_none_match: Optional[str] = None,
+    cache_control: Optional[str] = None,
+    on_close: Optional[Callable[[], None]] = None
+) -> Response:
+    """Serve a download of size bytes with conditional and single-range request support.
+
+    chunks yields the inclusive byte range it is given. on_close runs once the
+    response is sent, or right away when the client's copy is still current.
+    """
+    cache_headers = {}
+    if etag:
+        cache_headers["ETag"] = etag
+    if cache_control:
+        cache_headers["Cache-Control"] = cache_control
+
+    if etag and etag_matches(if_none_match, etag):
+        if on_close:
+            on_close()
+        return Response(status_code=304, headers=cache_headers)
+
+    try:
+        byte_range = parse_range(range_header, size)
+    except ValueError:
+        raise HTTPException(
+            status_code=416,
+            detail="Requested range not satisfiable",
+            headers={"Content-Range": f"bytes */{size}"}
+        )
+
+    start, end = byte_range or (0, size - 1)
+    headers = {
+        "Accept-Ranges": "bytes",
+        "Content-Length": str(end - start + 1),
+        **cache_headers
+    }
+    if byte_range:
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    return StreamingResponse(
+        chunks(start, end),
+        status_code=206 if byte_range else 200,
+        media_type=media_type,
+        headers=headers,
+        background=BackgroundTask(on_close) if on_close else None
+    )
@@ -1,4 +1,7 @@
+import os
+import time
 import uuid
+from typing import Dict, List, Optional
 
 from .enums import *
 from .constants import *
@@ -13,32 +16,114 @@ class PodInfo:
         self.public_ip = public_ip
 
 class PromptResult:
+    __slots__ = (
+        "prompt_id",
+        "output_state",
+        "output",
+        "retry_after",
+        "output_path",
+        "media_type",
+        "content_hash"
+    )
+
     def __init__(
         self,
         prompt_id: str,
         output_state: OutputState,
-        output
+        output,
+        retry_after: Optional[int] = None,
+        output_path: Optional[str] = None,
+        media_type: str = "image/jpeg",
+        content_hash: Optional[str] = None
     ):
         self.prompt_id = prompt_id
         self.output_state = output_state
         self.output = output
+        self.retry_after = retry_after
+        self.output_path = output_path
+        self.media_type = media_type
+        self.content_hash = content_hash
+
+    def discard(self) -> None:
+        """Remove the spooled output file, if any."""
+        if self.output_path and os.path.exists(self.output_path):
+            os.remove(self.output_path)
 
 class Prompt:
+    # Events that are superseded by their next occurrence
+    LATEST_ONLY_EVENTS = ("progress", "queue_position")
+
+    __slots__ = (
+        "prompt_id",
+        "workflow_type",
+        "input_url",
+        "result",
+        "created_at",
+        "dispatched_at",
+        "deadline",
+        "lane",
+        "tenant_id",
+        "priority",
+        "events",
+        "next_event_id",
+        "queue_position",
+        "abandoned",
+        "input_future"
+    )
+
     def __init__(
         self,
         prompt_id: str,
         workflow_type: WorkflowType,
-        input_url: str
+        input_url: str,
+        deadline: Optional[float] = None,
+        tenant_id: str = "",
+        priority: int = 0
     ):
         self.prompt_id = prompt_id
         self.workflow_type = workflow_type
         self.input_url = input_url
         self.result: PromptResult = None
+        self.created_at = time.time()
+        self.dispatched_at: Optional[float] = None
+        self.deadline = deadline or self.created_at + DEFAULT_LATENCY_BUDGET
+        self.lane = ""
+        self.tenant_id = tenant_id
+        self.priority = priority
+        self.events: List[Dict] = []
+        self.next_event_id = 0
+        self.queue_position: Optional[int] = None
+        self.abandoned = False
+        self.input_future = None
+
+    def add_event(self, event: str, data: Optional[Dict] = None) -> None:
+        """Append a lifecycle or progress event for streaming to clients.
+
+        Only the latest progress and queue_position events are kept, so the
+        list stays bounded however many sampler steps or queue moves there are.
+        Event IDs keep increasing, so readers resume after the last ID they saw.
+        """
+        if event in self.LATEST_ONLY_EVENTS:
+            self.events = [item for item in self.events if item["event"] != event]
+        self.events.append({
+            "id": self.next_event_id,
+            "event": event,
+            "time": time.time(),
+            "data": data or {}
+        })
+        self.next_event_id += 1
 
     def get_base_prompt(
-        volume_type: VolumeType
+        volume_type: VolumeType,
+        workflow_type: Optional[WorkflowType] = None
     ):
-        if volume_type == VolumeType.EasyControl:
+        if workflow_type:
+            return Prompt(
+                str(uuid.uuid4()),
+                workflow_type,
+                ORIGIN_IMAGE_URL
+            )
+        elif volume_type == VolumeType.EasyControl:
             return Prompt(
                 str(uuid.uuid4()),
                 WorkflowType.Ghibli,
@@ -1,18 +1,41 @@
 import runpod
 import os
+import time
+import mimetypes
 import asyncio
 import aiohttp
 import base64
 from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException, Response
+from typing import Optional
+from fastapi import FastAPI, Header, HTTPException, Response
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from runpod import AsyncioEndpoint, AsyncioJob
 
+from core.streaming import iter_base64, iter_file, ranged_response
+from core.blob_store import LocalBlobStore, create_blob_store, offload
+
 load_dotenv()
 runpod.api_key = os.getenv("RUNPOD_API")
 # MAX_WORKER = os.getenv("MAX_WORKER", 30)
 ORIGIN_IMAGE_URL = os.getenv('ORIGIN_IMAGE_URL')
 # FILLED_URGENT_PODS = False
+OUTPUT_MODE = os.getenv('OUTPUT_MODE') or 'inline'
+BLOB_URL_EXPIRES = int(os.getenv('BLOB_URL_EXPIRES') or 3600)
+blob_store = create_blob_store({
+    "type": "local",
+    "directory": os.getenv('BLOB_STORE_DIRECTORY') or '/tmp/wrapper-blobs',
+    "base_url": os.getenv('BLOB_STORE_BASE_URL') or 'http://localhost:8000/api/blobs',
+    "secret": os.getenv('BLOB_STORE_SECRET') or '',
+    "ttl": float(os.getenv('BLOB_STORE_TTL') or 7200)
+} if (os.getenv('BLOB_STORE_TYPE') or 'local') == 'local' else {
+    "type": "s3",
+    "bucket": os.getenv('S3_BUCKET'),
+    "endpoint_url": os.getenv('S3_ENDPOINT_URL'),
+    "access_key": os.getenv('S3_ACCESS_KEY'),
+    "secret_key": os.getenv('S3_SECRET_KEY'),
+    "region": os.getenv('S3_REGION')
+})
 
 app = FastAPI()
 
@@ -26,6 +49,20 @@ app.add_middleware(
 
 images = {}
 
+async def output_response(data: str, media_type: str, output_mode: str):
+    if output_mode == "url":
+        return JSONResponse(content=await asyncio.to_thread(
+            offload,
+            blob_store,
+            iter_base64(data),
+            media_type,
+            BLOB_URL_EXPIRES
+        ))
+    return StreamingResponse(
+        iter_base64(data),
+        media_type=media_type
+    )
+
 # def calc_available():
 #     global AVAILABLE_NORMAL_WORKER, AVAILABLE_URGENT_WORKER, FILLED_URGENT_PODS, FILLED_NORMAL_PODS
 
@@ -138,10 +175,10 @@ async def prompt1(query: dict):
         #     output = await run(url)
 
         base64_image = output["message"]
-        decoded_bytes = base64.b64decode(base64_image)
-        return Response(
-            content=decoded_bytes,
-            media_type=f"image/jpeg"
+        return await output_response(
+            base64_image,
+            "image/jpeg",
+            query.get("output_mode", OUTPUT_MODE)
         )
 
     except Exception as e:  
@@ -180,10 +217,10 @@ async def prompt2(query: dict):
         output = await run_easycontrol(url, workflow_id=workflow_id)
 
         base64_image = output["message"]
-        decoded_bytes = base64.b64decode(base64_image)
-        return Response(
-            content=decoded_bytes,
-            media_type=f"image/jpeg"
+        return await output_response(
+            base64_image,
+            "image/jpeg",
+            query.get("output_mode", OUTPUT_MODE)
         )
 
     except Exception as e:  
@@ -201,10 +238,10 @@ async def prompt3(query: dict):
         output = await run(url, workflow_id=workflow_id)
 
         base64_video = output["message"]
-        decoded_bytes = base64.b64decode(base64_video)
-        return Response(
-            content=decoded_bytes,
-            media_type=f"video/mp4"
+        return await output_response(
+            base64_video,
+            "video/mp4",
+            query.get("output_mode", OUTPUT_MODE)
         )
 
     except Exception as e:  
@@ -213,6 +250,36 @@ async def prompt3(query: dict):
             detail=f"Error during job execution: {str(e)}"
         )
 
+@app.get('/api/blobs/{key}')
+def get_blob(
+    key: str,
+    expires: int,
+    signature: str,
+    range: Optional[str] = Header(None),
+    if_none_match: Optional[str] = Header(None)
+):
+    if not isinstance(blob_store, LocalBlobStore) or \
+        not blob_store.verify(key, expires, signature):
+        raise HTTPException(
+            status_code=403,
+            detail="Invalid or expired blob URL"
+        )
+    path = blob_store.path(key)
+    try:
+        size = os.path.getsize(path)
+    except FileNotFoundError:
+        # Expired between the signature check and now
+        raise HTTPException(status_code=404, detail="Blob not found")
+    return ranged_response(
+        size,
+        lambda start, end: iter_file(path, start, end),
+        mimetypes.guess_type(key)[0] or "application/octet-stream",
+        range,
+        f'"{key.split(".")[0]}"',
+        if_none_match,
+        f"public, max-age={max(0, expires - int(time.time()))}, immutable"
+    )
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(
@@ -0,0 +1,31 @@
+import signal
+
+from core.scheduler import *
+from core.cluster import *
+
+if __name__ == "__main__":
+    if not SCHEDULER_SOCKET:
+        raise SystemExit("SCHEDULER_SOCKET must be set to run the scheduler daemon")
+
+    if CLUSTER_REGISTRY:
+        scheduler = ClusterScheduler(
+            GPUType.RTXA6000,
+            VolumeType.EasyControl,
+            create_registry(CLUSTER_REGISTRY)
+        )
+    else:
+        scheduler = Scheduler(
+            GPUType.RTXA6000,
+            VolumeType.EasyControl
+        )
+    daemon = SchedulerDaemon(scheduler, SCHEDULER_SOCKET)
+    signal.signal(signal.SIGTERM, lambda *_: threading.Thread(target=daemon.shutdown).start())
+    print(f"Scheduler listening on {SCHEDULER_SOCKET}")
+
+    try:
+        daemon.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        daemon.server_close()
+        scheduler.close()
@@ -1,18 +1,34 @@
-from fastapi import FastAPI, HTTPException, Response
+import os
+import hmac
+import json
+import base64
+import anyio
+import asyncio
+import mimetypes
+from typing import Iterator, Optional, Tuple
+from fastapi import FastAPI, Header, HTTPException, Response
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.concurrency import iterate_in_threadpool
 from contextlib import asynccontextmanager
 
 from core.pod_manager import *
+from core.scheduler import *
+from core.cluster import *
+from core.streaming import *
+from core.blob_store import *
 
 easycontrol_manager = None
+blob_store = None
 # magicvideo_manager = None
 logging_thread = None
 
 def log_state():
     while True:
-        if easycontrol_manager:
-            easycontrol_manager_state = easycontrol_manager.get_state()
-            print(f"{easycontrol_manager_state["state"].name}  \
+        try:
+            if easycontrol_manager:
+                easycontrol_manager_state = easycontrol_manager.get_state()
+                print(f"{easycontrol_manager_state["state"].name}  \
   {easycontrol_manager_state["total_pod_num"]}  \
   {easycontrol_manager_state["initializing_pod_num"]}  \
   {easycontrol_manager_state["starting_pod_num"]}  \
@@ -24,7 +40,9 @@ def log_state():
   {easycontrol_manager_state["processing_prompt_num"]}  \
   {easycontrol_manager_state["completed_prompt_num"]}  \
   {easycontrol_manager_state["failed_prompt_num"]}", end="\r")
-            time.sleep(3)
+        except Exception as e:
+            print(f"Error logging state: {e}")
+        time.sleep(3)
 
 def start_logging_thread():
     from threading import Thread
@@ -36,12 +54,24 @@ def start_logging_thread():
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    global easycontrol_manager, logging_thread
+    global easycontrol_manager, logging_thread, blob_store
     
-    easycontrol_manager = PodManager(
-        GPUType.RTXA6000,
-        VolumeType.EasyControl
-    )
+    if API_WORKERS > 1 and BLOB_STORE.get("type", "local") == "local" and not BLOB_STORE.get("secret"):
+        raise RuntimeError("BLOB_STORE needs a shared secret when several API workers sign blob URLs")
+    blob_store = create_blob_store(BLOB_STORE)
+    if SCHEDULER_SOCKET:
+        easycontrol_manager = SchedulerClient(SCHEDULER_SOCKET)
+    elif CLUSTER_REGISTRY:
+        easycontrol_manager = ClusterScheduler(
+            GPUType.RTXA6000,
+            VolumeType.EasyControl,
+            create_registry(CLUSTER_REGISTRY)
+        )
+    else:
+        easycontrol_manager = Scheduler(
+            GPUType.RTXA6000,
+            VolumeType.EasyControl
+        )
     
     logging_thread = Thread(target=log_state, daemon=True)
     logging_thread.start()
@@ -49,7 +79,7 @@ async def lifespan(app: FastAPI):
     yield
     
     if easycontrol_manager:
-        easycontrol_manager.stop()
+        easycontrol_manager.close()
     if logging_thread:
         terminate_thread(logging_thread)
 
@@ -63,8 +93,102 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+def get_manager(workflow_id: int) -> Scheduler:
+    if workflow_id == 1 or \
+        workflow_id == 2 or \
+        workflow_id == 4:
+        return easycontrol_manager
+    raise HTTPException(
+        status_code=400,
+        detail=f"Unsupported workflow: {workflow_id}"
+    )
+
+def output_response(
+    result: PromptResult,
+    range_header: Optional[str] = None,
+    release: bool = False,
+    if_none_match: Optional[str] = None,
+    cache_control: Optional[str] = None
+) -> Response:
+    if result.output_path:
+        size = os.path.getsize(result.output_path)
+        chunks = lambda start, end: iter_file(result.output_path, start, end, STREAM_CHUNK_SIZE)
+    else:
+        size = len(result.output)
+        chunks = lambda start, end: iter([result.output[start:end + 1]])
+    return ranged_response(
+        size,
+        chunks,
+        result.media_type,
+        range_header,
+        f'"{result.content_hash}"' if result.content_hash else None,
+        if_none_match,
+        cache_control,
+        result.discard if release else None
+    )
+
+def url_response(result: PromptResult, release: bool = False) -> Response:
+    if result.output_path:
+        chunks = iter_file(result.output_path, chunk_size=STREAM_CHUNK_SIZE)
+    else:
+        chunks = [result.output]
+    payload = offload(blob_store, chunks, result.media_type, BLOB_URL_EXPIRES)
+    if release:
+        result.discard()
+    return JSONResponse(content=payload)
+
+def result_response(
+    result: PromptResult,
+    range_header: Optional[str] = None,
+    release: bool = False,
+    output_mode: str = OUTPUT_MODE,
+    if_none_match: Optional[str] = None,
+    cache_control: Optional[str] = None
+) -> Response:
+    if result.output_state == OutputState.Completed:
+        if output_mode == "url":
+            return url_response(result, release)
+        return output_response(result, range_header, release, if_none_match, cache_control)
+    elif result.output_state == OutputState.Rejected:
+        raise HTTPException(
+            status_code=429,
+            detail=result.output,
+            headers={"Retry-After": str(result.retry_after)}
+        )
+    elif result.output_state == OutputState.Expired:
+        raise HTTPException(
+            status_code=504,
+            detail=result.output
+        )
+    else: 
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error during job execution: {result.output}"
+        )
+
+def tenant_priority(query: dict, api_key: Optional[str]) -> Tuple[str, int]:
+    """Tenant of a request and its priority, capped at what the tenant's configuration allows.
+
+    Tenants with an API key configured must present it to submit under their ID.
+    """
+    tenant_id = str(query.get("tenant_id", ""))
+    tenant_key = TENANT_API_KEYS.get(tenant_id)
+    if tenant_key and not hmac.compare_digest(tenant_key, api_key or ""):
+        raise HTTPException(
+            status_code=403,
+            detail=f"Invalid API key for tenant {tenant_id}"
+        )
+    try:
+        priority = int(query.get("priority", 0))
+    except (TypeError, ValueError):
+        raise HTTPException(
+            status_code=400,
+            detail="priority must be an integer"
+        )
+    return tenant_id, max(0, min(priority, TENANT_PRIORITIES.get(tenant_id, 0)))
+
 @app.post('/api/v2/prompt')
-def prompt(query: dict):
+def prompt(query: dict, x_api_key: Optional[str] = Header(None)):
     try:
         start_time = time.time()
         url = query.get("url", ORIGIN_IMAGE_URL)
@@ -72,21 +196,20 @@ def prompt(query: dict):
         if workflow_id == 1 or \
             workflow_id == 2 or \
             workflow_id == 4:
+            tenant_id, priority = tenant_priority(query, x_api_key)
             result = easycontrol_manager.queue_prompt(
                 WorkflowType(workflow_id),
-                url
+                url,
+                query.get("latency_budget"),
+                tenant_id,
+                priority
             )
             print(f"{(time.time() - start_time):.4} seconds are taken to process request")
-            if result.output_state == OutputState.Completed:
-                return Response(
-                    content=result.output,
-                    media_type=f"image/jpeg"
-                )
-            else: 
-                raise HTTPException(
-                    status_code=500,
-                    detail=f"Error during job execution: {result.output}"
-                )
+            return result_response(
+                result,
+                release=True,
+                output_mode=query.get("output_mode", OUTPUT_MODE)
+            )
         else:
             # result = magicvideo_manager.queue_prompt(
             #     WorkflowType(workflow_id),
@@ -98,12 +221,269 @@ def prompt(query: dict):
             # )
             return
 
+    except HTTPException:
+        raise
     except Exception as e:  
         raise HTTPException(
             status_code=500,
             detail=f"Error during job execution: {str(e)}"
         )
 
+@app.post('/api/v2/jobs')
+def submit_job(
+    query: dict,
+    idempotency_key: Optional[str] = Header(None),
+    x_api_key: Optional[str] = Header(None)
+):
+    workflow_id = query.get("workflow_id", 0)
+    manager = get_manager(workflow_id)
+    tenant_id, priority = tenant_priority(query, x_api_key)
+    prompt = manager.submit_prompt(
+        WorkflowType(workflow_id),
+        query.get("url", ORIGIN_IMAGE_URL),
+        query.get("latency_budget"),
+        tenant_id,
+        priority,
+        idempotency_key or query.get("idempotency_key")
+    )
+    if prompt.result:
+        return result_response(prompt.result)
+    _, status = find_job(prompt.prompt_id)
+    return JSONResponse(
+        status_code=202,
+        content=status
+    )
+
+def find_job(job_id: str):
+    status = easycontrol_manager.get_prompt_status(job_id)
+    if status:
+        return easycontrol_manager, status
+    raise HTTPException(
+        status_code=404,
+        detail=f"Job not found: {job_id}"
+    )
+
+@app.get('/api/v2/jobs/{job_id}')
+async def get_job(job_id: str, wait: float = 0):
+    manager, status = await asyncio.to_thread(find_job, job_id)
+    end_time = time.time() + min(wait, NORMAL_REQUEST_TIMEOUT)
+    while status["status"] in ("queued", "processing") and time.time() < end_time:
+        await asyncio.sleep(SERVER_CHECK_DELAY / 1000)
+        status = await asyncio.to_thread(manager.get_prompt_status, job_id) or status
+    return status
+
+@app.get('/api/v2/jobs/{job_id}/events')
+async def get_job_events(job_id: str):
+    manager, _ = await asyncio.to_thread(find_job, job_id)
+
+    async def stream():
+        last_id = -1
+        while True:
+            events = await asyncio.to_thread(manager.get_prompt_events, job_id, last_id)
+            if events is None:
+                return
+            for event in events:
+                last_id = event["id"]
+                yield f"id: {event['id']}\nevent: {event['event']}\ndata: {json.dumps(event['data'])}\n\n"
+                if event["event"] in ("completed", "failed", "expired"):
+                    return
+            await asyncio.sleep(SERVER_CHECK_DELAY / 1000)
+
+    return StreamingResponse(stream(), media_type="text/event-stream")
+
+@app.get('/api/v2/jobs/{job_id}/result')
+def get_job_result(
+    job_id: str,
+    output_mode: str = OUTPUT_MODE,
+    range: Optional[str] = Header(None),
+    if_none_match: Optional[str] = Header(None)
+):
+    manager, status = find_job(job_id)
+    if status["status"] in ("queued", "processing"):
+        return JSONResponse(
+            status_code=202,
+            content=status,
+            headers={"Retry-After": "1"}
+        )
+    result = manager.get_prompt_result(job_id)
+    if not result:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Job not found: {job_id}"
+        )
+    return result_response(
+        result,
+        range,
+        output_mode=output_mode,
+        if_none_match=if_none_match,
+        cache_control=RESULT_CACHE_CONTROL
+    )
+
+def batch_item(index: int, job_id: str, result: PromptResult, output_mode: str) -> Iterator[str]:
+    """NDJSON line of a batch item, in pieces; inline outputs are base64-encoded as they are read."""
+    item = {
+        "index": index,
+        "job_id": job_id,
+        "status": result.output_state.name.lower()
+    }
+    if result.output_state != OutputState.Completed:
+        item["error"] = result.output
+        if result.retry_after is not None:
+            item["retry_after"] = result.retry_after
+        yield json.dumps(item) + "\n"
+        return
+
+    if result.output_path:
+        chunks = iter_file(result.output_path, chunk_size=STREAM_CHUNK_SIZE)
+    else:
+        chunks = [result.output]
+    if output_mode == "url":
+        item.update(offload(blob_store, chunks, result.media_type, BLOB_URL_EXPIRES))
+        yield json.dumps(item) + "\n"
+        return
+
+    item["media_type"] = result.media_type
+    # Base64 needs no escaping, so the data is streamed straight into the JSON string
+    yield json.dumps(item)[:-1] + ', "data": "'
+    for piece in iter_base64_encoded(chunks):
+        yield piece.decode("ascii")
+    yield '"}\n'
+
+async def stream_batch_item(index: int, job_id: str, result: PromptResult, output_mode: str):
+    """Stream a batch item, reporting it as failed if its output cannot be read before it starts."""
+    started = False
+    try:
+        async for piece in iterate_in_threadpool(batch_item(index, job_id, result, output_mode)):
+            started = True
+            yield piece
+    except Exception as e:
+        if started:
+            raise
+        yield json.dumps({"index": index, "job_id": job_id, "status": "failed", "error": str(e)}) + "\n"
+
+@app.post('/api/v2/batch')
+def submit_batch(query: dict, x_api_key: Optional[str] = Header(None)):
+    workflow_id = query.get("workflow_id", 0)
+    manager = get_manager(workflow_id)
+    tenant_id, priority = tenant_priority(query, x_api_key)
+    urls = query.get("urls") or []
+    if not isinstance(urls, list) or not urls or len(urls) > MAX_BATCH_ITEMS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"urls must be a list of 1 to {MAX_BATCH_ITEMS} inputs"
+        )
+    output_mode = query.get("output_mode", OUTPUT_MODE)
+
+    prompts = [
+        manager.submit_prompt(
+            WorkflowType(workflow_id),
+            url,
+            query.get("latency_budget"),
+            tenant_id,
+            priority
+        )
+        for url in urls
+    ]
+
+    async def stream():
+        pending = {prompt.prompt_id: index for index, prompt in enumerate(prompts)}
+        try:
+            for index, prompt in enumerate(prompts):
+                if prompt.result:
+                    async for piece in stream_batch_item(index, prompt.prompt_id, prompt.result, output_mode):
+                        yield piece
+                    del pending[prompt.prompt_id]
+
+            while pending:
+                for job_id, index in list(pending.items()):
+                    result = await asyncio.to_thread(manager.get_prompt_result, job_id)
+                    if not result:
+                        if await asyncio.to_thread(manager.get_prompt_status, job_id):
+                            continue
+                        result = PromptResult(job_id, OutputState.Failed, "Result is no longer available")
+                    async for piece in stream_batch_item(index, job_id, result, output_mode):
+                        yield piece
+                    await asyncio.to_thread(manager.release_prompt_result, job_id)
+                    del pending[job_id]
+                if pending:
+                    await asyncio.sleep(SERVER_CHECK_DELAY / 1000)
+        finally:
+            # A disconnected client cancels the stream; the release must still run
+            with anyio.CancelScope(shield=True):
+                for job_id in pending:
+                    await anyio.to_thread.run_sync(manager.release_prompt_result, job_id)
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+@app.get('/api/v2/blobs/{key}')
+def get_blob(
+    key: str,
+    expires: int,
+    signature: str,
+    range: Optional[str] = Header(None),
+    if_none_match: Optional[str] = Header(None)
+):
+    if not isinstance(blob_store, LocalBlobStore) or \
+        not blob_store.verify(key, expires, signature):
+        raise HTTPException(
+            status_code=403,
+            detail="Invalid or expired blob URL"
+        )
+    try:
+        return output_response(
+            PromptResult(
+                key,
+                OutputState.Completed,
+                None,
+                output_path=blob_store.path(key),
+                media_type=mimetypes.guess_type(key)[0] or "application/octet-stream",
+                content_hash=key.split('.')[0]
+            ),
+            range,
+            if_none_match=if_none_match,
+            cache_control=f"public, max-age={max(0, expires - int(time.time()))}, immutable"
+        )
+    except FileNotFoundError:
+        # Expired between the signature check and now
+        raise HTTPException(status_code=404, detail="Blob not found")
+
+@app.delete('/api/v2/jobs/{job_id}')
+def delete_job(job_id: str):
+    manager, _ = find_job(job_id)
+    if not manager.release_prompt_result(job_id):
+        raise HTTPException(
+            status_code=409,
+            detail=f"Job is not finished: {job_id}"
+        )
+    return {"job_id": job_id, "status": "deleted"}
+
+@app.post('/api/v2/drain')
+def drain(query: Optional[dict] = None):
+    try:
+        state = easycontrol_manager.drain((query or {}).get("config"))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"state": state["state"].name, "config": state["config"]}
+
+@app.get('/api/v2/config')
+def get_config():
+    return easycontrol_manager.get_config()
+
+@app.post('/api/v2/config')
+def update_config(query: dict):
+    try:
+        return easycontrol_manager.configure(query)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get('/health')
+def health():
+    health = easycontrol_manager.health()
+    return JSONResponse(
+        status_code=200 if health["ready"] and not health["saturated"] else 503,
+        content=health
+    )
+
 @app.post('/api/v2/stop')
 def stop():
     if easycontrol_manager:
@@ -113,12 +493,12 @@ def stop():
 
 @app.post('/api/v2/restart')
 def restart():
-    if easycontrol_manager:
-        easycontrol_manager.stop()
-    if logging_thread:
-        terminate_thread(logging_thread)
-    logging_thread = Thread(target=log_state, daemon=True)
-    logging_thread.start()
+    global logging_thread
+
+    easycontrol_manager.restart()
+    if not logging_thread or not logging_thread.is_alive():
+        logging_thread = Thread(target=log_state, daemon=True)
+        logging_thread.start()
     
 if __name__ == "__main__":
     import uvicorn
@@ -129,5 +509,6 @@ if __name__ == "__main__":
         app="server:app",
         host="localhost",
         port=8080,
-        reload=False
+        reload=False,
+        workers=API_WORKERS if SCHEDULER_SOCKET else 1
     )
\ No newline at end of file
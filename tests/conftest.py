@@ -0,0 +1,39 @@
+import os
+import sys
+import json
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# core.constants reads ./env.json on import; run the tests from a scratch
+# directory holding the example settings without a journal on disk.
+with open(os.path.join(ROOT, "env.example.json"), 'r', encoding='utf-8') as file:
+    envs = json.load(file)
+envs["JOB_JOURNAL"] = {"type": "none"}
+
+directory = tempfile.mkdtemp()
+with open(os.path.join(directory, "env.json"), 'w', encoding='utf-8') as file:
+    json.dump(envs, file)
+os.chdir(directory)
+
+import pytest
+
+from core.pod_manager import PodManager
+from core.enums import *
+
+@pytest.fixture
+def create_manager(monkeypatch):
+    """Managers whose background loops do not run, driven by hand instead."""
+    monkeypatch.setattr(PodManager, "_process_loop", lambda self: None)
+    monkeypatch.setattr(PodManager, "_management_loop", lambda self: None)
+    managers = []
+
+    def create(predecessor=None):
+        manager = PodManager(GPUType.RTXA6000, VolumeType.EasyControl, predecessor=predecessor)
+        managers.append(manager)
+        return manager
+
+    yield create
+    for manager in managers:
+        manager.stop()
@@ -0,0 +1,80 @@
+import json
+import itertools
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+class FakeRunPod:
+    """Local stand-in for the RunPod REST API, serving the pod endpoints PodHelper calls.
+
+    Point RUNPOD_API_URL at url; preempt() takes a pod away the way RunPod
+    stops an interruptible pod.
+    """
+
+    def __init__(self):
+        self.pods: Dict[str, Dict] = {}
+        self.created: List[Dict] = []
+        self.deleted: List[str] = []
+        self.lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def status(self, pod_id: str) -> Optional[str]:
+        with self.lock:
+            pod = self.pods.get(pod_id)
+            return pod["desiredStatus"] if pod else None
+
+    def preempt(self, pod_id: str) -> None:
+        with self.lock:
+            self.pods[pod_id]["desiredStatus"] = "EXITED"
+
+    def close(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _handler(self):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, status: int, body: Optional[Dict] = None):
+                data = json.dumps(body or {}).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                with api.lock:
+                    pod_id = f"fake-{next(api._ids)}"
+                    api.pods[pod_id] = {
+                        "id": pod_id,
+                        "desiredStatus": "RUNNING",
+                        "publicIp": "127.0.0.1",
+                        "portMappings": {"8188": 8188, "22": 22},
+                        "interruptible": payload.get("interruptible", False)
+                    }
+                    api.created.append(payload)
+                self._reply(201, {"id": pod_id})
+
+            def do_GET(self):
+                with api.lock:
+                    pod = api.pods.get(self.path.rsplit('/', 1)[-1])
+                    pod = dict(pod) if pod else None
+                self._reply(200, pod) if pod else self._reply(404)
+
+            def do_DELETE(self):
+                pod_id = self.path.rsplit('/', 1)[-1]
+                with api.lock:
+                    found = api.pods.pop(pod_id, None)
+                    api.deleted.append(pod_id)
+                self._reply(200) if found else self._reply(404)
+
+        return Handler
@@ -0,0 +1,44 @@
+import time
+from collections import Counter
+
+from core.stats import PodHealth
+from core.enums import *
+
+class FakeHost:
+    def __init__(self):
+        self.preempted = False
+        self.interruptible = False
+        self.created_at = time.time()
+
+class FakePod:
+    def __init__(self, state: PodState = PodState.Free):
+        self.state = state
+        self.draining = False
+        self.init = False
+        self.destroyed = False
+        self.pod_id = f"pod-{id(self)}"
+        self.host = FakeHost()
+        self.created_at = time.time()
+        self.count = 0
+        self.cold_start_time = None
+        self.current_prompts = []
+        self.warm_workflows = set()
+        self.cached_signatures = frozenset()
+        self.batches = []
+        self.health = PodHealth()
+        self.warm_up_failures = Counter()
+        self.warm_up_retry_at = 0.
+        self.warmed = []
+
+    def cold_workflows(self):
+        return [WorkflowType.Snoopy]
+
+    def warm_up(self, workflow_type: WorkflowType):
+        self.warmed.append(workflow_type)
+
+    def queue_prompts(self, prompts):
+        self.batches.append(prompts)
+
+    def destroy(self):
+        self.destroyed = True
+        self.state = PodState.Terminated
@@ -0,0 +1,64 @@
+import time
+
+import pytest
+
+import core.admission
+from core.admission import AdmissionController
+from core.enums import *
+from core.types import *
+from fakes import FakePod
+
+def queued_prompts(count: int, workflow_type: WorkflowType = WorkflowType.Ghibli):
+    return [Prompt(f"prompt-{index}", workflow_type, "") for index in range(count)]
+
+def test_estimate_wait_shares_work_among_ready_pods():
+    admission = AdmissionController()
+    admission.record_service_time(WorkflowType.Ghibli, 10)
+    assert admission.estimate_wait(WorkflowType.Ghibli, queued_prompts(4), [], 2, []) == 30
+
+def test_estimate_wait_charges_only_the_remaining_boot_time():
+    admission = AdmissionController()
+    admission.record_service_time(WorkflowType.Ghibli, 10)
+    admission.record_cold_start_time(600)
+
+    assert admission.estimate_wait(WorkflowType.Ghibli, [], [], 0, [500, 100]) == 110
+    assert admission.estimate_wait(WorkflowType.Ghibli, [], [], 0, [900]) == 10
+    assert admission.estimate_wait(WorkflowType.Ghibli, [], [], 0, []) == 610
+
+def test_admit_returns_retry_after_when_over_budget(monkeypatch):
+    monkeypatch.setattr(core.admission, "ADMISSION_CONTROL", True)
+    monkeypatch.setattr(core.admission, "RETRY_AFTER_JITTER", 0)
+    admission = AdmissionController()
+    assert admission.admit(50, 60) is None
+    assert admission.admit(90, 60) == 30
+    assert admission.rejected_count == 1
+
+def test_overloaded_manager_rejects_with_retry_after(create_manager, monkeypatch):
+    monkeypatch.setattr(core.admission, "ADMISSION_CONTROL", True)
+    manager = create_manager()
+    manager.pods.append(FakePod())
+    manager.admission.record_service_time(WorkflowType.Ghibli, 60)
+    for prompt in queued_prompts(10):
+        prompt.lane = manager._lane_for(WorkflowType.Ghibli)
+        prompt.deadline = time.time() + 60
+        manager.queued_prompts.put(prompt)
+
+    prompt = manager.submit_prompt(WorkflowType.Ghibli, "input", 120)
+
+    assert prompt.result.output_state == OutputState.Rejected
+    assert prompt.result.retry_after >= 1
+
+def test_first_boot_admits_and_extends_the_deadline(create_manager, monkeypatch):
+    monkeypatch.setattr(core.admission, "ADMISSION_CONTROL", True)
+    manager = create_manager()
+    pod = FakePod(PodState.Starting)
+    pod.init = True
+    pod.created_at = time.time() - 100
+    manager.pods.append(pod)
+    manager.admission.record_cold_start_time(600)
+    manager.admission.record_service_time(WorkflowType.Ghibli, 10)
+
+    prompt = manager.submit_prompt(WorkflowType.Ghibli, "input", 120)
+
+    assert prompt.result is None
+    assert prompt.deadline - time.time() == pytest.approx(120 + 500, abs=1)
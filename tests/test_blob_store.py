@@ -0,0 +1,41 @@
+import os
+import time
+from urllib import parse
+
+from core.blob_store import LocalBlobStore, offload
+
+def signed_query(store: LocalBlobStore, key: str, expires_in: int = 60):
+    query = parse.parse_qs(parse.urlsplit(store.url(key, expires_in)).query)
+    return int(query["expires"][0]), query["signature"][0]
+
+def test_signed_url_grants_access_until_it_expires(tmp_path):
+    store = LocalBlobStore(str(tmp_path), "http://localhost/api/v2/blobs", "secret")
+    key = store.put_bytes(b"output", "image/jpeg")
+    expires, signature = signed_query(store, key)
+
+    assert store.verify(key, expires, signature)
+    assert not store.verify(key, expires + 1, signature)
+    assert not store.verify(key, expires, "0" * len(signature))
+    assert not store.verify(key, *signed_query(store, key, -1))
+    assert not LocalBlobStore(str(tmp_path), "http://localhost", "other").verify(key, expires, signature)
+
+def test_blobs_are_content_addressed(tmp_path):
+    store = LocalBlobStore(str(tmp_path), "http://localhost/api/v2/blobs")
+    payload = offload(store, [b"out", b"put"], "image/png", 60)
+    key = store.put_bytes(b"output", "image/png")
+
+    assert key.endswith(".png")
+    assert payload["sha256"] == key.split('.')[0]
+    with open(store.path(key), 'rb') as file:
+        assert file.read() == b"output"
+
+def test_expired_blobs_are_swept(tmp_path):
+    store = LocalBlobStore(str(tmp_path), "http://localhost/api/v2/blobs", ttl=60)
+    old = store.put_bytes(b"old", "image/jpeg")
+    new = store.put_bytes(b"new", "image/jpeg")
+    past = time.time() - 120
+    os.utime(store.path(old), (past, past))
+
+    assert store.evict_expired() == 1
+    assert not os.path.exists(store.path(old))
+    assert os.path.exists(store.path(new))
@@ -0,0 +1,106 @@
+import time
+import pytest
+
+import core.cluster
+from core.cluster import ClusterScheduler
+from core.registry import LocalRegistry
+from core.enums import *
+from core.types import *
+
+class StubManager:
+    def __init__(self):
+        self.state = PodManagerState.Running
+        self.pods = []
+
+    def drain(self):
+        self.state = PodManagerState.Draining
+
+class StubScheduler:
+    """Scheduler of a leader node, without pods."""
+
+    def __init__(self, gpu_type, volume_type):
+        self.manager = StubManager()
+        self.submitted = []
+
+    def managers(self):
+        return [self.manager]
+
+    def restart(self):
+        self.manager.state = PodManagerState.Running
+
+    def unfinished_prompt_ids(self):
+        return []
+
+    def submit_prompt(self, workflow_type, input_url, *args):
+        self.submitted.append(input_url)
+        prompt = Prompt(input_url, workflow_type, input_url)
+        prompt.result = PromptResult(prompt.prompt_id, OutputState.Rejected, "Server is overloaded", 7)
+        return prompt
+
+    def get_state(self):
+        return {"state": self.manager.state}
+
+    def health(self):
+        return {"ready": True, "saturated": False, "capacity": {}}
+
+    def stop(self):
+        self.manager.state = PodManagerState.Stopped
+
+@pytest.fixture
+def create_node(monkeypatch):
+    """Cluster nodes sharing one registry, with short leases and stub schedulers."""
+    monkeypatch.setattr(core.cluster, "Scheduler", StubScheduler)
+    monkeypatch.setattr(core.cluster, "CLUSTER_LEASE_TTL", 0.3)
+    monkeypatch.setattr(core.cluster, "CLUSTER_RPC_TIMEOUT", 2)
+    monkeypatch.setattr(ClusterScheduler, "_reap_orphaned_pods", lambda self: None)
+    registry = LocalRegistry()
+    nodes = []
+
+    def create(node_id):
+        node = ClusterScheduler(GPUType.RTXA6000, VolumeType.EasyControl, registry, node_id)
+        nodes.append(node)
+        return node
+
+    yield create
+    for node in nodes:
+        node.close()
+
+def wait_for(condition, timeout: float = 5):
+    end_time = time.time() + timeout
+    while not condition():
+        assert time.time() < end_time, "timed out"
+        time.sleep(0.02)
+
+def test_one_node_leads_and_the_other_forwards(create_node):
+    first = create_node("first")
+    wait_for(lambda: first.is_leader)
+    second = create_node("second")
+    time.sleep(0.3)
+
+    assert not second.is_leader and second.scheduler is None
+    assert second.health()["leader"] == "first"
+    prompt = second.submit_prompt(WorkflowType.Ghibli, "input")
+    assert prompt.result.output_state == OutputState.Rejected
+    assert first.scheduler.submitted == ["input"]
+
+def test_follower_takes_over_after_the_leader_dies(create_node):
+    first = create_node("first")
+    wait_for(lambda: first.is_leader)
+    second = create_node("second")
+
+    # A crashed leader stops renewing without giving up its lease
+    first._closed = True
+    wait_for(lambda: second.is_leader)
+
+    assert second.health()["leader"] == "second"
+    second.submit_prompt(WorkflowType.Ghibli, "input")
+    assert second.scheduler.submitted == ["input"]
+
+def test_leader_drains_after_losing_the_lease(create_node):
+    first = create_node("first")
+    wait_for(lambda: first.is_leader)
+
+    first.registry.set(first._key("leader"), b"other", 10)
+    wait_for(lambda: not first.is_leader)
+
+    assert first.scheduler.manager.state == PodManagerState.Draining
@@ -0,0 +1,67 @@
+from io import BytesIO
+
+import pytest
+from PIL import Image
+
+import core.comfyui_helper
+from core.comfyui_helper import ComfyUIHelper
+from core.enums import *
+from core.types import *
+
+SPEC = {
+    "loader": {"class_type": "LoadImagesFromURLs", "input": "urls"},
+    "batch_size_inputs": [["5", "batch_size"]],
+    "output_node": "9"
+}
+WORKFLOW = {
+    "111": {"class_type": "LoadImageFromUrlOrPath", "inputs": {"url_or_path": ""}},
+    "5": {"class_type": "RepeatLatentBatch", "inputs": {"samples": ["4", 0], "batch_size": 1}},
+    "9": {"class_type": "SaveImage", "inputs": {"images": ["8", 0]}}
+}
+
+def image_bytes(color: str) -> bytes:
+    buffer = BytesIO()
+    Image.new("RGB", (4, 4), color).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+def test_apply_batch_swaps_loader_and_sets_batch_size():
+    helper = ComfyUIHelper("http://pod", "ws://pod")
+    workflow = helper._apply_batch(WORKFLOW, SPEC, ["a.png", "b.png"])
+
+    assert workflow["111"] == {"class_type": "LoadImagesFromURLs", "inputs": {"urls": "a.png\nb.png"}}
+    assert workflow["5"]["inputs"] == {"samples": ["4", 0], "batch_size": 2}
+    assert WORKFLOW["5"]["inputs"]["batch_size"] == 1
+
+def test_prompt_batch_splits_outputs(monkeypatch):
+    monkeypatch.setattr(core.comfyui_helper, "load_batch_spec", lambda workflow_type: SPEC)
+    helper = ComfyUIHelper("http://pod", "ws://pod")
+    helper._workflow_cache[WorkflowType.Ghibli.value] = WORKFLOW
+    queued = []
+    images = {"0.png": image_bytes("red"), "1.png": image_bytes("blue")}
+    monkeypatch.setattr(helper, "_open_websocket_connection", lambda: (None, "client"))
+    monkeypatch.setattr(helper, "_queue_workflow", lambda workflow, client_id: queued.append(workflow) or "comfy")
+    monkeypatch.setattr(helper, "_track_progress", lambda *args: None)
+    monkeypatch.setattr(helper, "_get_history", lambda prompt_id: {"comfy": {"outputs": {"9": {"images": [
+        {"filename": name, "subfolder": "", "type": "output"} for name in images
+    ]}}}})
+    monkeypatch.setattr(helper, "_get_binary_output", lambda items: images[items[0]["filename"]])
+    prompts = [Prompt(f"prompt-{index}", WorkflowType.Ghibli, f"{index}.png") for index in range(2)]
+
+    outputs = helper.prompt_batch(prompts)
+
+    assert queued[0]["111"]["inputs"]["urls"] == "0.png\n1.png"
+    assert [Image.open(BytesIO(output)).getpixel((0, 0))[2] > 128 for output, _, _, _ in outputs] == [False, True]
+    assert outputs[0][3] != outputs[1][3]
+
+def test_prompt_batch_fails_on_missing_outputs(monkeypatch):
+    monkeypatch.setattr(core.comfyui_helper, "load_batch_spec", lambda workflow_type: SPEC)
+    helper = ComfyUIHelper("http://pod", "ws://pod")
+    helper._workflow_cache[WorkflowType.Ghibli.value] = WORKFLOW
+    monkeypatch.setattr(helper, "_open_websocket_connection", lambda: (None, "client"))
+    monkeypatch.setattr(helper, "_queue_workflow", lambda workflow, client_id: "comfy")
+    monkeypatch.setattr(helper, "_track_progress", lambda *args: None)
+    monkeypatch.setattr(helper, "_get_history", lambda prompt_id: {"comfy": {"outputs": {"9": {"images": []}}}})
+    prompts = [Prompt(f"prompt-{index}", WorkflowType.Ghibli, f"{index}.png") for index in range(2)]
+
+    with pytest.raises(RuntimeError):
+        helper.prompt_batch(prompts)
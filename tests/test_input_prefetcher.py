@@ -0,0 +1,93 @@
+import pytest
+
+import core.input_prefetcher
+from core.input_prefetcher import InputError, InputPrefetcher
+
+@pytest.fixture
+def prefetcher(monkeypatch):
+    """Prefetcher without the normalizing process pool."""
+    monkeypatch.setattr(core.input_prefetcher, "NORMALIZE_INPUTS", False)
+    prefetcher = InputPrefetcher(max_workers=1)
+    yield prefetcher
+    prefetcher.shutdown()
+
+def test_failed_download_is_retried(prefetcher, monkeypatch):
+    replies = [InputError("Unreachable"), (b"input", "image/png")]
+
+    def fetch(input_url):
+        reply = replies.pop(0)
+        if isinstance(reply, Exception):
+            raise reply
+        return reply
+
+    monkeypatch.setattr(prefetcher, "_fetch", fetch)
+    failed = prefetcher.prefetch("https://example.com/input.png")
+    with pytest.raises(InputError):
+        failed.result()
+
+    retried = prefetcher.prefetch("https://example.com/input.png")
+    assert retried is not failed
+    assert retried.result().data == b"input"
+    assert prefetcher.prefetch("https://example.com/input.png") is retried
+
+class FakeResponse:
+    def __init__(self, body: bytes = b"", headers: dict = None, status_code: int = 200):
+        self.body = body
+        self.headers = headers or {}
+        self.is_redirect = status_code in (301, 302, 303, 307, 308)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def raise_for_status(self):
+        pass
+
+    def iter_content(self, chunk_size):
+        for start in range(0, len(self.body), chunk_size):
+            yield self.body[start:start + chunk_size]
+
+@pytest.fixture
+def responses(monkeypatch):
+    """Replies to input downloads by URL; requesting any other URL fails the test."""
+    replies = {}
+    monkeypatch.setattr(core.input_prefetcher.requests, "get", lambda url, **kwargs: replies[url])
+    return replies
+
+@pytest.mark.parametrize("url", [
+    "http://127.0.0.1/input.png",
+    "http://10.0.0.1/input.png",
+    "http://169.254.169.254/latest/meta-data",
+    "http://[::1]/input.png",
+    "file:///etc/passwd"
+])
+def test_private_and_non_http_urls_are_rejected(url):
+    with pytest.raises(InputError):
+        core.input_prefetcher.check_public_url(url)
+
+def test_redirect_to_private_address_is_rejected(prefetcher, responses):
+    responses["http://8.8.8.8/input.png"] = FakeResponse(
+        headers={"Location": "http://127.0.0.1/admin"},
+        status_code=302
+    )
+    with pytest.raises(InputError):
+        prefetcher._fetch("http://8.8.8.8/input.png")
+
+def test_declared_size_over_the_limit_is_rejected(prefetcher, responses):
+    prefetcher.max_bytes = 10
+    responses["http://8.8.8.8/input.png"] = FakeResponse(b"x" * 11, {"Content-Length": "11"})
+    with pytest.raises(InputError):
+        prefetcher._fetch("http://8.8.8.8/input.png")
+
+def test_download_stops_at_the_size_limit(prefetcher, responses):
+    prefetcher.max_bytes = 10
+    responses["http://8.8.8.8/input.png"] = FakeResponse(b"x" * (1 << 20))
+    with pytest.raises(InputError):
+        prefetcher._fetch("http://8.8.8.8/input.png")
+
+def test_redirect_is_followed_to_a_public_address(prefetcher, responses):
+    responses["http://8.8.8.8/input"] = FakeResponse(headers={"Location": "/input.png"}, status_code=301)
+    responses["http://8.8.8.8/input.png"] = FakeResponse(b"input", {"Content-Type": "image/png; q=1"})
+    assert prefetcher._fetch("http://8.8.8.8/input") == (b"input", "image/png")
@@ -0,0 +1,66 @@
+import time
+import pytest
+
+import core.pod_manager
+from core.job_journal import SQLiteJobJournal
+from core.enums import *
+from core.types import *
+
+@pytest.fixture
+def journal_path(tmp_path, monkeypatch):
+    """Managers journaling to a SQLite file, without input prefetching."""
+    path = str(tmp_path / "jobs.db")
+    monkeypatch.setattr(core.pod_manager, "JOB_JOURNAL", {"type": "sqlite", "path": path})
+    monkeypatch.setattr(core.pod_manager, "PREFETCH_INPUTS", False)
+    return path
+
+def finish(journal: SQLiteJobJournal, prompt: Prompt, output_state: OutputState, output) -> None:
+    prompt.result = PromptResult(prompt.prompt_id, output_state, output)
+    journal.record_finished(prompt)
+
+def test_journal_keeps_small_outputs_of_finished_prompts(tmp_path):
+    journal = SQLiteJobJournal(str(tmp_path / "jobs.db"), max_result_bytes=4)
+    prompts = [Prompt(prompt_id, WorkflowType.Ghibli, "input") for prompt_id in ("small", "large", "failed")]
+    for prompt in prompts:
+        journal.record_submitted(prompt, VolumeType.EasyControl)
+    finish(journal, prompts[0], OutputState.Completed, b"out")
+    finish(journal, prompts[1], OutputState.Completed, b"output")
+    finish(journal, prompts[2], OutputState.Failed, "Time out error")
+
+    assert journal.load("small").result.output == b"out"
+    assert journal.load("large").result.output_state == OutputState.Failed
+    assert journal.load("failed").result.output == "Time out error"
+    assert journal.unfinished(VolumeType.EasyControl) == []
+    assert journal.prune(time.time() + 1) == 3
+    journal.close()
+
+def test_unfinished_prompts_are_replayed_after_restart(create_manager, journal_path):
+    first = create_manager()
+    prompt = first.submit_prompt(WorkflowType.Ghibli, "input", tenant_id="tenant")
+    assert prompt.result is None
+    dispatched = first.queued_prompts.get()
+    dispatched.dispatched_at = time.time()
+    first.journal.record_dispatched([dispatched])
+    first.stop()
+
+    second = create_manager()
+
+    [replayed] = second.queued_prompts.prompts()
+    assert replayed.prompt_id == prompt.prompt_id
+    assert replayed.deadline == pytest.approx(prompt.deadline)
+    assert replayed.tenant_id == "tenant" and replayed.dispatched_at is None
+    assert second.get_state()["recovered_prompt_num"] == 1
+
+def test_idempotency_key_returns_the_same_job_across_restarts(create_manager, journal_path):
+    first = create_manager()
+    prompt = first.submit_prompt(WorkflowType.Ghibli, "input", tenant_id="tenant", idempotency_key="key")
+    assert first.submit_prompt(WorkflowType.Ghibli, "input", tenant_id="tenant", idempotency_key="key") is prompt
+    other = first.submit_prompt(WorkflowType.Ghibli, "input", tenant_id="other", idempotency_key="key")
+    assert other.prompt_id != prompt.prompt_id
+    first.stop()
+
+    second = create_manager()
+
+    repeated = second.submit_prompt(WorkflowType.Ghibli, "input", tenant_id="tenant", idempotency_key="key")
+    assert repeated.prompt_id == prompt.prompt_id
+    assert second.queued_prompts.qsize() == 2
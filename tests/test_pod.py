@@ -0,0 +1,66 @@
+import os
+import threading
+from collections import Counter
+
+import pytest
+
+from core.pod import Pod
+from core.stats import PodHealth
+from core.comfyui_helper import ComfyUIHelper
+from core.enums import *
+from core.types import *
+
+class SpoolingHelper(ComfyUIHelper):
+    """Helper that spools a video output for every prompt instead of calling ComfyUI."""
+
+    def __init__(self, directory: str):
+        super().__init__("http://pod", "ws://pod")
+        self.directory = directory
+
+    def prompt(self, prompt, is_init=False, uploaded_inputs=None):
+        self.output_path = os.path.join(self.directory, f"{prompt.prompt_id}-output.mp4")
+        with open(self.output_path, 'wb') as file:
+            file.write(b"video")
+        return None
+
+@pytest.fixture
+def create_pod(tmp_path, monkeypatch):
+    """Pods that skip initialization and run prompts on a spooling helper."""
+    monkeypatch.setattr(Pod, "_comfyui_helper", lambda self: SpoolingHelper(str(tmp_path)))
+
+    def create(init: bool) -> Pod:
+        pod = Pod.__new__(Pod)
+        pod._lock = threading.Lock()
+        pod._state = PodState.Free
+        pod._init = init
+        pod.volume_type = VolumeType.EasyControl
+        pod.current_prompts = []
+        pod.count = 0
+        pod.health = PodHealth()
+        pod.uploaded_inputs = {}
+        pod.cached_signatures = frozenset()
+        pod.warm_workflows = set()
+        pod.warm_up_times = {}
+        pod.warm_up_failures = Counter()
+        pod.warm_up_retry_at = 0.
+        return pod
+
+    return create
+
+def test_warm_up_deletes_its_output(create_pod, tmp_path):
+    pod = create_pod(False)
+    assert pod.warm_up(WorkflowType.MagicVideo)
+    assert os.listdir(tmp_path) == []
+
+def test_init_prompt_deletes_its_output(create_pod, tmp_path):
+    pod = create_pod(True)
+    pod.queue_prompt(Prompt("prompt", WorkflowType.MagicVideo, ""))
+    assert pod.state == PodState.Free
+    assert os.listdir(tmp_path) == []
+
+def test_prompt_keeps_its_output(create_pod, tmp_path):
+    pod = create_pod(False)
+    prompt = Prompt("prompt", WorkflowType.MagicVideo, "")
+    pod.queue_prompt(prompt)
+    assert prompt.result.output_state == OutputState.Completed
+    assert os.path.exists(prompt.result.output_path)
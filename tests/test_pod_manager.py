@@ -0,0 +1,234 @@
+import time
+import pytest
+
+import core.pod_manager
+from core.pod_manager import PodManager
+from core.scheduler import Scheduler
+from core.enums import *
+from core.types import *
+from fakes import FakePod
+
+def test_drain_hands_idle_pods_to_successor(create_manager):
+    first = create_manager()
+    pod = FakePod()
+    first.pods.append(pod)
+
+    second = create_manager(first)
+
+    assert second.pods == [pod]
+    first._hand_over_idle_pods()
+    assert first.state == PodManagerState.Stopped
+
+def test_two_drains_in_a_row_keep_busy_pods(create_manager):
+    first = create_manager()
+    pod = FakePod(PodState.Processing)
+    first.pods.append(pod)
+
+    second = create_manager(first)
+    third = create_manager(second)
+    second._hand_over_idle_pods()
+    assert second.state == PodManagerState.Stopped
+
+    pod.state = PodState.Free
+    first._hand_over_idle_pods()
+
+    assert third.pods == [pod]
+    assert not pod.destroyed
+    assert first.state == PodManagerState.Stopped
+
+def test_drain_destroys_pods_without_live_successor(create_manager):
+    first = create_manager()
+    pod = FakePod(PodState.Processing)
+    first.pods.append(pod)
+
+    second = create_manager(first)
+    second.stop()
+
+    pod.state = PodState.Free
+    first._hand_over_idle_pods()
+    first._destroy_pods()
+
+    assert pod.destroyed
+    assert first.state == PodManagerState.Stopped
+
+def test_scheduler_evicts_results_of_retired_managers(create_manager):
+    scheduler = Scheduler(GPUType.RTXA6000, VolumeType.EasyControl)
+    scheduler.drain()
+    retired = scheduler.retired[0]
+    retired._hand_over_idle_pods()
+    assert retired.state == PodManagerState.Stopped
+
+    prompt = Prompt("prompt", WorkflowType.Ghibli, "")
+    prompt.result = PromptResult("prompt", OutputState.Completed, "output")
+    retired.results.put(prompt)
+    retired.results.ttl = 0
+
+    assert scheduler.managers() == [scheduler.manager]
+    assert not len(retired.results)
+    scheduler.stop()
+
+def record_outcomes(pod: FakePod, failures: int, successes: int):
+    for _ in range(failures):
+        pod.health.record_failure(WorkflowType.Ghibli)
+    for _ in range(successes):
+        pod.health.record_success(WorkflowType.Ghibli, 1., 0, 0.)
+
+def test_eject_compares_error_rates_with_fleet(create_manager):
+    manager = create_manager()
+    pods = [FakePod() for _ in range(4)]
+    manager.pods.extend(pods)
+    for pod in pods:
+        record_outcomes(pod, 10, 0)
+
+    manager._eject_outlier_pods()
+    assert not any(pod.draining for pod in pods)
+
+    for pod in pods[1:]:
+        record_outcomes(pod, 0, 20)
+    manager._eject_outlier_pods()
+    assert [pod.draining for pod in pods] == [True, False, False, False]
+
+def test_eject_caps_draining_pods(create_manager):
+    manager = create_manager()
+    pods = [FakePod() for _ in range(4)]
+    manager.pods.extend(pods)
+    for pod in pods[:2]:
+        record_outcomes(pod, 10, 0)
+    for pod in pods[2:]:
+        record_outcomes(pod, 0, 10)
+
+    manager._eject_outlier_pods()
+    manager._eject_outlier_pods()
+    assert sum(pod.draining for pod in pods) == 1
+
+def test_failed_warm_ups_back_off_then_drain(create_manager, monkeypatch):
+    monkeypatch.setattr(core.pod_manager, "WARM_UP_IDLE", True)
+    manager = create_manager()
+    backing_off, failing, healthy = FakePod(), FakePod(), FakePod()
+    manager.pods.extend([backing_off, failing, healthy])
+    backing_off.warm_up_failures[WorkflowType.Snoopy] = 1
+    backing_off.warm_up_retry_at = time.time() + 60
+    failing.warm_up_failures[WorkflowType.Snoopy] = core.pod_manager.WARM_UP_MAX_FAILURES
+
+    manager._warm_up_idle_pods()
+
+    assert backing_off.state == PodState.Free and not backing_off.draining
+    assert failing.draining
+    assert healthy.state == PodState.Processing
+
+def test_timed_out_pod_fails_its_prompts(create_manager):
+    manager = create_manager()
+    pod = FakePod(PodState.Processing)
+    prompt = Prompt("prompt", WorkflowType.Ghibli, "")
+    prompt.dispatched_at = time.time()
+    pod.current_prompts = [prompt]
+    pod.count = manager.config["timeout_retries"]
+    manager.pods.append(pod)
+    manager.processing_prompts[prompt.prompt_id] = prompt
+    manager.state = PodManagerState.Draining
+
+    manager._process_pods()
+    manager._hand_over_idle_pods()
+
+    assert pod not in manager.pods
+    assert manager.get_prompt_status(prompt.prompt_id)["status"] == "failed"
+    assert manager.state == PodManagerState.Stopped
+
+def queue(manager: PodManager, workflow_type: WorkflowType, lane: str, created_at: float) -> Prompt:
+    prompt = Prompt(f"prompt-{manager.queued_prompts.qsize()}", workflow_type, "")
+    prompt.lane = lane
+    prompt.created_at = created_at
+    manager.queued_prompts.put(prompt)
+    return prompt
+
+@pytest.fixture
+def batching(monkeypatch):
+    monkeypatch.setattr(core.pod_manager, "BATCHING_ENABLED", True)
+    monkeypatch.setattr(core.pod_manager, "BATCH_WAIT_WINDOW", 60)
+    monkeypatch.setattr(
+        core.pod_manager,
+        "load_batch_spec",
+        lambda workflow_type: {"max_batch_size": 2} if workflow_type == WorkflowType.Ghibli else None
+    )
+
+def test_dispatch_batches_prompts_of_one_workflow(create_manager, batching):
+    manager = create_manager()
+    pod = FakePod()
+    manager.pods.append(pod)
+    first = queue(manager, WorkflowType.Ghibli, "short", time.time())
+    queue(manager, WorkflowType.Snoopy, "short", time.time())
+    second = queue(manager, WorkflowType.Ghibli, "short", time.time())
+    third = queue(manager, WorkflowType.Ghibli, "short", time.time())
+
+    manager._dispatch_prompts()
+
+    assert pod.current_prompts == [first, second]
+    assert set(manager.processing_prompts) == {first.prompt_id, second.prompt_id}
+    assert third in manager.queued_prompts.prompts()
+
+def test_batch_wait_holds_only_its_lane(create_manager, batching):
+    manager = create_manager()
+    pods = [FakePod(), FakePod()]
+    manager.pods.extend(pods)
+    held = queue(manager, WorkflowType.Ghibli, "short", time.time())
+    other = queue(manager, WorkflowType.Snoopy, "long", time.time())
+
+    manager._dispatch_prompts()
+    assert [pod.current_prompts for pod in pods].count([other]) == 1
+    assert held in manager.queued_prompts.prompts()
+
+    held.created_at -= 60
+    manager._dispatch_prompts()
+    assert [pod.current_prompts for pod in pods].count([held]) == 1
+
+def test_tenant_latencies_keep_recent_tenants(create_manager, monkeypatch):
+    monkeypatch.setattr(core.pod_manager, "TENANT_CACHE_SIZE", 2)
+    manager = create_manager()
+    for tenant_id in ["a", "b", "a", "c"]:
+        prompt = Prompt(f"prompt-{tenant_id}", WorkflowType.Ghibli, "", tenant_id=tenant_id)
+        prompt.dispatched_at = time.time()
+        prompt.result = PromptResult(prompt.prompt_id, OutputState.Completed, b"output")
+        manager._handle_completed_prompt(prompt)
+
+    assert list(manager.tenant_latencies) == ["a", "c"]
+    assert set(manager.get_state()["tenants"]) == {"a", "c"}
+
+def test_prompt_past_its_deadline_expires_in_the_queue(create_manager):
+    manager = create_manager()
+    prompt = queue(manager, WorkflowType.Ghibli, "short", time.time())
+    prompt.deadline = time.time() - 1
+
+    manager._drop_expired_prompts()
+
+    assert manager.queued_prompts.empty()
+    assert manager.get_prompt_status(prompt.prompt_id)["status"] == "expired"
+
+def test_long_lane_leaves_the_short_reservation_free(create_manager):
+    manager = create_manager()
+    pods = [FakePod(), FakePod()]
+    manager.pods.extend(pods)
+    for _ in range(2):
+        queue(manager, WorkflowType.Snoopy, "long", time.time())
+
+    manager._dispatch_prompts()
+    assert manager.queued_prompts.qsize("long") == 1
+
+    short = queue(manager, WorkflowType.Ghibli, "short", time.time())
+    manager._dispatch_prompts()
+    assert [pod.current_prompts for pod in pods].count([short]) == 1
+
+def test_lane_below_its_reservation_is_served_first(create_manager):
+    manager = create_manager()
+    pod = FakePod()
+    manager.pods.extend([pod, FakePod(PodState.Processing)])
+    queue(manager, WorkflowType.Snoopy, "long", time.time()).deadline -= 10
+    short = queue(manager, WorkflowType.Ghibli, "short", time.time())
+
+    manager._dispatch_prompts()
+
+    assert pod.current_prompts == [short]
+
+def test_workflows_are_laned_by_service_time(create_manager):
+    manager = create_manager()
+    assert manager._lane_for(WorkflowType.Ghibli) == "short"
+    assert manager._lane_for(WorkflowType.MagicVideo) == "long"
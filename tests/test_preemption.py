@@ -0,0 +1,82 @@
+import time
+
+import pytest
+
+import core.pod_helper
+import core.pod_host
+import core.pod_manager
+from core.pod import Pod
+from core.pod_helper import PodHelper
+from core.pod_manager import PodManager
+from core.comfyui_helper import ComfyUIHelper
+from core.enums import *
+from core.types import *
+from fake_runpod import FakeRunPod
+
+class FakeComfyUI(ComfyUIHelper):
+    """ComfyUI of a fake pod; the first prompt runs until the pod is taken away."""
+
+    def __init__(self, api: FakeRunPod, pod_id: str, prompt_pods: list):
+        super().__init__("http://pod", "ws://pod")
+        self.api = api
+        self.pod_id = pod_id
+        self.prompt_pods = prompt_pods
+
+    def prompt(self, prompt, is_init=False, uploaded_inputs=None):
+        if not is_init:
+            self.prompt_pods.append(self.pod_id)
+            if len(self.prompt_pods) == 1:
+                while self.api.status(self.pod_id) == "RUNNING":
+                    time.sleep(0.01)
+                raise ConnectionError("Pod went away")
+        return b"output"
+
+@pytest.fixture
+def runpod(monkeypatch):
+    """Fake RunPod API and pods whose setup over SSH is skipped."""
+    api = FakeRunPod()
+    prompt_pods = []
+    monkeypatch.setenv("VOLUME_ID0", "volume")
+    monkeypatch.setattr(core.pod_helper, "RUNPOD_API_URL", api.url)
+    monkeypatch.setattr(core.pod_host, "PREEMPTION_CHECK_INTERVAL", 0.05)
+    monkeypatch.setattr(core.pod_manager, "PREFETCH_INPUTS", False)
+    monkeypatch.setattr(PodHelper, "prepare_pod", lambda self, *args, **kwargs: None)
+    monkeypatch.setattr(PodHelper, "start_comfyui_server", lambda self, *args, **kwargs: None)
+    monkeypatch.setattr(
+        Pod,
+        "_comfyui_helper",
+        lambda self: FakeComfyUI(api, self.host.pod_id, prompt_pods)
+    )
+    api.prompt_pods = prompt_pods
+    yield api
+    api.close()
+
+def wait_for(condition, timeout: float = 10):
+    end_time = time.time() + timeout
+    while not condition():
+        assert time.time() < end_time, "timed out"
+        time.sleep(0.05)
+
+def test_preempted_prompt_is_requeued_on_a_new_pod(runpod):
+    manager = PodManager(
+        GPUType.RTXA6000,
+        VolumeType.EasyControl,
+        {"min_pods": 1, "max_pods": 1, "spot_ratio": 1}
+    )
+    try:
+        wait_for(lambda: manager.get_state()["free_pod_num"] == 1)
+        prompt = manager.submit_prompt(WorkflowType.Ghibli, "input")
+        assert prompt.result is None
+        wait_for(lambda: runpod.prompt_pods)
+        preempted_pod = runpod.prompt_pods[0]
+        assert runpod.created[0]["interruptible"]
+
+        runpod.preempt(preempted_pod)
+        wait_for(lambda: (manager.get_prompt_status(prompt.prompt_id) or {}).get("status") == "completed")
+
+        assert runpod.prompt_pods[-1] != preempted_pod
+        assert "requeued" in [event["event"] for event in prompt.events]
+        assert manager.get_state()["requeued_prompt_num"] == 1
+        wait_for(lambda: preempted_pod in runpod.deleted)
+    finally:
+        manager.stop()
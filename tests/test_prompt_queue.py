@@ -0,0 +1,44 @@
+import time
+
+from core.prompt_queue import PromptQueue
+from core.enums import *
+from core.types import *
+
+def queued_prompt(prompt_id: str, tenant_id: str) -> Prompt:
+    prompt = Prompt(prompt_id, WorkflowType.Ghibli, "", tenant_id=tenant_id)
+    prompt.lane = "short"
+    return prompt
+
+def test_wfq_forgets_tenants_behind_the_virtual_time():
+    queue = PromptQueue("wfq")
+    for index in range(2):
+        queue.put(queued_prompt(f"busy-{index}", "busy"))
+    for index in range(100):
+        queue.put(queued_prompt(f"busy-{index + 2}", "busy"))
+        queue.put(queued_prompt(f"once-{index}", f"tenant-{index}"))
+        queue.get("short")
+        queue.get("short")
+
+    assert queue.qsize() == 2
+    assert len(queue._finish_tags) < 5
+
+def test_edf_pops_earliest_deadline_first():
+    queue = PromptQueue("edf")
+    now = time.time()
+    for prompt_id, deadline in [("late", now + 30), ("early", now + 10), ("middle", now + 20)]:
+        prompt = Prompt(prompt_id, WorkflowType.Ghibli, "", deadline)
+        prompt.lane = "short"
+        queue.put(prompt)
+
+    assert [queue.get().prompt_id for _ in range(3)] == ["early", "middle", "late"]
+
+def test_expired_prompts_leave_the_queue():
+    queue = PromptQueue("edf")
+    now = time.time()
+    for prompt_id, deadline in [("expired", now - 1), ("live", now + 10)]:
+        prompt = Prompt(prompt_id, WorkflowType.Ghibli, "", deadline)
+        prompt.lane = "short"
+        queue.put(prompt)
+
+    assert [prompt.prompt_id for prompt in queue.pop_expired(now)] == ["expired"]
+    assert [prompt.prompt_id for prompt in queue.prompts()] == ["live"]
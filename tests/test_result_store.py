@@ -0,0 +1,55 @@
+import os
+
+from core.result_store import ResultStore
+from core.enums import *
+from core.types import *
+
+def finished_prompt(prompt_id: str, output: bytes) -> Prompt:
+    prompt = Prompt(prompt_id, WorkflowType.Ghibli, "")
+    prompt.result = PromptResult(prompt_id, OutputState.Completed, output)
+    return prompt
+
+def test_entries_older_than_ttl_are_evicted_with_their_files(tmp_path):
+    store = ResultStore(max_bytes=1 << 20, ttl=10, spill_directory="")
+    path = tmp_path / "output.mp4"
+    path.write_bytes(b"video")
+    old = finished_prompt("old", None)
+    old.result.output_path = str(path)
+    store.put(old)
+    store.put(finished_prompt("new", b"image"))
+    store._stored_at["old"] -= 20
+
+    store.evict_expired(store._stored_at["new"])
+
+    assert "old" not in store and "new" in store
+    assert not path.exists()
+    assert store.evicted_count == 1
+
+def test_budget_spills_oldest_outputs(tmp_path):
+    store = ResultStore(max_bytes=10, ttl=60, spill_directory=str(tmp_path))
+    store.put(finished_prompt("first", b"x" * 8))
+    store.put(finished_prompt("second", b"y" * 8))
+
+    first = store.get("first")
+    assert first.result.output is None
+    with open(first.result.output_path, 'rb') as file:
+        assert file.read() == b"x" * 8
+    assert store.get("second").result.output == b"y" * 8
+    assert store.resident_bytes == 8 and store.spilled_count == 1
+
+def test_budget_evicts_oldest_outputs_without_spill_directory():
+    store = ResultStore(max_bytes=10, ttl=60, spill_directory="")
+    store.put(finished_prompt("first", b"x" * 8))
+    store.put(finished_prompt("second", b"y" * 8))
+
+    assert "first" not in store and "second" in store
+    assert store.resident_bytes == 8 and store.evicted_count == 1
+
+def test_pop_hands_over_the_output_file(tmp_path):
+    store = ResultStore(max_bytes=1, ttl=60, spill_directory=str(tmp_path))
+    store.put(finished_prompt("prompt", b"output"))
+
+    prompt = store.pop("prompt")
+
+    assert os.path.exists(prompt.result.output_path)
+    assert store.resident_bytes == 0 and len(store) == 0
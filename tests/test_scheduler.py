@@ -0,0 +1,75 @@
+import socket
+import threading
+import pytest
+
+from core.scheduler import *
+from core.enums import *
+from core.types import *
+
+class StubScheduler:
+    """Scheduler answering daemon calls without any pods."""
+
+    def submit_prompt(self, workflow_type, input_url, *args):
+        prompt = Prompt(f"{workflow_type.name}:{input_url}", workflow_type, input_url)
+        prompt.result = PromptResult(prompt.prompt_id, OutputState.Rejected, "Server is overloaded", 7)
+        return prompt
+
+    def get_prompt_status(self, prompt_id):
+        return {"id": prompt_id, "status": "queued"}
+
+    def get_prompt_result(self, prompt_id):
+        return PromptResult(prompt_id, OutputState.Completed, b"\x00output", media_type="image/png")
+
+    def get_state(self):
+        return {"state": PodManagerState.Running}
+
+    def stop(self):
+        raise OSError("Pods are unreachable")
+
+@pytest.fixture
+def client(tmp_path):
+    """Client of a daemon serving a StubScheduler on a socket under tmp_path."""
+    daemon = SchedulerDaemon(StubScheduler(), str(tmp_path / "scheduler.sock"))
+    thread = threading.Thread(target=daemon.serve_forever, daemon=True)
+    thread.start()
+    client = SchedulerClient(daemon.server_address, timeout=5)
+    yield client
+    client.close()
+    daemon.shutdown()
+    daemon.server_close()
+
+def test_frames_carry_binary_payloads():
+    header, payload = unpack_frame(pack_frame({"state": PodManagerState.Running}, b"\x00\xff"))
+    assert header == {"state": "Running"}
+    assert payload == b"\x00\xff"
+
+def test_daemon_round_trips_prompts_and_results(client):
+    prompt = client.submit_prompt(WorkflowType.Snoopy, "input")
+    assert prompt.prompt_id == "Snoopy:input"
+    assert prompt.result.output_state == OutputState.Rejected
+    assert prompt.result.retry_after == 7
+
+    result = client.get_prompt_result("job")
+    assert result.output == b"\x00output" and result.media_type == "image/png"
+    assert client.get_prompt_status("job") == {"id": "job", "status": "queued"}
+    assert client.get_state()["state"] == PodManagerState.Running
+
+def test_daemon_reports_errors_to_the_caller(client):
+    with pytest.raises(ValueError):
+        client._call("evict_expired_results")
+    with pytest.raises(RuntimeError, match="unreachable"):
+        client.stop()
+
+def drop_connection(client: SchedulerClient) -> None:
+    """Give the calling thread a connection whose peer has gone away."""
+    dropped, peer = socket.socketpair()
+    peer.close()
+    client._local.sock = dropped
+
+def test_client_resends_only_reads_over_a_dropped_connection(client):
+    drop_connection(client)
+    assert client.get_prompt_status("job")["status"] == "queued"
+
+    drop_connection(client)
+    with pytest.raises(OSError):
+        client.submit_prompt(WorkflowType.Snoopy, "input")
@@ -0,0 +1,165 @@
+import os
+import json
+import time
+import base64
+
+import anyio
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+import server
+from core.enums import *
+from core.types import *
+from core.blob_store import LocalBlobStore
+
+@pytest.fixture
+def client():
+    """Client of the app without its lifespan, so no scheduler or pods start."""
+    return TestClient(server.app)
+
+def test_priority_is_capped_by_tenant_config(monkeypatch):
+    monkeypatch.setattr(server, "TENANT_PRIORITIES", {"gold": 1})
+    assert server.tenant_priority({"tenant_id": "gold", "priority": 5}, None) == ("gold", 1)
+    assert server.tenant_priority({"tenant_id": "other", "priority": 1}, None) == ("other", 0)
+    assert server.tenant_priority({"priority": -3}, None) == ("", 0)
+
+def test_tenant_with_api_key_must_present_it(monkeypatch):
+    monkeypatch.setattr(server, "TENANT_API_KEYS", {"gold": "secret"})
+    assert server.tenant_priority({"tenant_id": "gold"}, "secret") == ("gold", 0)
+    with pytest.raises(HTTPException) as error:
+        server.tenant_priority({"tenant_id": "gold"}, "guess")
+    assert error.value.status_code == 403
+
+def test_invalid_priority_is_rejected(client):
+    response = client.post('/api/v2/jobs', json={"workflow_id": 1, "priority": "high"})
+    assert response.status_code == 400
+
+class RejectingScheduler:
+    def submit_prompt(self, workflow_type, input_url, *args):
+        prompt = Prompt("prompt", workflow_type, input_url)
+        prompt.result = PromptResult(prompt.prompt_id, OutputState.Rejected, "Server is overloaded", 7)
+        return prompt
+
+def test_rejected_job_returns_429_with_retry_after(client, monkeypatch):
+    monkeypatch.setattr(server, "easycontrol_manager", RejectingScheduler())
+    response = client.post('/api/v2/jobs', json={"workflow_id": 1, "url": "input"})
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "7"
+
+class BatchScheduler:
+    """Scheduler whose jobs complete with the given results, or stay queued without one."""
+
+    def __init__(self, results):
+        self.results = list(results)
+        self.released = []
+
+    def submit_prompt(self, workflow_type, input_url, *args):
+        return Prompt(input_url, workflow_type, input_url)
+
+    def get_prompt_result(self, prompt_id):
+        return self.results[int(prompt_id)]
+
+    def get_prompt_status(self, prompt_id):
+        return {"status": "queued"}
+
+    def release_prompt_result(self, prompt_id):
+        self.released.append(prompt_id)
+
+def test_batch_streams_inline_video_from_spool_file(client, monkeypatch, tmp_path):
+    video = bytes(range(256)) * 40
+    path = tmp_path / "output.mp4"
+    path.write_bytes(video)
+    scheduler = BatchScheduler([
+        PromptResult("0", OutputState.Completed, None, output_path=str(path), media_type="video/mp4")
+    ])
+    monkeypatch.setattr(server, "easycontrol_manager", scheduler)
+    monkeypatch.setattr(server, "STREAM_CHUNK_SIZE", 1000)
+
+    response = client.post('/api/v2/batch', json={"workflow_id": 1, "urls": ["0"], "output_mode": "inline"})
+    item = json.loads(response.text)
+    assert item["media_type"] == "video/mp4"
+    assert base64.b64decode(item["data"]) == video
+    assert scheduler.released == ["0"]
+
+def test_batch_releases_pending_results_when_cancelled(monkeypatch):
+    scheduler = BatchScheduler([None, None])
+    monkeypatch.setattr(server, "easycontrol_manager", scheduler)
+    response = server.submit_batch({"workflow_id": 1, "urls": ["0", "1"]})
+
+    async def consume():
+        with anyio.move_on_after(0.2):
+            async for _ in response.body_iterator:
+                pass
+
+    anyio.run(consume)
+    assert sorted(scheduler.released) == ["0", "1"]
+
+def test_blob_deleted_after_signature_check_returns_404(client, monkeypatch, tmp_path):
+    store = LocalBlobStore(str(tmp_path), "http://testserver/api/v2/blobs")
+    key = store.put_bytes(b"output", "image/jpeg")
+    query = store.url(key, 60).split('?')[1]
+    monkeypatch.setattr(server, "blob_store", store)
+    monkeypatch.setattr(store, "verify", lambda *args: True)
+    os.remove(store.path(key))
+
+    response = client.get(f'/api/v2/blobs/{key}?{query}')
+    assert response.status_code == 404
+
+class FinishedScheduler:
+    """Scheduler holding one completed job."""
+
+    def __init__(self, result):
+        self.result = result
+
+    def get_prompt_status(self, prompt_id):
+        return {"status": "completed"} if prompt_id == self.result.prompt_id else None
+
+    def get_prompt_result(self, prompt_id):
+        return self.result
+
+@pytest.fixture
+def video_job(monkeypatch, tmp_path):
+    path = tmp_path / "output.mp4"
+    path.write_bytes(bytes(range(100)))
+    result = PromptResult(
+        "job",
+        OutputState.Completed,
+        None,
+        output_path=str(path),
+        media_type="video/mp4",
+        content_hash="hash"
+    )
+    monkeypatch.setattr(server, "easycontrol_manager", FinishedScheduler(result))
+    return result
+
+def test_result_serves_byte_ranges(client, video_job):
+    response = client.get('/api/v2/jobs/job/result?output_mode=inline', headers={"Range": "bytes=10-19"})
+    assert response.status_code == 206
+    assert response.headers["Content-Range"] == "bytes 10-19/100"
+    assert response.content == bytes(range(10, 20))
+
+    response = client.get('/api/v2/jobs/job/result?output_mode=inline')
+    assert response.status_code == 200
+    assert response.headers["Accept-Ranges"] == "bytes"
+    assert len(response.content) == 100
+
+def test_result_rejects_unsatisfiable_range(client, video_job):
+    response = client.get('/api/v2/jobs/job/result?output_mode=inline', headers={"Range": "bytes=100-"})
+    assert response.status_code == 416
+    assert response.headers["Content-Range"] == "bytes */100"
+
+def test_result_is_not_modified_for_matching_etag(client, video_job):
+    response = client.get('/api/v2/jobs/job/result?output_mode=inline', headers={"If-None-Match": '"hash"'})
+    assert response.status_code == 304
+    assert response.headers["ETag"] == '"hash"'
+
+def test_blob_with_bad_signature_is_forbidden(client, monkeypatch, tmp_path):
+    store = LocalBlobStore(str(tmp_path), "http://testserver/api/v2/blobs")
+    key = store.put_bytes(b"output", "image/jpeg")
+    monkeypatch.setattr(server, "blob_store", store)
+
+    response = client.get(f'/api/v2/blobs/{key}?expires={int(time.time()) + 60}&signature=forged')
+    assert response.status_code == 403
+    response = client.get(store.url(key, 60).replace("http://testserver", ""))
+    assert response.status_code == 200 and response.content == b"output"
@@ -0,0 +1,27 @@
+import pytest
+
+from core.streaming import iter_file, parse_range
+
+def test_parse_range():
+    assert parse_range(None, 10) is None
+    assert parse_range("bytes=2-4", 10) == (2, 4)
+    assert parse_range("bytes=5-", 10) == (5, 9)
+    assert parse_range("bytes=-3", 10) == (7, 9)
+    assert parse_range("bytes=-30", 10) == (0, 9)
+
+@pytest.mark.parametrize("header", ["bytes=-0", "bytes=10-", "bytes=4-2"])
+def test_parse_range_unsatisfiable(header):
+    with pytest.raises(ValueError):
+        parse_range(header, 10)
+
+@pytest.mark.parametrize("header", ["bytes=-5", "bytes=0-", "bytes=0-0"])
+def test_parse_range_empty_file(header):
+    with pytest.raises(ValueError):
+        parse_range(header, 0)
+
+def test_iter_file_yields_inclusive_range_across_chunks(tmp_path):
+    path = tmp_path / "output.mp4"
+    path.write_bytes(bytes(range(100)))
+    chunks = list(iter_file(str(path), 10, 29, chunk_size=8))
+    assert b"".join(chunks) == bytes(range(10, 30))
+    assert max(len(chunk) for chunk in chunks) == 8
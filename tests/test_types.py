@@ -0,0 +1,16 @@
+from core.enums import *
+from core.types import *
+
+def test_prompt_keeps_only_latest_progress_events():
+    prompt = Prompt("prompt", WorkflowType.Ghibli, "")
+    for position in range(100):
+        prompt.add_event("queue_position", {"position": position})
+    prompt.add_event("dispatched")
+    for step in range(1000):
+        prompt.add_event("progress", {"value": step, "max": 1000})
+    prompt.add_event("completed")
+
+    assert [event["event"] for event in prompt.events] == ["queue_position", "dispatched", "progress", "completed"]
+    assert prompt.events[0]["data"] == {"position": 99}
+    assert prompt.events[2]["data"]["value"] == 999
+    assert [event["id"] for event in prompt.events] == [99, 100, 1100, 1101]